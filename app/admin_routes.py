@@ -0,0 +1,163 @@
+"""
+Administrative routes for caches and maintenance jobs
+"""
+import asyncio
+import json
+import logging
+from typing import Optional
+from fastapi import Request, HTTPException
+from fastapi.responses import StreamingResponse
+
+from .config import settings
+from .cache import query_cache
+from .vector_index import vector_index
+from .replicas import replica_pool
+
+logger = logging.getLogger(__name__)
+
+# Comment line sent on idle event streams so proxies keep them open
+SSE_KEEPALIVE_SECONDS = 15.0
+# Status of jobs owned by other workers is re-read from the state directory
+SSE_REMOTE_POLL_SECONDS = 1.0
+
+async def get_extraction_cache_stats(request: Request) -> dict:
+    """
+    Report hit rate and stored bytes of the LLM extraction cache
+    """
+    cache = getattr(request.app.state, "extraction_cache", None)
+    if cache is None:
+        return {"enabled": False}
+    try:
+        return {"enabled": True, **(await cache.stats())}
+    except Exception as e:
+        logger.error(f"Failed to read extraction cache stats: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def clear_extraction_cache(request: Request) -> dict:
+    """
+    Drop every cached extraction result
+    """
+    cache = getattr(request.app.state, "extraction_cache", None)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Extraction cache is disabled")
+    try:
+        deleted = await cache.clear()
+        logger.info(f"Extraction cache cleared: {deleted} entries removed")
+        return {"success": True, "deleted": deleted}
+    except Exception as e:
+        logger.error(f"Failed to clear extraction cache: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_query_cache_stats(request: Request) -> dict:
+    """
+    Report hit counts of the two-tier query cache in this worker
+    """
+    return {"enabled": settings.CACHE_ENABLED, **query_cache.snapshot()}
+
+async def flush_query_cache(request: Request) -> dict:
+    """
+    Invalidate every cached search response on all workers
+    """
+    if not settings.CACHE_ENABLED:
+        raise HTTPException(status_code=404, detail="Query cache is disabled")
+    try:
+        await query_cache.flush()
+        logger.info("Query cache flushed")
+        return {"success": True}
+    except Exception as e:
+        logger.error(f"Failed to flush query cache: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def get_vector_index_stats(request: Request) -> dict:
+    """
+    Report hot groups held in this worker's in-process vector index
+    """
+    return vector_index.snapshot()
+
+async def get_replica_stats(request: Request) -> dict:
+    """
+    Report read replica latencies and how this worker's reads were routed
+    """
+    return {"enabled": replica_pool.enabled, **replica_pool.snapshot()}
+
+async def list_jobs(request: Request, kind: Optional[str] = None) -> dict:
+    """
+    List known background jobs, optionally filtered by kind
+    """
+    jobs = request.app.state.jobs.list(kind)
+    return {"jobs": [job.status for job in jobs], "count": len(jobs)}
+
+async def get_job(request: Request, job_id: str):
+    """
+    Get status and progress of a background job
+    """
+    job = request.app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.status
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_job_events(request: Request, job_id: str) -> StreamingResponse:
+    """
+    Stream stage transitions and status changes of a job as server-sent events
+    """
+    jobs = request.app.state.jobs
+    if jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def events():
+        sent_stages = 0
+        last_status = None
+        idle = 0.0
+        while True:
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            revision = job.revision
+            status = job.status.model_dump(mode="json")
+            stages = status["progress"].get("stages", [])
+            for entry in stages[sent_stages:]:
+                yield _sse("stage", entry)
+            sent_stages = len(stages)
+            if job.done:
+                yield _sse("done", status)
+                return
+            if status != last_status:
+                yield _sse("status", status)
+                last_status = status
+                idle = 0.0
+            if await request.is_disconnected():
+                return
+            if jobs.is_local(job_id):
+                if not await job.wait_changed(revision, SSE_KEEPALIVE_SECONDS):
+                    yield ": keepalive\n\n"
+            else:
+                await asyncio.sleep(SSE_REMOTE_POLL_SECONDS)
+                idle += SSE_REMOTE_POLL_SECONDS
+                if idle >= SSE_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    idle = 0.0
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def cancel_job(request: Request, job_id: str) -> dict:
+    """
+    Cancel a running background job
+    """
+    jobs = request.app.state.jobs
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if not jobs.is_local(job_id) and not job.done:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} runs in worker {job.status.worker_pid}, retry the request",
+        )
+    cancelled = await jobs.cancel(job_id)
+    return {"success": cancelled, "status": job.status.status}
@@ -0,0 +1,326 @@
+"""
+Two-tier cache for query embeddings and search responses
+
+Tier one is a small in-process LRU, tier two is shared Redis (the
+FalkorDB instance itself unless CACHE_REDIS_URL points elsewhere), so a
+popular query is embedded and searched once per deployment rather than once
+per replica.
+
+Search responses are keyed by the request together with per-group version
+counters kept in Redis. Every write bumps the counters of the groups it
+touched, which changes the keys on all replicas at once - stale entries are
+never read again and simply expire.
+"""
+import hashlib
+import json
+import logging
+import time
+from array import array
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = "graphiti:gv:"
+# Present for READ_YOUR_WRITES_SECONDS after a write to the group
+WRITE_MARK_PREFIX = "graphiti:gw:"
+# Version counter bumped on every write; used when a search spans all groups
+GLOBAL_VERSION = "*"
+# Part of every key; bumped to invalidate everything at once
+EPOCH_VERSION = "__epoch__"
+
+class LocalLRU:
+    """Bounded in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def items(self) -> List[tuple]:
+        """Unexpired (key, value) pairs, without touching their recency."""
+        now = time.monotonic()
+        return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at >= now]
+
+    def pop(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class TwoTierCache:
+    """In-process LRU in front of an optional shared Redis tier."""
+
+    def __init__(self):
+        self.local = LocalLRU(settings.CACHE_LOCAL_MAX_ENTRIES)
+        self.redis = None
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "shared_errors": 0}
+        self._local_versions: Dict[str, int] = {}
+        self._version_cache: Dict[str, tuple] = {}
+        self._write_marks: Dict[str, float] = {}
+
+    def configure(self, redis_url: Optional[str]):
+        """Connect the shared tier; without a URL the cache stays process-local."""
+        self.local = LocalLRU(settings.CACHE_LOCAL_MAX_ENTRIES)
+        if not redis_url:
+            self.redis = None
+            return
+        import redis.asyncio as aioredis
+        self.redis = aioredis.from_url(redis_url, socket_timeout=settings.CACHE_SHARED_TIMEOUT_SECONDS)
+        logger.info("Shared cache tier enabled")
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    def _shared_failed(self, e: Exception):
+        self.stats["shared_errors"] += 1
+        logger.warning(f"Shared cache unavailable, using local tier only: {e}")
+
+    # --- raw bytes in the shared tier, decoded objects in the local tier ---
+
+    async def _get(self, key: str, decode) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["local_hits"] += 1
+            return value
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(key)
+            except Exception as e:
+                self._shared_failed(e)
+                raw = None
+            if raw is not None:
+                value = decode(raw)
+                self.local.set(key, value, settings.CACHE_LOCAL_TTL_SECONDS)
+                self.stats["shared_hits"] += 1
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    async def _get_many(self, keys: List[str], decode) -> List[Any]:
+        values = [self.local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        self.stats["local_hits"] += len(keys) - len(missing)
+        if missing and self.redis is not None:
+            try:
+                raws = await self.redis.mget([keys[i] for i in missing])
+            except Exception as e:
+                self._shared_failed(e)
+                raws = [None] * len(missing)
+            for i, raw in zip(missing, raws):
+                if raw is not None:
+                    values[i] = decode(raw)
+                    self.local.set(keys[i], values[i], settings.CACHE_LOCAL_TTL_SECONDS)
+                    self.stats["shared_hits"] += 1
+        self.stats["misses"] += sum(1 for value in values if value is None)
+        return values
+
+    async def _set(self, key: str, value: Any, raw: bytes, ttl: float):
+        self.local.set(key, value, min(ttl, settings.CACHE_LOCAL_TTL_SECONDS))
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, raw, ex=int(ttl))
+            except Exception as e:
+                self._shared_failed(e)
+
+    async def get_json(self, key: str) -> Any:
+        return await self._get(key, json.loads)
+
+    async def set_json(self, key: str, value: Any, ttl: float):
+        await self._set(key, value, json.dumps(value, default=str).encode("utf-8"), ttl)
+
+    async def get_vector(self, key: str) -> Optional[List[float]]:
+        return await self._get(key, lambda raw: array("f", raw).tolist())
+
+    async def get_vectors(self, keys: List[str]) -> List[Optional[List[float]]]:
+        return await self._get_many(keys, lambda raw: array("f", raw).tolist())
+
+    async def set_vector(self, key: str, vector: List[float], ttl: float):
+        await self._set(key, list(vector), array("f", vector).tobytes(), ttl)
+
+    # --- group version counters ---
+
+    async def group_versions(self, group_ids: Optional[Iterable[str]]) -> Dict[str, int]:
+        """Current version of each group (the global version when group_ids is None)."""
+        groups = sorted(set(group_ids)) if group_ids else [GLOBAL_VERSION]
+        groups.append(EPOCH_VERSION)
+        now = time.monotonic()
+        versions: Dict[str, int] = {}
+        missing = []
+        for group in groups:
+            cached = self._version_cache.get(group)
+            if cached is not None and cached[0] > now:
+                versions[group] = cached[1]
+            else:
+                missing.append(group)
+
+        if missing and self.redis is not None:
+            try:
+                values = await self.redis.mget([VERSION_KEY_PREFIX + g for g in missing])
+                for group, value in zip(missing, values):
+                    versions[group] = int(value or 0)
+                    self._version_cache[group] = (now + settings.CACHE_VERSION_TTL_SECONDS, versions[group])
+                missing = []
+            except Exception as e:
+                self._shared_failed(e)
+        for group in missing:
+            versions[group] = self._local_versions.get(group, 0)
+        return versions
+
+    async def bump_groups(self, group_ids: Iterable[Optional[str]]) -> Dict[str, int]:
+        """Invalidate cached responses of the given groups on every replica; returns the new versions."""
+        groups = {g if g is not None else "" for g in group_ids}
+        groups.add(GLOBAL_VERSION)
+        return await self._incr(groups)
+
+    async def flush(self):
+        """Invalidate every cached response on every replica."""
+        self.local.clear()
+        await self._incr({EPOCH_VERSION})
+
+    async def _incr(self, groups: set) -> Dict[str, int]:
+        versions = {}
+        for group in sorted(groups):
+            versions[group] = self._local_versions[group] = self._local_versions.get(group, 0) + 1
+            # Own writes are visible immediately, without waiting for the version TTL
+            self._version_cache.pop(group, None)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for group in versions:
+                    pipe.incr(VERSION_KEY_PREFIX + group)
+                versions = dict(zip(versions, await pipe.execute()))
+            except Exception as e:
+                self._shared_failed(e)
+        return versions
+
+    # --- recent-write marks for read-your-writes ---
+
+    async def mark_written(self, group_ids: Iterable[Optional[str]], seconds: float):
+        """Record that the groups were just written, for every replica to see."""
+        groups = {g for g in group_ids if g}
+        expires_at = time.monotonic() + seconds
+        for group in groups:
+            self._write_marks[group] = expires_at
+        if groups and self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for group in groups:
+                    pipe.set(WRITE_MARK_PREFIX + group, 1, px=int(seconds * 1000))
+                await pipe.execute()
+            except Exception as e:
+                self._shared_failed(e)
+
+    async def recently_written(self, group_ids: Iterable[str]) -> bool:
+        """Whether any of the groups was written within its mark's lifetime."""
+        groups = {g for g in group_ids if g}
+        now = time.monotonic()
+        if any(self._write_marks.get(group, 0.0) > now for group in groups):
+            return True
+        if groups and self.redis is not None:
+            try:
+                return await self.redis.exists(*(WRITE_MARK_PREFIX + g for g in groups)) > 0
+            except Exception as e:
+                self._shared_failed(e)
+        return False
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["local_hits"] + self.stats["shared_hits"] + self.stats["misses"]
+        hits = self.stats["local_hits"] + self.stats["shared_hits"]
+        return {
+            "shared_tier": self.redis is not None,
+            "local_entries": len(self.local),
+            **self.stats,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+def cache_key(namespace: str, *parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return f"graphiti:{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+def embedding_key(text: str) -> str:
+    return cache_key("emb", settings.DEFAULT_EMBEDDING_MODEL, settings.EMBEDDING_DIM, text)
+
+query_cache = TwoTierCache()
+
+async def invalidate_groups(*group_ids: Optional[str]) -> Dict[str, int]:
+    """Bump version counters after a write; never fails the write itself."""
+    try:
+        versions = await query_cache.bump_groups(group_ids)
+        if settings.FALKORDB_READ_REPLICAS and settings.READ_YOUR_WRITES_SECONDS > 0:
+            # Keep reads of these groups on the primary until replicas catch up
+            await query_cache.mark_written(group_ids, settings.READ_YOUR_WRITES_SECONDS)
+        return versions
+    except Exception as e:
+        logger.warning(f"Cache invalidation failed for {group_ids}: {e}")
+        return {}
+
+# Query vectors embedded ahead of the searches of a batch; see prime_query_embeddings
+primed_vectors: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar("primed_vectors", default=None)
+
+class CachingEmbedder:
+    """
+    Wraps a graphiti EmbedderClient and serves repeated texts from the query cache.
+
+    graphiti embeds search queries through create(input_data=[query]), so only
+    single-text calls are cached. create_batch is used for ingestion and
+    re-embedding and passes straight through to keep fact embeddings out of
+    the cache. Vectors primed for the current batch search are served first,
+    also with CACHE_ENABLED off.
+    """
+
+    def __init__(self, embedder: Any):
+        self._embedder = embedder
+
+    @property
+    def uncached(self) -> Any:
+        return self._embedder
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._embedder, name)
+
+    async def create(self, input_data: Any) -> List[float]:
+        text = None
+        if isinstance(input_data, str):
+            text = input_data
+        elif isinstance(input_data, list) and len(input_data) == 1 and isinstance(input_data[0], str):
+            text = input_data[0]
+        if text is None:
+            return await self._embedder.create(input_data=input_data)
+        primed = primed_vectors.get()
+        if primed is not None and text in primed:
+            return primed[text]
+        if not settings.CACHE_ENABLED:
+            return await self._embedder.create(input_data=input_data)
+
+        key = embedding_key(text)
+        vector = await query_cache.get_vector(key)
+        if vector is None:
+            vector = await self._embedder.create(input_data=input_data)
+            await query_cache.set_vector(key, vector, settings.CACHE_EMBEDDING_TTL_SECONDS)
+        return vector
+
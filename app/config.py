@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -13,6 +14,17 @@ class Settings(BaseSettings):
     FALKORDB_PORT: int = 6379
     FALKORDB_PASSWORD: str = ""
     
+    # Read Replica Settings
+    # Comma-separated host[:port] list; empty sends reads to the primary
+    FALKORDB_READ_REPLICAS: str = ""
+    # Empty means FALKORDB_PASSWORD
+    FALKORDB_REPLICA_PASSWORD: str = ""
+    REPLICA_LATENCY_EWMA_ALPHA: float = 0.2
+    # How long a replica that failed to answer is skipped
+    REPLICA_RETRY_SECONDS: float = 10.0
+    # Reads of a group stay on the primary this long after a write; 0 disables
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    
     # LLM Settings
     DEFAULT_LLM_MODEL: str = "gpt-4o-mini"
     DEFAULT_EMBEDDING_MODEL: str = "text-embedding-3-small"
@@ -22,5 +34,173 @@ class Settings(BaseSettings):
     EMBEDDING_DIM: int = 1536
     EMBEDDING_PROVIDER: str = "openai"
 
+    # Extraction Cache Settings
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_PATH: str = "data/extraction_cache.sqlite3"
+    # Bump when graphiti prompts change so stale extractions are not replayed
+    EXTRACTION_PROMPT_VERSION: str = "1"
+
+    # Background Job Settings
+    JOB_STATE_DIR: str = "data/jobs"
+    REEMBED_MAX_ITEMS_PER_SECOND: float = 500.0
+    REEMBED_MAX_BATCH_SIZE: int = 1000
+    GROUP_DELETE_BATCH_SIZE: int = 500
+    GROUP_DELETE_PAUSE_SECONDS: float = 0.05
+    # How long a worker trusts its copy of the tombstone file
+    TOMBSTONE_REFRESH_SECONDS: float = 0.5
+
+    # Retention / Compaction Settings
+    # Defaults for groups without their own policy; 0 disables a rule
+    RETENTION_INVALIDATED_FACT_DAYS: float = 0.0
+    RETENTION_INVALIDATED_FACT_ACTION: Literal["delete", "archive"] = "delete"
+    RETENTION_EPISODE_MAX_COUNT: int = 0
+    RETENTION_EPISODE_MAX_AGE_DAYS: float = 0.0
+    RETENTION_ARCHIVE_DIR: str = "data/archive"
+    COMPACTION_BATCH_SIZE: int = 500
+    COMPACTION_PAUSE_SECONDS: float = 0.05
+    # 0 runs compaction only when requested through /admin/compaction
+    COMPACTION_INTERVAL_HOURS: float = 0.0
+
+    # Health / Readiness Settings
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 2.0
+    EMBEDDER_PROBE_TTL_SECONDS: float = 60.0
+    READY_REQUIRE_EMBEDDER: bool = True
+    READY_MAX_DB_LATENCY_MS: float = 1000.0
+    READY_MAX_LOOP_LAG_MS: float = 500.0
+    READY_MAX_INGESTION_IN_FLIGHT: int = 0  # 0 disables the limit
+
+    # Event Loop Monitor Settings
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.25
+    LOOP_BLOCK_THRESHOLD_MS: float = 200.0
+    # Log the loop thread stack whenever it is blocked longer than the threshold
+    LOOP_BLOCK_DEBUG: bool = False
+
+    # Worker Lifecycle Settings
+    PREWARM_ENABLED: bool = True
+    PREWARM_BUILD_INDICES: bool = True
+    PREWARM_INDEX_TIMEOUT_SECONDS: float = 30.0
+    PREWARM_EMBEDDER: bool = False
+    # Keep below gunicorn's graceful_timeout
+    SHUTDOWN_DRAIN_TIMEOUT_SECONDS: float = 25.0
+
+    # Query Cache Settings
+    CACHE_ENABLED: bool = True
+    # Shared tier; empty means the FalkorDB instance itself
+    CACHE_REDIS_URL: str = ""
+    CACHE_SHARED_ENABLED: bool = True
+    CACHE_SHARED_TIMEOUT_SECONDS: float = 0.25
+    CACHE_LOCAL_MAX_ENTRIES: int = 2048
+    CACHE_LOCAL_TTL_SECONDS: float = 30.0
+    CACHE_SEARCH_TTL_SECONDS: float = 300.0
+    CACHE_EMBEDDING_TTL_SECONDS: float = 86400.0
+    # How long a replica trusts its copy of the group version counters
+    CACHE_VERSION_TTL_SECONDS: float = 0.5
+
+    # Response Settings
+    RESPONSE_COMPRESSION_ENABLED: bool = True
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 5
+    # Used when the zstandard package is installed and the client accepts zstd
+    RESPONSE_ZSTD_LEVEL: int = 3
+
+    # Batch Search Settings
+    SEARCH_BATCH_MAX_QUERIES: int = 20
+    # Searches of one batch running against FalkorDB at the same time
+    SEARCH_BATCH_CONCURRENCY: int = 4
+
+    # Score Threshold Settings
+    # With min_score set, searches that cannot filter by score in the query
+    # widen k by this factor until enough results qualify...
+    MIN_SCORE_OVERFETCH_FACTOR: int = 3
+    # ...or k reaches this many candidates
+    MIN_SCORE_MAX_CANDIDATES: int = 200
+
+    # Group Summary Settings
+    # Entities served per summary, ranked by their number of valid facts
+    GROUP_SUMMARY_ENTITIES: int = 10
+    GROUP_SUMMARY_FACTS_PER_ENTITY: int = 3
+    GROUP_SUMMARY_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Entity Neighborhood Settings
+    NEIGHBORHOOD_MAX_DEPTH: int = 3
+    # Upper bound for the per-hop fan-out limit a request may ask for
+    NEIGHBORHOOD_MAX_LIMIT: int = 200
+    NEIGHBORHOOD_CACHE_ENTRIES: int = 1000
+    NEIGHBORHOOD_CACHE_TTL_SECONDS: int = 300
+
+    # Focal Node Reranking Settings
+    FOCAL_DISTANCE_MAX_DEPTH: int = 2
+    # BFS stops once the map holds this many entities
+    FOCAL_DISTANCE_MAX_NODES: int = 5000
+    FOCAL_DISTANCE_CACHE_ENTRIES: int = 1000
+    FOCAL_DISTANCE_CACHE_TTL_SECONDS: int = 3600
+    # Candidates fetched per requested result before reranking by distance
+    FOCAL_RERANK_CANDIDATES: int = 3
+
+    # Retrieval Planner Settings
+    PLANNER_ENABLED: bool = True
+    # Groups with at most this many facts are answered by reading all of them
+    PLANNER_SCAN_MAX_FACTS: int = 30
+    # Group statistics are re-read after a write once they are this old
+    PLANNER_STATS_MAX_AGE_SECONDS: int = 60
+    # Entity names are kept for exact-name keyword plans in groups up to this size
+    PLANNER_MAX_CACHED_NAMES: int = 5000
+
+    # Diversification Settings
+    # Defaults for requests with diversify on; see diversify.py
+    DIVERSIFY_LAMBDA: float = 0.7
+    DIVERSIFY_DEDUP_THRESHOLD: float = 0.92
+    # Candidates fetched per requested result before MMR selection
+    DIVERSIFY_CANDIDATES: int = 3
+
+    # Context Packing Settings
+    # Local token estimate for token_budget; ~4 characters per token for English
+    CONTEXT_CHARS_PER_TOKEN: float = 3.5
+    # Share of a fact's value that decays with age, and the half-life of that decay
+    CONTEXT_RECENCY_WEIGHT: float = 0.3
+    CONTEXT_RECENCY_HALF_LIFE_DAYS: float = 30.0
+    # Value multiplier for facts that are no longer valid
+    CONTEXT_INVALID_PENALTY: float = 0.5
+
+    # Episode Search Settings
+    # Embed episode content in chunks at ingestion for vector episode search
+    EPISODE_EMBEDDINGS_ENABLED: bool = False
+    EPISODE_CHUNK_CHARS: int = 1000
+    EPISODE_CHUNK_OVERLAP_CHARS: int = 200
+    # Nearest chunks taken from the vector index per requested episode,
+    # before group and time filters
+    EPISODE_VECTOR_CANDIDATES: int = 10
+
+    # In-process Vector Index Settings
+    VECTOR_INDEX_ENABLED: bool = False
+    # Searches of a group in one worker before its facts are loaded into memory
+    VECTOR_INDEX_MIN_SEARCHES: int = 3
+    VECTOR_INDEX_MEMORY_MB: float = 256.0
+    VECTOR_INDEX_MAX_GROUP_FACTS: int = 200000
+    # float32, float16 (half the memory) or int8 (a quarter, per-row scaled)
+    VECTOR_INDEX_DTYPE: Literal["float32", "float16", "int8"] = "float32"
+    # Re-rank float16/int8 candidates with exact embeddings from FalkorDB
+    VECTOR_INDEX_RESCORE: bool = True
+    VECTOR_INDEX_RESCORE_OVERSAMPLE: int = 4
+    # Also answer /search and /get-memory from the index: cosine ranking
+    # instead of graphiti's BM25 + vector hybrid on hot groups
+    VECTOR_INDEX_REPLACE_HYBRID: bool = False
+
+    # Graph Sharding Settings
+    # none: one shared graph; group: a graph per group_id; bucket: group_ids hashed into buckets
+    GRAPH_SHARDING: Literal["none", "group", "bucket"] = "none"
+    GRAPH_SHARD_BUCKETS: int = 64
+    GRAPH_SHARD_PREFIX: str = "graphiti_"
+    GRAPH_MIGRATION_BATCH_SIZE: int = 500
+
+    @property
+    def cache_redis_url(self) -> str:
+        if not self.CACHE_SHARED_ENABLED:
+            return ""
+        if self.CACHE_REDIS_URL:
+            return self.CACHE_REDIS_URL
+        auth = f":{self.FALKORDB_PASSWORD}@" if self.FALKORDB_PASSWORD else ""
+        return f"redis://{auth}{self.FALKORDB_HOST}:{self.FALKORDB_PORT}"
+
 # Create a singleton instance of the settings
 settings = Settings()
\ No newline at end of file
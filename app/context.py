@@ -0,0 +1,81 @@
+"""
+Token-budgeted context packing for /get-memory
+
+n8n flows paste the returned facts into an LLM prompt. With token_budget set,
+the facts are packed greedily by value until the budget is spent, where value
+is the fact's relevance weighted by recency and validity:
+
+    value = relevance * (1 - w + w * 0.5 ** (age_days / half_life)) * (penalty if no longer valid)
+
+with w = CONTEXT_RECENCY_WEIGHT, half_life = CONTEXT_RECENCY_HALF_LIFE_DAYS
+and penalty = CONTEXT_INVALID_PENALTY. Facts without a score (summary facts)
+get a relevance from their position. Token counts come from a local
+characters-per-token estimate, so packing never calls a tokenizer or the
+network; the estimate errs towards overcounting.
+"""
+import math
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from .config import settings
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text for budget purposes."""
+    return math.ceil(len(text) / max(settings.CONTEXT_CHARS_PER_TOKEN, 1.0))
+
+def _date(value: Optional[datetime]) -> Optional[str]:
+    return value.date().isoformat() if value else None
+
+def fact_line(fact) -> str:
+    """One prompt line for a fact, with its validity interval."""
+    line = f"- {fact.fact}"
+    valid_at, invalid_at = _date(fact.valid_at), _date(fact.invalid_at)
+    if valid_at and invalid_at:
+        line += f" ({valid_at} - {invalid_at})"
+    elif valid_at:
+        line += f" (since {valid_at})"
+    return line
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def fact_value(fact, rank: int, count: int, now: datetime) -> float:
+    relevance = fact.relevance_score
+    if relevance is None:
+        relevance = 1.0 - rank / max(1, count)
+    value = relevance
+    written = fact.valid_at or fact.created_at
+    if written is not None and settings.CONTEXT_RECENCY_WEIGHT > 0:
+        age_days = max(0.0, (now - _utc(written)).total_seconds() / 86400)
+        decay = 0.5 ** (age_days / max(settings.CONTEXT_RECENCY_HALF_LIFE_DAYS, 1e-6))
+        weight = settings.CONTEXT_RECENCY_WEIGHT
+        value *= 1 - weight + weight * decay
+    if fact.invalid_at is not None and _utc(fact.invalid_at) <= now:
+        value *= settings.CONTEXT_INVALID_PENALTY
+    return value
+
+def pack_facts(facts: List, token_budget: Optional[int]) -> Tuple[List, int]:
+    """
+    Highest-value facts whose lines fit in token_budget, best first, and the
+    tokens they take. A fact too long for the remaining budget is skipped,
+    leaving room for shorter ones further down.
+    """
+    now = datetime.now(timezone.utc)
+    ranked = sorted(
+        enumerate(facts), key=lambda item: fact_value(item[1], item[0], len(facts), now), reverse=True
+    )
+    remaining = token_budget if token_budget is not None else math.inf
+    packed, used = [], 0
+    for _, fact in ranked:
+        # +1 for the newline joining lines
+        cost = estimate_tokens(fact_line(fact)) + 1
+        if cost > remaining:
+            continue
+        packed.append(fact)
+        used += cost
+        remaining -= cost
+    return packed, used
+
+def render_context(facts: List) -> str:
+    """Facts as a ready-to-use prompt block, one per line."""
+    return "\n".join(fact_line(fact) for fact in facts)
@@ -2,10 +2,20 @@
 CRUD routes for managing episodes and facts
 """
 import logging
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 from fastapi import Request, HTTPException, Query
 from pydantic import BaseModel
 
+from .group_deletion import tombstones
+from .cache import query_cache, invalidate_groups
+from .vector_index import vector_index, index_edges, search_hot_groups
+from .sharding import graph_router
+from .temporal import cypher_condition
+from .focal import focal_distances
+from .episode_search import DELETE_CHUNKS_QUERY
+from .responses import FastJSONResponse
+
 logger = logging.getLogger(__name__)
 
 # Models for CRUD operations
@@ -31,17 +41,51 @@ class UpdateResponse(BaseModel):
     message: str
     updated_fact: Optional[dict] = None
 
+async def _fetch_from_graphs(group_id: Optional[str], query: str, limit: int, **params) -> list:
+    """Run a read on the group's graph, or on every graph when no group is given."""
+    async def fetch(client, _):
+        records, _, _ = await client.driver.execute_query(query, group_id=group_id, limit=limit, **params)
+        return records
+    parts = await graph_router.fan_out([group_id] if group_id else None, fetch, read=True)
+    return [record for records in parts for record in records][:limit]
+
+async def _client_for_item(query: str, uuid: str, group_id: Optional[str]):
+    """Graph holding a fact or episode addressed by uuid, and its group_id."""
+    if group_id is not None:
+        return await graph_router.for_group(group_id), group_id
+    client, records = await graph_router.locate(query, uuid=uuid)
+    return client, records[0]["group_id"] if records else None
+
+async def _client_for_fact(fact_uuid: str, group_id: Optional[str] = None):
+    """Graph holding a fact; only looked up when sharding spreads facts over graphs."""
+    if group_id is not None or not graph_router.enabled:
+        return await graph_router.for_group(group_id)
+    client, _ = await graph_router.locate(
+        "MATCH ()-[r:RELATES_TO {uuid: $uuid}]->() RETURN r.group_id AS group_id", uuid=fact_uuid
+    )
+    return client
+
+async def remove_episode_and_invalidate(episode_uuid: str, group_id: Optional[str] = None):
+    """Remove an episode and invalidate cached searches of its group."""
+    client, group_id = await _client_for_item(
+        "MATCH (e:Episodic {uuid: $uuid}) RETURN e.group_id AS group_id", episode_uuid, group_id
+    )
+    await client.remove_episode(episode_uuid)
+    await client.driver.execute_query(DELETE_CHUNKS_QUERY, uuids=[episode_uuid])
+    if group_id is not None:
+        await invalidate_groups(group_id)
+    else:
+        await query_cache.flush()
+
 async def delete_episode(request: Request, data: DeleteEpisodeRequest) -> DeleteResponse:
     """
     Delete an episode by UUID using graphiti-core's remove_episode method
     """
     try:
-        client = request.app.state.graphiti_client
-        
         logger.info(f"Deleting episode with UUID: {data.episode_uuid}")
         
         # Use graphiti-core's remove_episode method
-        await client.remove_episode(data.episode_uuid)
+        await remove_episode_and_invalidate(data.episode_uuid, data.group_id)
         
         logger.info(f"Successfully deleted episode: {data.episode_uuid}")
         
@@ -60,7 +104,7 @@ async def delete_fact(request: Request, data: DeleteFactRequest) -> DeleteRespon
     For temporal knowledge graphs, we prefer to invalidate facts rather than delete them
     """
     try:
-        client = request.app.state.graphiti_client
+        client = await _client_for_fact(data.fact_uuid, data.group_id)
         
         logger.info(f"Processing fact deletion for UUID: {data.fact_uuid}")
         
@@ -72,16 +116,22 @@ async def delete_fact(request: Request, data: DeleteFactRequest) -> DeleteRespon
         query = """
         MATCH ()-[r:RELATES_TO {uuid: $uuid}]-()
         SET r.invalid_at = $invalid_at
-        RETURN r
+        RETURN r, r.group_id AS group_id
         """
         
+        invalid_at = datetime.now(timezone.utc).isoformat()
         result = await client.driver.execute_query(
             query,
             uuid=data.fact_uuid,
-            invalid_at=datetime.now(timezone.utc).isoformat()
+            invalid_at=invalid_at
         )
         
         if result[0]:  # If we found and updated the edge
+            group_id = result[0][0]["group_id"]
+            versions = await invalidate_groups(group_id)
+            vector_index.apply(
+                versions, group_id, lambda index: index.update(data.fact_uuid, invalid_at=invalid_at)
+            )
             logger.info(f"Successfully invalidated fact: {data.fact_uuid}")
             return DeleteResponse(
                 success=True,
@@ -92,6 +142,11 @@ async def delete_fact(request: Request, data: DeleteFactRequest) -> DeleteRespon
             # Use the Edge.delete_by_uuids method from graphiti-core
             from graphiti_core.edges import Edge
             await Edge.delete_by_uuids(client.driver, [data.fact_uuid])
+            if data.group_id is not None:
+                versions = await invalidate_groups(data.group_id)
+                vector_index.apply(versions, data.group_id, lambda index: index.remove(data.fact_uuid))
+            else:
+                await query_cache.flush()
             
             logger.info(f"Successfully deleted fact: {data.fact_uuid}")
             return DeleteResponse(
@@ -109,7 +164,7 @@ async def update_fact(request: Request, data: UpdateFactRequest) -> UpdateRespon
     In temporal knowledge graphs, we preserve history by invalidating old facts
     """
     try:
-        client = request.app.state.graphiti_client
+        client = await _client_for_fact(data.fact_uuid)
         
         logger.info(f"Updating fact UUID: {data.fact_uuid}")
         
@@ -166,7 +221,24 @@ async def update_fact(request: Request, data: UpdateFactRequest) -> UpdateRespon
             group_id=data.group_id or fact_data['group_id']
         )
         
+        # Embed the new fact so it is reachable by vector search
+        await new_edge.generate_embedding(client.embedder)
         await new_edge.save(client.driver)
+        versions = await invalidate_groups(fact_data['group_id'], new_edge.group_id)
+        names = {
+            fact_data['source_uuid']: fact_data['source_name'],
+            fact_data['target_uuid']: fact_data['target_name'],
+        }
+        invalidated = {data.fact_uuid: current_time.isoformat()}
+        # Distance maps count invalidated facts as edges too; only the new edge can change them
+        if new_edge.group_id == fact_data['group_id']:
+            index_edges(versions, new_edge.group_id, [new_edge], names, invalidated)
+            focal_distances.apply(versions, new_edge.group_id, [new_edge])
+        else:
+            index_edges(versions, fact_data['group_id'], [], invalidated=invalidated)
+            index_edges(versions, new_edge.group_id, [new_edge], names)
+            focal_distances.apply(versions, fact_data['group_id'], [])
+            focal_distances.apply(versions, new_edge.group_id, [new_edge])
         
         logger.info(f"Successfully updated fact: old UUID {data.fact_uuid}, new UUID {new_edge.uuid}")
         
@@ -187,123 +259,173 @@ async def update_fact(request: Request, data: UpdateFactRequest) -> UpdateRespon
         logger.error(f"Failed to update fact: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def get_nodes(request: Request, group_id: Optional[str] = Query(None), limit: int = Query(100)):
+def select_fields(fields: Optional[str], available: Dict[str, str]) -> List[str]:
+    """Fields requested with ?fields=a,b (all of them when omitted)."""
+    if not fields:
+        return list(available)
+    selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields {unknown}; available: {', '.join(available)}",
+        )
+    return selected
+
+def return_clause(selected: List[str], available: Dict[str, str]) -> str:
+    """Cypher RETURN items for the selected fields only."""
+    return ", ".join(f"{available[name]} AS {name}" for name in selected)
+
+def _format_timestamps(records: list, selected: List[str]) -> List[dict]:
+    timestamps = [name for name in selected if name in TIMESTAMP_FIELDS]
+    rows = []
+    for record in records:
+        row = {name: record[name] for name in selected}
+        for name in timestamps:
+            row[name] = str(row[name]) if row[name] else None
+        rows.append(row)
+    return rows
+
+# Response field -> Cypher expression; only requested fields are read from FalkorDB
+NODE_FIELDS = {
+    "uuid": "n.uuid",
+    "name": "n.name",
+    "type": "coalesce(n.type, 'Entity')",
+    "group_id": "n.group_id",
+    "created_at": "n.created_at",
+    "summary": "n.summary",
+}
+
+FACT_FIELDS = {
+    "uuid": "r.uuid",
+    "fact": "r.fact",
+    "source_entity": "n1.name",
+    "target_entity": "n2.name",
+    "group_id": "r.group_id",
+    "created_at": "r.created_at",
+    "valid_at": "r.valid_at",
+    "invalid_at": "r.invalid_at",
+}
+
+EPISODE_FIELDS = {
+    "uuid": "e.uuid",
+    "name": "e.name",
+    "group_id": "e.group_id",
+    "labels": "[]",
+    "created_at": "e.created_at",
+    "source": "e.source",
+    "source_description": "e.source_description",
+    "content": "e.content",
+    "valid_at": "e.valid_at",
+    "entity_edges": "e.entity_edges",
+}
+
+TIMESTAMP_FIELDS = {"created_at", "valid_at", "invalid_at"}
+
+# Fields returned when ?fields= is omitted, as before projection existed
+DEFAULT_NODE_FIELDS = "uuid,name,type,group_id,created_at"
+
+async def get_nodes(
+    request: Request,
+    group_id: Optional[str] = Query(None),
+    limit: int = Query(100),
+    fields: Optional[str] = Query(None),
+):
     """
     Get all nodes (entities) from the knowledge graph
     """
+    selected = select_fields(fields or DEFAULT_NODE_FIELDS, NODE_FIELDS)
     try:
-        client = request.app.state.graphiti_client
-        
-        # Direct query to get nodes using graphiti driver
-        if group_id:
-            query = """
-                MATCH (n:Entity)
-                WHERE n.group_id = $group_id
-                RETURN n
-                LIMIT $limit
-            """
-            records, _, _ = await client.driver.execute_query(
-                query, 
-                group_id=group_id, 
-                limit=limit
-            )
-        else:
-            query = """
-                MATCH (n:Entity)
-                RETURN n
-                LIMIT $limit
-            """
-            records, _, _ = await client.driver.execute_query(
-                query, 
-                limit=limit
-            )
-        
-        nodes = []
-        for record in records:
-            node = record["n"]
-            # FalkorDB возвращает объекты с атрибутом properties
-            props = node.properties if hasattr(node, 'properties') else node
-            
-            nodes.append({
-                "uuid": props.get("uuid") if isinstance(props, dict) else None,
-                "name": props.get("name") if isinstance(props, dict) else None,
-                "type": props.get("type", "Entity") if isinstance(props, dict) else "Entity",
-                "group_id": props.get("group_id") if isinstance(props, dict) else None,
-                "created_at": str(props.get("created_at")) if isinstance(props, dict) and props.get("created_at") else None
-            })
-        
-        return {"nodes": nodes, "count": len(nodes)}
+        if group_id in tombstones:
+            return FastJSONResponse({"nodes": [], "count": 0})
+        
+        group_filter = "n.group_id = $group_id AND" if group_id else ""
+        query = f"""
+            MATCH (n:Entity)
+            WHERE {group_filter} NOT n.group_id IN $hidden_group_ids
+            RETURN {return_clause(selected, NODE_FIELDS)}
+            LIMIT $limit
+        """
+        records = await _fetch_from_graphs(group_id, query, limit, hidden_group_ids=tombstones.groups())
+        nodes = _format_timestamps(records, selected)
+        return FastJSONResponse({"nodes": nodes, "count": len(nodes)})
         
     except Exception as e:
         logger.error(f"Failed to get nodes: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def get_facts(request: Request, group_id: Optional[str] = Query(None), limit: int = Query(100)):
+async def get_facts(
+    request: Request,
+    group_id: Optional[str] = Query(None),
+    limit: int = Query(100),
+    fields: Optional[str] = Query(None),
+):
     """
     Get all facts (edges) from the knowledge graph
     """
+    selected = select_fields(fields, FACT_FIELDS)
     try:
-        client = request.app.state.graphiti_client
-        
-        # Direct query to get facts using graphiti driver
-        if group_id:
-            query = """
-                MATCH (n1:Entity)-[r:RELATES_TO]->(n2:Entity)
-                WHERE r.group_id = $group_id
-                RETURN n1, r, n2
-                LIMIT $limit
-            """
-            records, _, _ = await client.driver.execute_query(
-                query, 
-                group_id=group_id, 
-                limit=limit
-            )
-        else:
-            query = """
-                MATCH (n1:Entity)-[r:RELATES_TO]->(n2:Entity)
-                RETURN n1, r, n2
-                LIMIT $limit
-            """
-            records, _, _ = await client.driver.execute_query(
-                query, 
-                limit=limit
-            )
-        
-        facts = []
-        for record in records:
-            n1 = record["n1"]
-            r = record["r"]
-            n2 = record["n2"]
-            
-            # FalkorDB возвращает объекты с атрибутом properties
-            r_props = r.properties if hasattr(r, 'properties') else r
-            n1_props = n1.properties if hasattr(n1, 'properties') else n1
-            n2_props = n2.properties if hasattr(n2, 'properties') else n2
-            
-            facts.append({
-                "uuid": r_props.get("uuid") if isinstance(r_props, dict) else None,
-                "fact": r_props.get("fact") if isinstance(r_props, dict) else None,
-                "source_entity": n1_props.get("name") if isinstance(n1_props, dict) else None,
-                "target_entity": n2_props.get("name") if isinstance(n2_props, dict) else None,
-                "group_id": r_props.get("group_id") if isinstance(r_props, dict) else None,
-                "created_at": str(r_props.get("created_at")) if isinstance(r_props, dict) and r_props.get("created_at") else None,
-                "valid_at": str(r_props.get("valid_at")) if isinstance(r_props, dict) and r_props.get("valid_at") else None,
-                "invalid_at": str(r_props.get("invalid_at")) if isinstance(r_props, dict) and r_props.get("invalid_at") else None
-            })
-        
-        return {"facts": facts, "count": len(facts)}
+        if group_id in tombstones:
+            return FastJSONResponse({"facts": [], "count": 0})
+        
+        group_filter = "r.group_id = $group_id AND" if group_id else ""
+        query = f"""
+            MATCH (n1:Entity)-[r:RELATES_TO]->(n2:Entity)
+            WHERE {group_filter} NOT r.group_id IN $hidden_group_ids
+            RETURN {return_clause(selected, FACT_FIELDS)}
+            LIMIT $limit
+        """
+        records = await _fetch_from_graphs(group_id, query, limit, hidden_group_ids=tombstones.groups())
+        facts = _format_timestamps(records, selected)
+        return FastJSONResponse({"facts": facts, "count": len(facts)})
         
     except Exception as e:
         logger.error(f"Failed to get facts: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_group_episodes(request: Request, group_id: str, last_n: int = 20, fields: Optional[str] = None):
+    """
+    Get the last episodes of a group, oldest first
+    """
+    selected = select_fields(fields, EPISODE_FIELDS)
+    if group_id in tombstones:
+        return FastJSONResponse([])
+    try:
+        client = await graph_router.for_group(group_id, read=True)
+        query = f"""
+            MATCH (e:Episodic)
+            WHERE e.group_id = $group_id AND e.valid_at <= $reference_time
+            WITH e ORDER BY e.valid_at DESC LIMIT $last_n
+            RETURN {return_clause(selected, EPISODE_FIELDS)}
+        """
+        records, _, _ = await client.driver.execute_query(
+            query, group_id=group_id, reference_time=datetime.now(timezone.utc), last_n=last_n
+        )
+        episodes = []
+        # Same order and timestamp format as graphiti's retrieve_episodes
+        for record in reversed(records):
+            episode = {name: record[name] for name in selected}
+            for name in TIMESTAMP_FIELDS.intersection(selected):
+                episode[name] = _episode_timestamp(episode[name])
+            episodes.append(episode)
+        return FastJSONResponse(episodes)
+    except Exception as e:
+        logger.error(f"Failed to get episodes: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _episode_timestamp(value) -> Optional[str]:
+    if isinstance(value, str):
+        try:
+            return str(datetime.fromisoformat(value))
+        except ValueError:
+            return value
+    return str(value) if value is not None else None
+
 async def get_episode(request: Request, episode_uuid: str):
     """
     Get a specific episode by UUID with all its relationships
     """
     try:
-        client = request.app.state.graphiti_client
-        
         logger.info(f"Getting episode with UUID: {episode_uuid}")
         
         # Query to get episode node and its edges
@@ -313,10 +435,7 @@ async def get_episode(request: Request, episode_uuid: str):
             RETURN e, collect({edge: r, entity: n}) as mentions
         """
         
-        records, _, _ = await client.driver.execute_query(
-            query,
-            uuid=episode_uuid
-        )
+        _, records = await graph_router.locate(query, uuid=episode_uuid)
         
         if not records:
             raise HTTPException(status_code=404, detail=f"Episode {episode_uuid} not found")
@@ -364,28 +483,55 @@ async def search_with_score_logic(client, search_data):
     """
     Search with direct score visibility using raw Cypher query
     """
-    from graphiti_core.embedder import OpenAIEmbedder
-    import os
-    
     logger.info(f"Searching with score for query: '{search_data.query}'")
     
-    # Create embedder to generate query embedding
-    # OpenAIEmbedder берёт API key из переменной окружения автоматически
-    embedder = OpenAIEmbedder()
-    query_embedding = await embedder.create(input_data=[search_data.query])
+    # Groups being deleted are invisible to search
+    hidden = tombstones.snapshot()
+    group_ids = None if search_data.group_ids is None else [g for g in search_data.group_ids if g not in hidden]
+    if search_data.group_ids and not group_ids:
+        return {"query": search_data.query, "results_count": 0, "results": []}
+    
+    # Hot groups are scored in-process against the same threshold
+    windows = search_data.windows()
+    min_score = search_data.min_score if search_data.min_score is not None else 0.5
+    hits = await search_hot_groups(client, search_data.query, group_ids, search_data.num_results, windows, min_score)
+    if hits is not None:
+        results = [
+            {
+                "uuid": hit.uuid,
+                "fact": hit.fact,
+                "source_entity": hit.source_name,
+                "target_entity": hit.target_name,
+                "created_at": str(hit.created_at) if hit.created_at else None,
+                "score": hit.score,
+                "score_percent": f"{hit.score * 100:.1f}%"
+            }
+            for hit in hits
+        ]
+        return {"query": search_data.query, "results_count": len(results), "results": results}
+    
+    # Same embedder (model, dimensions, query cache) that produced the stored vectors
+    query_embedding = await client.embedder.create(input_data=[search_data.query])
     
     # Build group filter
     group_filter = ""
-    if search_data.group_ids:
+    if group_ids:
         group_filter = "AND e.group_id IN $group_ids"
+    elif hidden:
+        group_filter = "AND NOT e.group_id IN $hidden_group_ids"
+    
+    # Validity filter applies before scoring and LIMIT
+    temporal_condition, temporal_params = cypher_condition("e", windows)
+    temporal_filter = f"AND {temporal_condition}" if temporal_condition else ""
     
     # Direct Cypher query that returns score
     query = f"""
         MATCH (n:Entity)-[e:RELATES_TO]->(m:Entity)
         WHERE e.fact_embedding IS NOT NULL
         {group_filter}
+        {temporal_filter}
         WITH e, n, m, (2 - vec.cosineDistance(e.fact_embedding, vecf32($search_vector)))/2 AS score
-        WHERE score > 0.5
+        WHERE score >= $min_score
         RETURN 
             e.uuid AS uuid,
             e.fact AS fact,
@@ -397,14 +543,25 @@ async def search_with_score_logic(client, search_data):
         LIMIT $limit
     """
     
-    params = {
-        "search_vector": query_embedding,
-        "limit": search_data.num_results
-    }
-    if search_data.group_ids:
-        params["group_ids"] = search_data.group_ids
+    async def search_graph(graph_client, graph_group_ids):
+        params = {
+            "search_vector": query_embedding,
+            "limit": search_data.num_results,
+            "min_score": min_score,
+            **temporal_params,
+        }
+        if graph_group_ids:
+            params["group_ids"] = graph_group_ids
+        elif hidden:
+            params["hidden_group_ids"] = sorted(hidden)
+        records, _, _ = await graph_client.driver.execute_query(query, **params)
+        return records
     
-    records, _, _ = await client.driver.execute_query(query, **params)
+    # One query per graph holding the groups, merged by score
+    parts = await graph_router.fan_out(group_ids, search_graph, read=True)
+    records = sorted(
+        (record for records in parts for record in records), key=lambda r: r["score"], reverse=True
+    )[: search_data.num_results]
     
     results = []
     for record in records:
@@ -0,0 +1,99 @@
+"""
+Near-duplicate collapsing and MMR diversification of fact results
+
+A user who said the same thing many times has many near-identical facts
+("User likes coffee", "The user enjoys coffee"), and a plain top-k spends
+most of its slots on them. With diversify on, searches fetch
+DIVERSIFY_CANDIDATES times more candidates and pick results greedily by
+maximal marginal relevance:
+
+    mmr = lambda * relevance - (1 - lambda) * max similarity to the picked facts
+
+Relevance is the candidate's search score scaled to [0, 1] over the
+candidate set (its rank when the search gave no scores), similarity is the
+cosine of the fact embeddings. A candidate at least dedup_threshold similar
+to an already picked fact, or with the same text, is collapsed into it: it
+is dropped and its uuid listed in the kept fact's `duplicates`.
+"""
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from .config import settings
+from .vector_index import fact_vectors
+
+logger = logging.getLogger(__name__)
+
+class DiversifyOptions(BaseModel):
+    """Request fields controlling diversification; lambda and threshold default to settings."""
+    diversify: bool = False
+    # 1.0 ranks by relevance only, lower values favour facts unlike those already picked
+    mmr_lambda: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    # Cosine similarity above which a fact counts as a duplicate of a picked one
+    dedup_threshold: Optional[float] = Field(default=None, gt=0.0, le=1.0)
+
+    def candidates(self, k: int) -> int:
+        """Candidates to fetch for k results."""
+        return k * max(1, settings.DIVERSIFY_CANDIDATES) if self.diversify else k
+
+def _score(result) -> Optional[float]:
+    score = getattr(result, "score", None)
+    return score if score is not None else getattr(result, "relevance_score", None)
+
+def _relevance(results: List) -> np.ndarray:
+    scores = [_score(result) for result in results]
+    if any(score is None for score in scores):
+        return 1.0 - np.arange(len(results)) / max(1, len(results))
+    scores = np.asarray(scores, dtype=np.float32)
+    spread = scores.max() - scores.min()
+    return (scores - scores.min()) / spread if spread > 0 else np.ones(len(scores))
+
+def mmr_select(
+    results: List,
+    vectors: Dict[str, np.ndarray],
+    k: int,
+    mmr_lambda: float,
+    dedup_threshold: float,
+) -> List[tuple]:
+    """(result, duplicate uuids) pairs of up to k results picked by MMR."""
+    relevance = _relevance(results)
+    texts = [(getattr(result, "fact", "") or "").strip().lower() for result in results]
+    # Similarity to the closest picked fact, per candidate
+    closest = np.full(len(results), -1.0)
+    remaining = set(range(len(results)))
+    picked: List[int] = []
+    duplicates: Dict[int, List[str]] = {}
+    while remaining and len(picked) < k:
+        best = max(remaining, key=lambda i: (mmr_lambda * relevance[i] - (1 - mmr_lambda) * max(closest[i], 0.0), -i))
+        remaining.discard(best)
+        picked.append(best)
+        duplicates[best] = []
+        vector = vectors.get(str(results[best].uuid))
+        for i in list(remaining):
+            other = vectors.get(str(results[i].uuid))
+            if vector is not None and other is not None and len(other) == len(vector):
+                similarity = float(vector @ other)
+            else:
+                similarity = 1.0 if texts[i] and texts[i] == texts[best] else 0.0
+            closest[i] = max(closest[i], similarity)
+            if similarity >= dedup_threshold:
+                remaining.discard(i)
+                duplicates[best].append(str(results[i].uuid))
+    return [(results[i], duplicates[i]) for i in picked]
+
+async def diversify(
+    results: List, options: DiversifyOptions, group_ids: Optional[List[str]], k: int
+) -> List[tuple]:
+    """(result, duplicate uuids) pairs of up to k diverse results, in pick order."""
+    if not results:
+        return []
+    mmr_lambda = settings.DIVERSIFY_LAMBDA if options.mmr_lambda is None else options.mmr_lambda
+    threshold = settings.DIVERSIFY_DEDUP_THRESHOLD if options.dedup_threshold is None else options.dedup_threshold
+    vectors = await fact_vectors(results, group_ids)
+    selected = mmr_select(results, vectors, k, mmr_lambda, threshold)
+    collapsed = sum(len(dups) for _, dups in selected)
+    if collapsed:
+        logger.info(f"Collapsed {collapsed} near-duplicate facts out of {len(results)} candidates")
+    return selected
@@ -0,0 +1,138 @@
+"""
+Benchmark of reduced-dimension and quantized embeddings on a group's own data
+
+Loads the group's full-precision fact embeddings, uses a sample of them as
+queries and compares every (dimensions, dtype) combination against exact
+full-dimension float32 search: recall@k with and without rescoring, and the
+bytes per fact in FalkorDB and in the in-process index.
+
+Dimension truncation keeps a prefix of each vector and renormalises it, which
+is what text-embedding-3 models return for a smaller `dimensions`; for other
+models the truncated results are not meaningful.
+"""
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+from fastapi import Request, HTTPException
+from pydantic import BaseModel
+
+from .config import settings
+from .sharding import graph_router
+from .vector_index import VectorDType, normalize, quantize, similarities
+
+logger = logging.getLogger(__name__)
+
+_EMBEDDINGS_QUERY = """
+MATCH ()-[e:RELATES_TO]->()
+WHERE e.group_id = $group_id AND e.fact_embedding IS NOT NULL
+RETURN e.fact_embedding AS embedding
+LIMIT $limit
+"""
+
+class EmbeddingBenchmarkRequest(BaseModel):
+    group_id: str
+    k: int = 10
+    # Defaults to the stored dimension plus its half and quarter
+    dimensions: Optional[List[int]] = None
+    dtypes: List[VectorDType] = ["float32", "float16", "int8"]
+    sample_queries: int = 200
+    max_facts: int = 50000
+    rescore_oversample: Optional[int] = None
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+def _exclude_self(scores: np.ndarray, query_rows: np.ndarray):
+    # A fact is trivially its own nearest neighbour
+    scores[np.arange(len(query_rows)), query_rows] = -np.inf
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found.tolist(), truth.tolist()))
+    return hits / truth.size
+
+def run_benchmark(embeddings: List[List[float]], data: EmbeddingBenchmarkRequest) -> dict:
+    full = np.asarray(embeddings, dtype=np.float32)
+    count, stored_dim = full.shape
+    k = min(data.k, count - 1)
+    oversample = data.rescore_oversample or settings.VECTOR_INDEX_RESCORE_OVERSAMPLE
+    rng = np.random.default_rng(0)
+    query_rows = rng.choice(count, size=min(data.sample_queries, count), replace=False)
+
+    base = normalize(full)
+    exact = base[query_rows] @ base.T
+    _exclude_self(exact, query_rows)
+    truth = _top_k(exact, k)
+    full_bytes = stored_dim * 4
+
+    dimensions = data.dimensions or [stored_dim, stored_dim // 2, stored_dim // 4]
+    results = []
+    for dim in sorted({d for d in dimensions if 0 < d <= stored_dim}, reverse=True):
+        truncated = normalize(full[:, :dim])
+        queries = truncated[query_rows]
+        # What FalkorDB would hold with EMBEDDING_DIM=dim, used for rescoring
+        stored_scores = queries @ truncated.T
+        _exclude_self(stored_scores, query_rows)
+
+        for dtype in data.dtypes:
+            rows, scales = quantize(truncated, dtype)
+            started = time.perf_counter()
+            approx = np.stack([similarities(rows, scales, q) for q in queries])
+            search_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            _exclude_self(approx, query_rows)
+            found = _top_k(approx, k)
+
+            entry = {
+                "dimensions": dim,
+                "dtype": dtype,
+                "falkordb_bytes_per_fact": dim * 4,
+                "index_bytes_per_fact": dim * rows.itemsize + (4 if dtype == "int8" else 0),
+                "recall_at_k": round(_recall(found, truth), 4),
+                "search_ms_per_query": round(search_ms, 3),
+            }
+            entry["falkordb_memory_saved"] = round(1 - entry["falkordb_bytes_per_fact"] / full_bytes, 4)
+            entry["index_memory_saved"] = round(1 - entry["index_bytes_per_fact"] / full_bytes, 4)
+            if dtype != "float32":
+                shortlist = _top_k(approx, min(k * oversample, count - 1))
+                shortlist_scores = np.take_along_axis(stored_scores, shortlist, axis=1)
+                order = np.argsort(-shortlist_scores, axis=1)[:, :k]
+                rescored = np.take_along_axis(shortlist, order, axis=1)
+                entry["recall_at_k_rescored"] = round(_recall(rescored, truth), 4)
+            results.append(entry)
+
+    return {
+        "facts": count,
+        "stored_dimensions": stored_dim,
+        "queries": len(query_rows),
+        "k": k,
+        "rescore_oversample": oversample,
+        "full_bytes": count * full_bytes,
+        "results": results,
+    }
+
+async def benchmark_embeddings(request: Request, data: EmbeddingBenchmarkRequest) -> dict:
+    """
+    Measure memory saved and recall@k of truncated/quantized embeddings on one group
+    """
+    try:
+        client = await graph_router.for_group(data.group_id, read=True)
+        records, _, _ = await client.driver.execute_query(
+            _EMBEDDINGS_QUERY, group_id=data.group_id, limit=data.max_facts
+        )
+        # Keep the dominant dimension; mixed rows are left over from a model change
+        dims = [len(r["embedding"]) for r in records]
+        if not dims:
+            raise HTTPException(status_code=404, detail=f"No embedded facts in group {data.group_id}")
+        dim = max(set(dims), key=dims.count)
+        embeddings = [r["embedding"] for r in records if len(r["embedding"]) == dim]
+        if len(embeddings) < 2:
+            raise HTTPException(status_code=400, detail="At least two embedded facts are needed")
+        # CPU-bound: keep the event loop free
+        return await asyncio.to_thread(run_benchmark, embeddings, data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Embedding benchmark failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
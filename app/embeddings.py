@@ -0,0 +1,48 @@
+"""
+Embedder construction from Settings
+
+text-embedding-3 models are trained so that a prefix of the vector is itself
+a usable embedding, and the API returns it directly when asked for fewer
+`dimensions`. Requesting EMBEDDING_DIM from the API (instead of slicing a
+full 1536-float response client-side) shrinks responses and gives properly
+normalised vectors; every stored fact and entity embedding then takes
+EMBEDDING_DIM * 4 bytes in FalkorDB.
+
+Changing DEFAULT_EMBEDDING_MODEL or EMBEDDING_DIM on a deployment with data
+requires POST /admin/reembed before search results are meaningful again.
+"""
+from typing import List
+
+from graphiti_core.embedder import OpenAIEmbedder, OpenAIEmbedderConfig
+
+from .config import settings
+
+def supports_dimensions(model: str) -> bool:
+    """Whether the model accepts the `dimensions` request parameter."""
+    return model.startswith("text-embedding-3")
+
+class DimensionedOpenAIEmbedder(OpenAIEmbedder):
+    """OpenAIEmbedder that asks the API for embedding_dim dimensions when the model allows it."""
+
+    def _request_kwargs(self) -> dict:
+        kwargs = {"model": self.config.embedding_model}
+        if supports_dimensions(self.config.embedding_model):
+            kwargs["dimensions"] = self.config.embedding_dim
+        return kwargs
+
+    async def create(self, input_data) -> List[float]:
+        result = await self.client.embeddings.create(input=input_data, **self._request_kwargs())
+        return result.data[0].embedding[: self.config.embedding_dim]
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        result = await self.client.embeddings.create(input=input_data_list, **self._request_kwargs())
+        return [embedding.embedding[: self.config.embedding_dim] for embedding in result.data]
+
+def create_embedder() -> OpenAIEmbedder:
+    """Embedder configured from DEFAULT_EMBEDDING_MODEL and EMBEDDING_DIM."""
+    config = OpenAIEmbedderConfig(
+        embedding_model=settings.DEFAULT_EMBEDDING_MODEL,
+        embedding_dim=settings.EMBEDDING_DIM,
+        api_key=settings.OPENAI_API_KEY,
+    )
+    return DimensionedOpenAIEmbedder(config)
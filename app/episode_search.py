@@ -0,0 +1,259 @@
+"""
+Episode search
+
+Finds the raw episodes (messages, documents) where something was said, for
+the `episodes` layer of /search. Two retrievers, both filtering by group and
+time inside the query so the limit is taken among qualifying episodes:
+
+- fulltext: FalkorDB's fulltext index on Episodic content, which graphiti
+  creates with its other indexes;
+- vector (EPISODE_EMBEDDINGS_ENABLED): episode content is split into
+  overlapping chunks of EPISODE_CHUNK_CHARS characters at ingestion and each
+  chunk embedding is stored on an EpisodeChunk node carrying the episode's
+  uuid, group, time and the chunk's offsets in the content. Chunks are found
+  through a FalkorDB vector index; group and time filters apply to the
+  EPISODE_VECTOR_CANDIDATES nearest chunks per requested episode. An episode
+  scores as its best chunk.
+
+With both, the two rankings are merged by reciprocal rank fusion. Episodes
+ingested before chunk embeddings were enabled are found by fulltext only.
+
+An episode is a point in time (its valid_at, the reference time it was sent
+with), so an as_of/valid_only window keeps episodes from up to that time and
+a valid_between range keeps episodes inside it.
+"""
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .sharding import graph_router, graph_of, merge_scored
+from .temporal import Window
+
+logger = logging.getLogger(__name__)
+
+_EPISODE_FIELDS = """
+       e.uuid AS uuid, e.name AS name, e.content AS content, e.group_id AS group_id,
+       e.source_description AS source_description, e.created_at AS created_at, e.valid_at AS valid_at
+"""
+
+_FULLTEXT_QUERY = """
+CALL db.idx.fulltext.queryNodes('Episodic', $query) YIELD node AS e, score
+WITH e, score
+WHERE true {filters}
+RETURN {fields}, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+_VECTOR_QUERY = """
+CALL db.idx.vector.queryNodes('EpisodeChunk', 'chunk_embedding', $candidates, vecf32($vector)) YIELD node AS c
+WITH c
+WHERE true {filters}
+WITH c.episode_uuid AS episode_uuid, max((2 - vec.cosineDistance(c.chunk_embedding, vecf32($vector)))/2) AS score
+ORDER BY score DESC
+LIMIT $limit
+MATCH (e:Episodic {{uuid: episode_uuid}})
+RETURN {fields}, score
+ORDER BY score DESC
+"""
+
+_WRITE_CHUNKS_QUERY = """
+UNWIND $rows AS row
+MERGE (c:EpisodeChunk {uuid: row.uuid})
+SET c.episode_uuid = row.episode_uuid, c.group_id = row.group_id, c.chunk = row.chunk,
+    c.start = row.start, c.end = row.end, c.valid_at = row.valid_at, c.created_at = row.created_at,
+    c.chunk_embedding = vecf32(row.embedding)
+"""
+
+DELETE_CHUNKS_QUERY = """
+MATCH (c:EpisodeChunk)
+WHERE c.episode_uuid IN $uuids
+DELETE c
+"""
+
+def _chunk_indexes() -> Tuple[str, ...]:
+    return (
+        "CREATE INDEX FOR (c:EpisodeChunk) ON (c.group_id)",
+        "CREATE INDEX FOR (c:EpisodeChunk) ON (c.episode_uuid)",
+        "CREATE VECTOR INDEX FOR (c:EpisodeChunk) ON (c.chunk_embedding) "
+        f"OPTIONS {{dimension: {settings.EMBEDDING_DIM}, similarityFunction: 'cosine'}}",
+    )
+
+_WORD = re.compile(r"\w+")
+
+# Fulltext terms per query; longer queries are cut
+_MAX_TERMS = 32
+
+def fulltext_terms(query: str) -> str:
+    """The query as an OR of its words, free of fulltext syntax characters."""
+    words = list(dict.fromkeys(word.lower() for word in _WORD.findall(query)))[:_MAX_TERMS]
+    return " | ".join(words)
+
+def episode_condition(alias: str, windows: List[Window]) -> tuple:
+    """WHERE condition on an episode's point in time and its parameters, '' when unfiltered."""
+    conditions = []
+    params = {}
+    for i, (start, end) in enumerate(windows):
+        if end is not None:
+            conditions.append(f"{alias}.valid_at <= $episode_end_{i}")
+            params[f"episode_end_{i}"] = end.isoformat()
+        if start is not None and start != end:
+            conditions.append(f"{alias}.valid_at >= $episode_start_{i}")
+            params[f"episode_start_{i}"] = start.isoformat()
+    return " AND ".join(conditions), params
+
+def _filters(alias: str, group_ids: Optional[List[str]], windows: List[Window]) -> tuple:
+    condition, params = episode_condition(alias, windows)
+    filters = f"AND {alias}.group_id IN $group_ids" if group_ids else ""
+    if condition:
+        filters += f" AND {condition}"
+    return filters, params
+
+def chunk_spans(text: str, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """(start, end) offsets of overlapping chunks of about size characters, split at whitespace where possible."""
+    first = len(text) - len(text.lstrip())
+    last = len(text.rstrip())
+    if last - first <= size:
+        return [(first, last)] if last > first else []
+    spans = []
+    start = first
+    while start < last:
+        end = min(start + size, last)
+        if end < last:
+            space = text.rfind(" ", start + size // 2, end)
+            end = space if space > start else end
+        # Chunks carry no surrounding whitespace
+        chunk_start, chunk_end = start, end
+        while chunk_start < chunk_end and text[chunk_start].isspace():
+            chunk_start += 1
+        while chunk_end > chunk_start and text[chunk_end - 1].isspace():
+            chunk_end -= 1
+        if chunk_end > chunk_start:
+            spans.append((chunk_start, chunk_end))
+        if end >= last:
+            break
+        start = max(end - overlap, start + 1)
+        # Begin the overlap at a word boundary when there is one
+        if not text[start - 1].isspace():
+            space = text.find(" ", start, end)
+            if space != -1:
+                start = space + 1
+    return spans
+
+def chunk_text(text: str, size: int, overlap: int) -> List[str]:
+    """Overlapping chunks of about size characters, split at whitespace where possible."""
+    return [text[start:end] for start, end in chunk_spans(text, size, overlap)]
+
+async def _fulltext(group_ids: Optional[List[str]], query: str, windows: List[Window], limit: int) -> List[tuple]:
+    terms = fulltext_terms(query)
+    if not terms:
+        return []
+
+    async def fetch(client, graph_group_ids):
+        filters, params = _filters("e", graph_group_ids, windows)
+        records, _, _ = await client.driver.execute_query(
+            _FULLTEXT_QUERY.format(filters=filters, fields=_EPISODE_FIELDS),
+            query=terms, group_ids=graph_group_ids or [], limit=limit, **params,
+        )
+        return [(record, record["score"]) for record in records]
+    return merge_scored(await graph_router.fan_out(group_ids, fetch, read=True), limit)
+
+async def _vector(
+    embedder, group_ids: Optional[List[str]], query: str, windows: List[Window], limit: int
+) -> List[tuple]:
+    vector = await embedder.create(input_data=[query])
+
+    async def fetch(client, graph_group_ids):
+        await episode_chunks.ensure_indexes(client)
+        filters, params = _filters("c", graph_group_ids, windows)
+        records, _, _ = await client.driver.execute_query(
+            _VECTOR_QUERY.format(filters=filters, fields=_EPISODE_FIELDS),
+            vector=vector, group_ids=graph_group_ids or [], limit=limit,
+            candidates=limit * max(1, settings.EPISODE_VECTOR_CANDIDATES), **params,
+        )
+        return [(record, record["score"]) for record in records]
+    return merge_scored(await graph_router.fan_out(group_ids, fetch, read=True), limit)
+
+def _rrf(rankings: List[List[tuple]], limit: int, k: int = 60) -> List[tuple]:
+    scores: Dict[str, float] = {}
+    records = {}
+    for ranking in rankings:
+        for rank, (record, _) in enumerate(ranking):
+            scores[record["uuid"]] = scores.get(record["uuid"], 0.0) + 1.0 / (k + rank + 1)
+            records[record["uuid"]] = record
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [(records[uuid], scores[uuid]) for uuid in ranked]
+
+async def search_episodes(
+    embedder,
+    query: str,
+    group_ids: Optional[List[str]],
+    windows: List[Window],
+    limit: int,
+    vector: bool = True,
+) -> List[tuple]:
+    """(episode record, score) pairs of the best matching episodes."""
+    if limit <= 0:
+        return []
+    rankings = [await _fulltext(group_ids, query, windows, limit)]
+    if vector and settings.EPISODE_EMBEDDINGS_ENABLED:
+        rankings.append(await _vector(embedder, group_ids, query, windows, limit))
+        return _rrf(rankings, limit)
+    return rankings[0]
+
+class EpisodeChunkIndexer:
+    """Writes chunk embeddings of newly ingested episodes."""
+
+    def __init__(self):
+        self._indexed_graphs = set()
+        self.stats = {"episodes": 0, "chunks": 0, "failures": 0}
+
+    async def ensure_indexes(self, client):
+        graph = graph_of(client)
+        if graph in self._indexed_graphs:
+            return
+        for statement in _chunk_indexes():
+            try:
+                await client.driver.execute_query(statement)
+            except Exception as e:
+                # FalkorDB rejects an index that already exists
+                logger.debug(f"Episode chunk index not created: {e}")
+        self._indexed_graphs.add(graph)
+
+    async def index(self, client, episode):
+        """Embed and store the chunks of an episode; never fails the ingestion."""
+        if not settings.EPISODE_EMBEDDINGS_ENABLED or episode is None:
+            return
+        try:
+            content = episode.content or ""
+            spans = chunk_spans(content, settings.EPISODE_CHUNK_CHARS, settings.EPISODE_CHUNK_OVERLAP_CHARS)
+            if not spans:
+                return
+            await self.ensure_indexes(client)
+            embeddings = await client.embedder.create_batch([content[start:end] for start, end in spans])
+            rows = [
+                {
+                    "uuid": f"{episode.uuid}:{i}",
+                    "episode_uuid": episode.uuid,
+                    "group_id": episode.group_id,
+                    "chunk": i,
+                    "start": spans[i][0],
+                    "end": spans[i][1],
+                    "valid_at": episode.valid_at.isoformat() if episode.valid_at else None,
+                    "created_at": episode.created_at.isoformat() if episode.created_at else None,
+                    "embedding": embedding,
+                }
+                for i, embedding in enumerate(embeddings)
+            ]
+            await client.driver.execute_query(_WRITE_CHUNKS_QUERY, rows=rows)
+            self.stats["episodes"] += 1
+            self.stats["chunks"] += len(rows)
+        except Exception as e:
+            self.stats["failures"] += 1
+            logger.warning(f"Embedding chunks of episode {episode.uuid} failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {"enabled": settings.EPISODE_EMBEDDINGS_ENABLED, **self.stats}
+
+episode_chunks = EpisodeChunkIndexer()
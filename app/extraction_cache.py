@@ -0,0 +1,181 @@
+"""
+Persistent cache for LLM extraction results
+
+Every LLM call graphiti makes during ingestion (entity/edge extraction,
+deduplication, summaries) is stored in SQLite, keyed by a hash of the
+rendered prompt (which embeds the episode body), the prompt version and the
+model. Replaying identical content - reindexing, retrying a failed job,
+moving a group between environments - is then served from disk instead of
+being paid for again.
+"""
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """SQLite-backed key/value store for LLM responses."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                prompt_version TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(messages: list, model: str, prompt_version: str, extra: str = "") -> str:
+        """Hash the rendered prompt together with the prompt version and model."""
+        digest = hashlib.sha256()
+        digest.update(f"{prompt_version}\x00{model}\x00{extra}".encode("utf-8"))
+        for message in messages:
+            role = getattr(message, "role", "")
+            content = getattr(message, "content", message)
+            digest.update(f"\x00{role}\x00{content}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, model: str, prompt_version: str, payload: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache "
+                "(key, model, prompt_version, response, size, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, payload, len(payload.encode("utf-8")), time.time()),
+            )
+            self._conn.commit()
+
+    def _stats(self) -> tuple:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache"
+            ).fetchone()
+
+    def _clear(self) -> int:
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM extraction_cache").rowcount
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+        return deleted
+
+    async def get(self, key: str) -> Optional[dict]:
+        payload = await asyncio.to_thread(self._get, key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(payload)
+
+    async def set(self, key: str, model: str, prompt_version: str, response: dict):
+        payload = json.dumps(response, default=str)
+        await asyncio.to_thread(self._set, key, model, prompt_version, payload)
+
+    async def stats(self) -> dict:
+        entries, stored_bytes = await asyncio.to_thread(self._stats)
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "stored_bytes": stored_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def clear(self) -> int:
+        self.hits = 0
+        self.misses = 0
+        return await asyncio.to_thread(self._clear)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachingLLMClient:
+    """
+    Wraps a graphiti LLMClient and serves repeated prompts from an ExtractionCache.
+
+    Everything except generate_response is delegated to the wrapped client, so
+    the wrapper can be handed to Graphiti in place of the original.
+    """
+
+    def __init__(self, llm_client: Any, cache: ExtractionCache, prompt_version: str):
+        self._llm_client = llm_client
+        self._cache = cache
+        self._prompt_version = prompt_version
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm_client, name)
+
+    def _call_options(self, messages: list, response_model: Any, args: tuple, kwargs: dict) -> tuple:
+        """model_size and attribute_extraction of a call, however they were passed."""
+        try:
+            bound = inspect.signature(self._llm_client.generate_response).bind(
+                messages, response_model, *args, **kwargs
+            )
+            bound.apply_defaults()
+            options = bound.arguments
+        except (TypeError, ValueError):
+            options = kwargs
+        model_size = getattr(options.get("model_size"), "value", options.get("model_size")) or "medium"
+        return model_size, bool(options.get("attribute_extraction", False))
+
+    async def generate_response(self, messages: list, response_model: Any = None, *args, **kwargs) -> dict:
+        model = getattr(self._llm_client, "model", None) or ""
+        model_size, attribute_extraction = self._call_options(messages, response_model, args, kwargs)
+        if model_size == "small":
+            model = getattr(self._llm_client, "small_model", None) or model
+        response_name = getattr(response_model, "__name__", "") if response_model else ""
+        extra = f"{response_name}\x00{model_size}\x00{attribute_extraction}"
+
+        # The key must be computed before the call: the client appends
+        # language instructions to the first message in place.
+        key = self._cache.make_key(messages, model, self._prompt_version, extra)
+        try:
+            cached = await self._cache.get(key)
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+            cached = None
+        if cached is not None:
+            return cached
+
+        response = await self._llm_client.generate_response(messages, response_model, *args, **kwargs)
+        try:
+            await self._cache.set(key, model, self._prompt_version, response)
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+        return response
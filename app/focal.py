@@ -0,0 +1,137 @@
+"""
+Focal-node distance reranking
+
+A search with focal_node_uuid ranks facts near the focal entity first. The
+same agent sends the same focal node (its user's entity) on every turn, so
+instead of having graphiti measure graph distances per request, a BFS
+distance map of the focal node is computed once up to
+FOCAL_DISTANCE_MAX_DEPTH hops and kept in a per-worker LRU. The search
+itself then runs as a plain search (hot groups included) and the candidates
+are reordered with the cached map.
+
+Map entries carry the version of the focal node's group. Ingestions made by
+this worker are replayed on the map: a new fact leaves every distance
+unchanged unless it gives one of its entities a shorter path within the
+depth limit, in which case the map is dropped. Any other write to the group
+makes the map stale and it is recomputed on the next search.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from .config import settings
+from .cache import LocalLRU, query_cache
+from .sharding import graph_router
+from .neighborhood import entity_group
+
+logger = logging.getLogger(__name__)
+
+_NEIGHBORS_QUERY = """
+MATCH (n:Entity)-[:RELATES_TO]-(m:Entity)
+WHERE n.uuid IN $frontier
+RETURN DISTINCT m.uuid AS uuid
+LIMIT $limit
+"""
+
+class DistanceMap:
+    """Hop distances from a focal entity, up to the depth limit."""
+
+    def __init__(self, group_id: str, version: int, distances: Dict[str, int], complete: bool):
+        self.group_id = group_id
+        self.version = version
+        self.distances = distances
+        # False when FOCAL_DISTANCE_MAX_NODES cut the BFS short
+        self.complete = complete
+
+    def distance(self, uuid: Optional[str]) -> float:
+        return self.distances.get(uuid, float("inf"))
+
+    def shortens(self, source: str, target: str) -> bool:
+        """Whether a new edge between source and target changes any distance within the map."""
+        for a, b in ((source, target), (target, source)):
+            d = self.distance(a)
+            if d < settings.FOCAL_DISTANCE_MAX_DEPTH and d + 1 < self.distance(b):
+                return True
+        return False
+
+async def _bfs(uuid: str, group_id: str) -> tuple:
+    client = await graph_router.for_group(group_id, read=True)
+    budget = settings.FOCAL_DISTANCE_MAX_NODES
+    distances = {uuid: 0}
+    frontier = [uuid]
+    complete = True
+    for depth in range(1, settings.FOCAL_DISTANCE_MAX_DEPTH + 1):
+        if not frontier:
+            break
+        records, _, _ = await client.driver.execute_query(_NEIGHBORS_QUERY, frontier=frontier, limit=budget + 1)
+        frontier = [r["uuid"] for r in records if r["uuid"] not in distances]
+        if len(records) > budget or len(distances) + len(frontier) > budget:
+            frontier = frontier[: max(0, budget - len(distances))]
+            complete = False
+        for node in frontier:
+            distances[node] = depth
+        if not complete:
+            break
+    return distances, complete
+
+class FocalDistanceCache:
+    """Per-worker LRU of focal-node distance maps."""
+
+    def __init__(self):
+        self.lru = LocalLRU(settings.FOCAL_DISTANCE_CACHE_ENTRIES)
+        self.stats = {"hits": 0, "computed": 0, "incremental_updates": 0, "dropped": 0}
+
+    async def get(self, uuid: str) -> Optional[DistanceMap]:
+        """Distance map of the focal entity, or None when it does not exist."""
+        group_id = await entity_group(uuid)
+        if group_id is None:
+            return None
+        version = (await query_cache.group_versions([group_id]))[group_id]
+        cached = self.lru.get(uuid)
+        if cached is not None and cached.version == version:
+            self.stats["hits"] += 1
+            return cached
+        distances, complete = await _bfs(uuid, group_id)
+        self.stats["computed"] += 1
+        distance_map = DistanceMap(group_id, version, distances, complete)
+        self.lru.set(uuid, distance_map, settings.FOCAL_DISTANCE_CACHE_TTL_SECONDS)
+        return distance_map
+
+    def apply(self, versions: Dict[str, int], group_id: Optional[str], edges: Iterable):
+        """Replay a write of this worker on the cached maps of its group."""
+        version = versions.get(group_id)
+        if group_id is None or version is None:
+            return
+        edges = list(edges)
+        for uuid, distance_map in self.lru.items():
+            if distance_map.group_id != group_id:
+                continue
+            if distance_map.version != version - 1 or not distance_map.complete or any(
+                distance_map.shortens(edge.source_node_uuid, edge.target_node_uuid) for edge in edges
+            ):
+                self.lru.pop(uuid)
+                self.stats["dropped"] += 1
+                continue
+            distance_map.version = version
+            self.stats["incremental_updates"] += 1
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self.lru), **self.stats}
+
+focal_distances = FocalDistanceCache()
+
+def rerank_by_distance(results: List, distance_map: DistanceMap, limit: int) -> List:
+    """
+    Order facts by the distance of their nearer entity to the focal node, and
+    entities by their own distance, keeping search order within a distance.
+    """
+    def key(item):
+        rank, result = item
+        if hasattr(result, "source_node_uuid"):
+            distance = min(
+                distance_map.distance(result.source_node_uuid),
+                distance_map.distance(getattr(result, "target_node_uuid", None)),
+            )
+        else:
+            distance = distance_map.distance(getattr(result, "uuid", None))
+        return distance, rank
+    return [result for _, result in sorted(enumerate(results), key=key)][:limit]
@@ -1,11 +1,26 @@
+import asyncio
 import logging
+import time
 from datetime import datetime, timezone
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel, Field, model_validator
 
 from graphiti_core import Graphiti
 from graphiti_core.nodes import EpisodeType
 from .config import settings
+from .group_deletion import tombstones
+from .ingestion import ingestion_tracker
+from .cache import query_cache, cache_key, embedding_key, invalidate_groups, primed_vectors
+from .vector_index import index_edges, search_hot_groups, cosine_scorer
+from .sharding import graph_router, merge_ranked, merge_scored
+from .temporal import TemporalFilter, search_filters
+from .summaries import group_summaries
+from .focal import focal_distances, rerank_by_distance
+from .search_recipes import RecipeName, SearchMethodName, build_config, recipe_methods, reranker_filters
+from .planner import RetrievalPlan, planner
+from .diversify import DiversifyOptions, diversify
+from .episode_search import episode_chunks, search_episodes
 # Setup logging
 logger = logging.getLogger(__name__)
 
@@ -21,11 +36,32 @@ class EpisodeResponse(BaseModel):
     status: str
     episode_id: Optional[str] = None
 
-class SearchRequest(BaseModel):
+class SearchLimits(BaseModel):
+    # None means num_results; a layer with limit 0 is not searched
+    edges: Optional[int] = Field(default=None, ge=0)
+    nodes: int = Field(default=0, ge=0)
+    episodes: int = Field(default=0, ge=0)
+
+class SearchRequest(TemporalFilter, DiversifyOptions):
     query: str
     group_ids: Optional[List[str]] = None
     num_results: int = 10
     focal_node_uuid: Optional[str] = None
+    min_score: Optional[float] = None
+    recipe: Optional[RecipeName] = None
+    limits: Optional[SearchLimits] = None
+    methods: Optional[List[SearchMethodName]] = Field(default=None, min_length=1)
+
+    @model_validator(mode="after")
+    def _check_recipe(self):
+        if self.recipe == "node_distance" and not self.focal_node_uuid:
+            raise ValueError("recipe node_distance needs focal_node_uuid")
+        return self
+
+    @property
+    def advanced(self) -> bool:
+        """Whether the request needs graphiti's configurable search rather than the plain one."""
+        return self.recipe is not None or self.limits is not None or self.methods is not None
 
 class SearchResultEdge(BaseModel):
     fact: str
@@ -34,27 +70,112 @@ class SearchResultEdge(BaseModel):
     valid_at: datetime | None = None
     invalid_at: datetime | None = None
     relevance_score: float | None = None
+    # uuids of near-duplicate facts collapsed into this one (diversify only)
+    duplicates: List[str] | None = None
+
+class SearchResultNode(BaseModel):
+    uuid: str
+    name: str
+    summary: str | None = None
+    labels: List[str] = []
+    group_id: str | None = None
+    created_at: datetime | None = None
+    relevance_score: float | None = None
 
 class SearchResultEpisode(BaseModel):
     content: str
     created_at: datetime | None = None
+    uuid: str | None = None
+    name: str | None = None
+    source_description: str | None = None
+    valid_at: datetime | None = None
+    relevance_score: float | None = None
 
 class SearchResponse(BaseModel):
     edges: List[SearchResultEdge]
     episodes: List[SearchResultEpisode]
+    nodes: List[SearchResultNode] = []
+    # How the request was answered (see planner.py); None for cached responses from before plans
+    plan: Optional[RetrievalPlan] = None
+
+class BatchSearchRequest(BaseModel):
+    searches: List[SearchRequest]
+
+class BatchSearchResult(BaseModel):
+    result: Optional[SearchResponse] = None
+    error: Optional[str] = None
+    elapsed_ms: float
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchResult]
+    embedding_ms: float
+    elapsed_ms: float
 
 # --- Core Logic Functions ---
 
+def _score(result) -> Optional[float]:
+    return getattr(result, "score", None)
+
+async def fetch_above_min_score(fetch, k: int, min_score: Optional[float], scorer=None) -> list:
+    """
+    Up to k results scoring at least min_score, for searches that cannot apply
+    the threshold in the query itself.
+
+    fetch(n) returns the n best results. While too few of them qualify, n
+    grows by MIN_SCORE_OVERFETCH_FACTOR until the results run out or n
+    reaches MIN_SCORE_MAX_CANDIDATES. Results that carry no score of their own,
+    like graphiti's EntityEdges, are scored by scorer (see cosine_scorer);
+    results left without a score are kept.
+    """
+    if min_score is None:
+        return await fetch(k)
+    scored = {}
+
+    def score_of(result) -> Optional[float]:
+        score = _score(result)
+        return score if score is not None else scored.get(str(result.uuid))
+
+    n = k
+    while True:
+        results = await fetch(n)
+        if scorer is not None:
+            unscored = [r for r in results if _score(r) is None and str(r.uuid) not in scored]
+            scored.update(await scorer(unscored))
+        qualifying = [r for r in results if score_of(r) is None or score_of(r) >= min_score]
+        if len(qualifying) >= k or len(results) < n:
+            break
+        scores = [score_of(r) for r in results]
+        if None not in scores and scores == sorted(scores, reverse=True) and scores[-1] < min_score:
+            # Ranked by score and already below the threshold: nothing further down qualifies
+            break
+        widened = min(n * max(2, settings.MIN_SCORE_OVERFETCH_FACTOR), settings.MIN_SCORE_MAX_CANDIDATES)
+        if widened <= n:
+            break
+        logger.info(f"{len(qualifying)}/{k} results above min_score {min_score}, widening search to {widened}")
+        n = widened
+    return qualifying[:k]
+
+async def apply_ingestion(client: Graphiti, group_id: Optional[str], result) -> None:
+    """Bring caches and derived indexes up to date with an ingested episode."""
+    versions = await invalidate_groups(group_id)
+    names = {node.uuid: node.name for node in result.nodes}
+    index_edges(versions, group_id, result.edges, names)
+    await group_summaries.apply(versions, group_id, result.edges)
+    focal_distances.apply(versions, group_id, result.edges)
+    await episode_chunks.index(client, result.episode)
+
 async def add_episode_logic(client: Graphiti, episode_data: EpisodeRequest) -> dict:
     """Logic to add an episode to the knowledge graph."""
-    result = await client.add_episode(
-        name=episode_data.name,
-        episode_body=episode_data.content,
-        source_description=episode_data.source_description,
-        source=EpisodeType.text,
-        reference_time=datetime.now(timezone.utc),
-        group_id=episode_data.group_id,
-    )
+    async with ingestion_tracker.track():
+        result = await client.add_episode(
+            name=episode_data.name,
+            episode_body=episode_data.content,
+            source_description=episode_data.source_description,
+            source=EpisodeType.text,
+            reference_time=datetime.now(timezone.utc),
+            group_id=episode_data.group_id,
+        )
+    await apply_ingestion(client, episode_data.group_id, result)
     # result is AddEpisodeResults which contains: episode, nodes, edges
     episode_uuid = result.episode.uuid if hasattr(result, 'episode') else None
     nodes_count = len(result.nodes) if hasattr(result, 'nodes') else 0
@@ -69,27 +190,108 @@ async def add_episode_logic(client: Graphiti, episode_data: EpisodeRequest) -> d
         "edges_count": edges_count
     }
 
+async def _cache_response(response_key: Optional[str], response: SearchResponse) -> SearchResponse:
+    if response_key is not None:
+        await query_cache.set_json(
+            response_key, response.model_dump(mode="json"), settings.CACHE_SEARCH_TTL_SECONDS
+        )
+    return response
+
 async def search_logic(client: Graphiti, search_data: SearchRequest) -> SearchResponse:
     """Logic to search the knowledge graph."""
     logger.info(
         f"Searching with query='{search_data.query}' for groups={search_data.group_ids}"
     )
     try:
+        # Groups being deleted are invisible to search
+        hidden = tombstones.snapshot()
+        group_ids = None if search_data.group_ids is None else [g for g in search_data.group_ids if g not in hidden]
+        if search_data.group_ids and not group_ids:
+            return SearchResponse(episodes=[], edges=[])
+        # Serve repeated queries from the two-tier cache; group versions in
+        # the key make any write to these groups a cache miss
+        response_key = None
+        if settings.CACHE_ENABLED:
+            versions = await query_cache.group_versions(group_ids)
+            response_key = cache_key("search", search_data.model_dump(mode="json"), group_ids, versions)
+            cached = await query_cache.get_json(response_key)
+            if cached is not None:
+                logger.info("Search served from cache.")
+                return SearchResponse.model_validate(cached)
+        if search_data.advanced:
+            response = await recipe_search_logic(search_data, group_ids)
+            response.plan = RetrievalPlan(strategy="recipe", reason=f"recipe {search_data.recipe or 'rrf'} requested")
+            return await _cache_response(response_key, response)
+        if search_data.focal_node_uuid:
+            plan = RetrievalPlan(strategy="focal", reason="focal node requested")
+        else:
+            plan = await planner.choose(search_data.query, group_ids, search_data.num_results, search_data.min_score)
+        if plan.strategy == "keyword":
+            # Exact names are found by fulltext alone, without embedding the query
+            response = await recipe_search_logic(search_data.model_copy(update={"recipe": "fulltext"}), group_ids)
+            response.plan = plan
+            return await _cache_response(response_key, response)
         # Prepare search parameters
         search_kwargs = {"num_results": search_data.num_results}
-        if search_data.group_ids:
-            search_kwargs["group_ids"] = search_data.group_ids
+        if group_ids:
+            search_kwargs["group_ids"] = group_ids
+        # Validity constraints go into the graph query, ahead of top-k
+        windows = search_data.windows()
+        if windows:
+            search_kwargs["search_filter"] = search_filters(windows)
+        # A focal node reorders a wider candidate set with its cached distance map
+        distance_map = None
         if search_data.focal_node_uuid:
-            search_kwargs["focal_node_uuid"] = search_data.focal_node_uuid
-        results = await client.search(search_data.query, **search_kwargs)
+            distance_map = await focal_distances.get(search_data.focal_node_uuid)
+            if distance_map is None:
+                # Not an entity we can find; graphiti handles it as before
+                search_kwargs["focal_node_uuid"] = search_data.focal_node_uuid
+        limit = search_data.candidates(search_data.num_results)
+        if distance_map is not None:
+            limit *= max(1, settings.FOCAL_RERANK_CANDIDATES)
+        results = None
+        if plan.strategy == "scan":
+            results = await planner.scan(search_data.query, group_ids, windows, limit)
+            if results is None:
+                plan.strategy, plan.reason = "hybrid", "scan found more facts than requested"
+        if results is None and "focal_node_uuid" not in search_kwargs:
+            # Hot groups are answered from the in-process vector index
+            results = await search_hot_groups(
+                client, search_data.query, group_ids, limit, windows, search_data.min_score,
+                replaces_hybrid=True,
+            )
+            if results is not None and plan.strategy == "hybrid":
+                plan.strategy = "vector_index"
+        if results is None:
+            async def fetch(num_results):
+                # Groups sharded into different graphs are searched concurrently
+                async def search_graph(graph_client, graph_group_ids):
+                    kwargs = {**search_kwargs, "num_results": num_results}
+                    if graph_group_ids:
+                        kwargs["group_ids"] = graph_group_ids
+                    return await graph_client.search(search_data.query, **kwargs)
+                parts = await graph_router.fan_out(group_ids, search_graph, read=True)
+                return merge_ranked(parts, num_results)
+            results = await fetch_above_min_score(
+                fetch, limit, search_data.min_score, cosine_scorer(client.embedder, search_data.query, group_ids)
+            )
+        if distance_map is not None:
+            keep = len(results) if search_data.diversify else search_data.num_results
+            results = rerank_by_distance(results, distance_map, keep)
+        if search_data.diversify:
+            selected = await diversify(results, search_data, group_ids, search_data.num_results)
+        else:
+            selected = [(result, None) for result in results]
         logger.info(f"Search returned {len(results)} results.")
         episodes = []
         edges = []
         if not results:
-            return SearchResponse(episodes=[], edges=[])
+            return SearchResponse(episodes=[], edges=[], plan=plan)
         # The search result from graphiti-core is a list of EntityEdge objects,
         # not a complex object with .episodes
-        for edge in results:
+        for edge, duplicates in selected:
+            if getattr(edge, "group_id", None) in hidden:
+                continue
             if hasattr(edge, "fact"):
                 search_edge = SearchResultEdge(
                     fact=edge.fact,
@@ -98,6 +300,7 @@ async def search_logic(client: Graphiti, search_data: SearchRequest) -> SearchRe
                     valid_at=edge.valid_at,
                     invalid_at=edge.invalid_at,
                     relevance_score=getattr(edge, 'score', None),
+                    duplicates=duplicates,
                 )
                 edges.append(search_edge)
             else:
@@ -105,8 +308,175 @@ async def search_logic(client: Graphiti, search_data: SearchRequest) -> SearchRe
                     f"Result object is missing 'fact' attribute: {type(edge)}"
                 )
         logger.info(f"Returning {len(edges)} edges from search.")
-        return SearchResponse(episodes=episodes, edges=edges)
+        response = SearchResponse(episodes=episodes, edges=edges, plan=plan)
+        return await _cache_response(response_key, response)
     except Exception as e:
         logger.error(f"Search logic error: {e}", exc_info=True)
         # Re-raise the exception to be handled by the main app
-        raise
\ No newline at end of file
+        raise
+
+def _scored(results, layer: str) -> List[tuple]:
+    """(item, reranker score) pairs of one layer of graphiti SearchResults."""
+    items = getattr(results, layer)
+    scores = getattr(results, f"{layer[:-1]}_reranker_scores", None) or []
+    return [(item, scores[i] if i < len(scores) else None) for i, item in enumerate(items)]
+
+async def recipe_search_logic(search_data: SearchRequest, group_ids: Optional[List[str]]) -> SearchResponse:
+    """Search facts, entities and episodes with a named graphiti search recipe."""
+    recipe = search_data.recipe or "rrf"
+    limits = search_data.limits or SearchLimits()
+    edge_limit = search_data.num_results if limits.edges is None else limits.edges
+    config = build_config(
+        recipe, search_data.candidates(edge_limit), limits.nodes, search_data.methods, search_data.min_score
+    )
+    distance_map = None
+    if recipe == "node_distance":
+        distance_map = await focal_distances.get(search_data.focal_node_uuid)
+        if distance_map is None:
+            raise HTTPException(status_code=404, detail=f"Focal node {search_data.focal_node_uuid} not found")
+        # Rerank a wider candidate set with the cached distance map
+        config.limit *= max(1, settings.FOCAL_RERANK_CANDIDATES)
+    # Reranker scores other than the cross-encoder's are not cosine similarities;
+    # min_score filters a wider candidate set by cosine after the search
+    cosine_min_score = None if reranker_filters(recipe) else search_data.min_score
+    if cosine_min_score is not None:
+        config.limit = max(
+            config.limit, min(config.limit * settings.MIN_SCORE_OVERFETCH_FACTOR, settings.MIN_SCORE_MAX_CANDIDATES)
+        )
+    windows = search_data.windows()
+    search_filter = search_filters(windows)
+
+    async def search_graph(graph_client, graph_group_ids):
+        return await graph_client.search_(
+            search_data.query,
+            config=config,
+            group_ids=graph_group_ids or None,
+            center_node_uuid=search_data.focal_node_uuid,
+            search_filter=search_filter,
+        )
+
+    async def search_graphs():
+        if config.edge_config is None and config.node_config is None:
+            return []
+        return await graph_router.fan_out(group_ids, search_graph, read=True)
+    parts, episodes = await asyncio.gather(
+        search_graphs(),
+        search_episodes(
+            graph_router.base.embedder,
+            search_data.query,
+            group_ids,
+            windows,
+            limits.episodes,
+            vector="vector" in recipe_methods(recipe, search_data.methods),
+        ),
+    )
+
+    hidden = tombstones.snapshot()
+    layers = {"episodes": [(e, score) for e, score in episodes if e["group_id"] not in hidden]}
+    for layer in ("edges", "nodes"):
+        merged = merge_scored([_scored(part, layer) for part in parts], config.limit)
+        layers[layer] = [(item, score) for item, score in merged if getattr(item, "group_id", None) not in hidden]
+    if cosine_min_score is not None:
+        scorer = cosine_scorer(graph_router.base.embedder, search_data.query, group_ids)
+        for layer in ("edges", "nodes"):
+            similarity = await scorer([item for item, _ in layers[layer]], layer)
+            layers[layer] = [
+                (item, score) for item, score in layers[layer]
+                if similarity.get(str(item.uuid), cosine_min_score) >= cosine_min_score
+            ]
+    if distance_map is not None:
+        for layer in ("edges", "nodes"):
+            scores = {item.uuid: score for item, score in layers[layer]}
+            reranked = rerank_by_distance([item for item, _ in layers[layer]], distance_map, len(scores))
+            layers[layer] = [(item, scores[item.uuid]) for item in reranked]
+
+    edges = [
+        SearchResultEdge(
+            fact=edge.fact,
+            uuid=str(edge.uuid),
+            created_at=edge.created_at,
+            valid_at=edge.valid_at,
+            invalid_at=edge.invalid_at,
+            relevance_score=score,
+        )
+        for edge, score in layers["edges"]
+    ]
+    if search_data.diversify:
+        edges = [
+            edge.model_copy(update={"duplicates": duplicates})
+            for edge, duplicates in await diversify(edges, search_data, group_ids, edge_limit)
+        ]
+    return SearchResponse(
+        edges=edges[:edge_limit],
+        nodes=[
+            SearchResultNode(
+                uuid=str(node.uuid),
+                name=node.name,
+                summary=node.summary or None,
+                labels=list(node.labels or []),
+                group_id=node.group_id,
+                created_at=node.created_at,
+                relevance_score=score,
+            )
+            for node, score in layers["nodes"][: limits.nodes]
+        ],
+        episodes=[
+            SearchResultEpisode(
+                content=episode["content"] or "",
+                created_at=episode["created_at"],
+                uuid=episode["uuid"],
+                name=episode["name"],
+                source_description=episode["source_description"],
+                valid_at=episode["valid_at"],
+                relevance_score=score,
+            )
+            for episode, score in layers["episodes"][: limits.episodes]
+        ],
+    )
+
+async def prime_query_embeddings(client: Graphiti, queries: List[str]) -> Dict[str, List[float]]:
+    """
+    Vectors of every query, embedding those not yet cached in one API call.
+    New vectors are stored in the query cache when it is enabled; the returned
+    map is what the searches of the batch are served from either way.
+    """
+    # graphiti embeds the query with newlines flattened, the in-process index as is
+    texts = list(dict.fromkeys(t for q in queries for t in (q.replace("\n", " "), q)))
+    keys = [embedding_key(text) for text in texts]
+    cached = await query_cache.get_vectors(keys) if settings.CACHE_ENABLED else [None] * len(texts)
+    vectors = {text: vector for text, vector in zip(texts, cached) if vector is not None}
+    missing = [i for i, vector in enumerate(cached) if vector is None]
+    if not missing:
+        return vectors
+    embedded = await client.embedder.create_batch([texts[i] for i in missing])
+    for i, vector in zip(missing, embedded):
+        vectors[texts[i]] = vector
+        if settings.CACHE_ENABLED:
+            await query_cache.set_vector(keys[i], vector, settings.CACHE_EMBEDDING_TTL_SECONDS)
+    return vectors
+
+async def batch_search_logic(client: Graphiti, batch: BatchSearchRequest) -> BatchSearchResponse:
+    """Run several independent searches with shared query embedding and bounded concurrency."""
+    started = time.perf_counter()
+    # The searches run in tasks copying this context, so they all see the primed vectors
+    primed_vectors.set(await prime_query_embeddings(client, [search.query for search in batch.searches]))
+    embedding_ms = (time.perf_counter() - started) * 1000
+    semaphore = asyncio.Semaphore(max(1, settings.SEARCH_BATCH_CONCURRENCY))
+
+    async def run(search: SearchRequest) -> BatchSearchResult:
+        async with semaphore:
+            search_started = time.perf_counter()
+            try:
+                result = await search_logic(client, search)
+                error = None
+            except Exception as e:
+                result, error = None, str(e)
+            elapsed_ms = round((time.perf_counter() - search_started) * 1000, 2)
+            return BatchSearchResult(result=result, error=error, elapsed_ms=elapsed_ms)
+
+    results = await asyncio.gather(*(run(search) for search in batch.searches))
+    return BatchSearchResponse(
+        results=results,
+        embedding_ms=round(embedding_ms, 2),
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
@@ -0,0 +1,244 @@
+"""
+Asynchronous, chunked deletion of a whole group_id
+
+A single DETACH DELETE over a large tenant blocks the FalkorDB writer for
+seconds and stalls every other group. Instead the group is tombstoned (hidden
+from search and reads immediately) and a background job deletes its facts,
+episodes, entities and communities in bounded batches with pauses between
+them. Tombstones are persisted so an interrupted deletion resumes on restart,
+and re-read when the file changes (checked at most every
+TOMBSTONE_REFRESH_SECONDS) so every worker process sees them.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from typing import Callable, FrozenSet, Iterable, List, Optional, Set
+from fastapi import Request, HTTPException
+
+from .config import settings
+from .cache import invalidate_groups
+from .jobs import Job, JobManager
+from .sharding import graph_router
+
+logger = logging.getLogger(__name__)
+
+class TombstoneRegistry:
+    """Set of group_ids whose data is being deleted and must not be served."""
+
+    def __init__(self):
+        self._groups: FrozenSet[str] = frozenset()
+        self._path = os.path.join(settings.JOB_STATE_DIR, "group_tombstones.json")
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def load(self) -> List[str]:
+        self._checked_at = time.monotonic()
+        try:
+            self._mtime = os.stat(self._path).st_mtime
+            with open(self._path) as f:
+                self._groups = frozenset(json.load(f))
+        except FileNotFoundError:
+            self._mtime = None
+            self._groups = frozenset()
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable tombstone file {self._path}: {e}")
+            self._groups = frozenset()
+        return sorted(self._groups)
+
+    def _refresh(self):
+        """Pick up tombstones written by other worker processes, at most every TOMBSTONE_REFRESH_SECONDS."""
+        if time.monotonic() - self._checked_at < settings.TOMBSTONE_REFRESH_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def snapshot(self) -> FrozenSet[str]:
+        """Current tombstones, to check a request's results against without re-reading."""
+        self._refresh()
+        return self._groups
+
+    def groups(self) -> List[str]:
+        return sorted(self.snapshot())
+
+    def _update(self, change: Callable[[Set[str]], None]):
+        # Read-modify-write under an exclusive lock so concurrent workers never lose an entry
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(f"{self._path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.load()
+            groups = set(self._groups)
+            change(groups)
+            tmp_path = f"{self._path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(sorted(groups), f)
+            os.replace(tmp_path, self._path)
+            self._groups = frozenset(groups)
+            self._mtime = os.stat(self._path).st_mtime
+
+    def add(self, group_id: str):
+        self._update(lambda groups: groups.add(group_id))
+
+    def discard(self, group_id: str):
+        self._update(lambda groups: groups.discard(group_id))
+
+    def __contains__(self, group_id: object) -> bool:
+        return group_id in self.snapshot()
+
+    def __bool__(self) -> bool:
+        return bool(self.snapshot())
+
+    def visible(self, group_ids: Optional[Iterable[str]]) -> Optional[List[str]]:
+        """Drop tombstoned groups from a requested group filter (None means all groups)."""
+        if group_ids is None:
+            return None
+        hidden = self.snapshot()
+        return [g for g in group_ids if g not in hidden]
+
+tombstones = TombstoneRegistry()
+
+# Each statement deletes at most $batch items and reports how many it removed.
+# Facts go first so entities carry few relationships by the time they are detached.
+_DELETE_STEPS = [
+    ("facts", """
+        MATCH (:Entity)-[e:RELATES_TO]->(:Entity)
+        WHERE e.group_id = $group_id
+        WITH e LIMIT $batch
+        DELETE e
+        RETURN count(*) AS deleted
+    """),
+    ("episode_chunks", """
+        MATCH (n:EpisodeChunk)
+        WHERE n.group_id = $group_id
+        WITH n LIMIT $batch
+        DELETE n
+        RETURN count(*) AS deleted
+    """),
+    ("episodes", """
+        MATCH (n:Episodic)
+        WHERE n.group_id = $group_id
+        WITH n LIMIT $batch
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """),
+    ("entities", """
+        MATCH (n:Entity)
+        WHERE n.group_id = $group_id
+        WITH n LIMIT $batch
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """),
+    ("communities", """
+        MATCH (n:Community)
+        WHERE n.group_id = $group_id
+        WITH n LIMIT $batch
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """),
+]
+
+_COUNT_QUERY = """
+    OPTIONAL MATCH (:Entity)-[e:RELATES_TO]->(:Entity) WHERE e.group_id = $group_id
+    WITH count(e) AS facts
+    OPTIONAL MATCH (ep:Episodic) WHERE ep.group_id = $group_id
+    WITH facts, count(ep) AS episodes
+    OPTIONAL MATCH (en:Entity) WHERE en.group_id = $group_id
+    WITH facts, episodes, count(en) AS entities
+    OPTIONAL MATCH (c:Community) WHERE c.group_id = $group_id
+    RETURN facts, episodes, entities, count(c) AS communities
+"""
+
+async def delete_group_data(client, job: Job, group_id: str) -> dict:
+    """Delete every node and edge of a group from one graph in bounded batches."""
+    batch = settings.GROUP_DELETE_BATCH_SIZE
+    pause = settings.GROUP_DELETE_PAUSE_SECONDS
+
+    records, _, _ = await client.driver.execute_query(_COUNT_QUERY, group_id=group_id)
+    totals = dict(records[0]) if records else {}
+    job.update(totals=totals, deleted={name: 0 for name, _ in _DELETE_STEPS})
+
+    deleted = {}
+    for name, query in _DELETE_STEPS:
+        deleted[name] = 0
+        while True:
+            records, _, _ = await client.driver.execute_query(
+                query, group_id=group_id, batch=batch
+            )
+            count = records[0]["deleted"] if records else 0
+            deleted[name] += count
+            job.update(step=name, deleted=dict(deleted))
+            if count < batch:
+                break
+            # Yield the writer to other tenants between batches
+            await asyncio.sleep(pause)
+    return deleted
+
+async def run_group_deletion(job: Job, group_id: str) -> dict:
+    """Delete a group from the graph holding it, then lift its tombstone."""
+    client = await graph_router.for_group(group_id)
+    deleted = await delete_group_data(client, job, group_id)
+    graph_router.forget(group_id)
+
+    # Drop responses cached before the tombstone so the id can be reused
+    await invalidate_groups(group_id)
+    tombstones.discard(group_id)
+    logger.info(f"Group {group_id} deleted: {deleted}")
+    return {"group_id": group_id, "deleted": deleted}
+
+def submit_group_deletion(jobs: JobManager, group_id: str) -> Job:
+    tombstones.add(group_id)
+    return jobs.submit(
+        "group_delete",
+        lambda job: run_group_deletion(job, group_id),
+        params={"group_id": group_id},
+    )
+
+# Held for the lifetime of the worker that owns deletion resumption
+_resume_lock_file = None
+
+def resume_group_deletions(jobs: JobManager):
+    """Restart deletion jobs for groups still tombstoned from a previous run."""
+    global _resume_lock_file
+    pending = tombstones.load()
+    if not pending:
+        return
+
+    # With several workers only the one holding the lock resumes deletions
+    os.makedirs(settings.JOB_STATE_DIR, exist_ok=True)
+    lock_file = open(os.path.join(settings.JOB_STATE_DIR, "group_deletion.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        logger.info("Another worker is resuming tombstoned group deletions")
+        return
+    _resume_lock_file = lock_file
+
+    for group_id in pending:
+        logger.info(f"Resuming deletion of tombstoned group {group_id}")
+        submit_group_deletion(jobs, group_id)
+
+def ensure_group_visible(group_id: Optional[str]):
+    """Reject writes against a group that is being deleted."""
+    if group_id is not None and group_id in tombstones:
+        raise HTTPException(status_code=409, detail=f"Group {group_id} is being deleted")
+
+async def delete_group(request: Request, group_id: str) -> dict:
+    """
+    Tombstone a group and start its chunked deletion in the background
+    """
+    jobs = request.app.state.jobs
+    for job in jobs.active("group_delete"):
+        if job.status.params.get("group_id") == group_id:
+            return {"job_id": job.id, "status": job.status.status, "group_id": group_id}
+
+    job = submit_group_deletion(jobs, group_id)
+    logger.info(f"Group {group_id} tombstoned, deletion job {job.id} started")
+    return {"job_id": job.id, "status": job.status.status, "group_id": group_id}
@@ -0,0 +1,175 @@
+"""
+Readiness and deep health checks
+
+/health stays a cheap liveness probe. /ready and /health/deep actually probe
+the dependencies: FalkorDB ping and query round-trip, embedder reachability
+(cached, so OpenAI is not called on every probe), ingestion queue depth,
+event-loop lag and index build state. /ready answers 503 as soon as a
+dependency is down or latency crosses the configured thresholds, so the load
+balancer can shed traffic before requests start timing out.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from .config import settings
+from .ingestion import ingestion_tracker
+
+logger = logging.getLogger(__name__)
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+class HealthChecker:
+    """Probes dependencies of one Graphiti client."""
+
+    def __init__(self, client, jobs=None, loop_monitor=None):
+        self.client = client
+        self.jobs = jobs
+        self.loop_monitor = loop_monitor
+        self._embedder_state: Optional[dict] = None
+        self._embedder_checked_at = 0.0
+        self._embedder_lock = asyncio.Lock()
+
+    async def check_falkordb(self) -> dict:
+        timeout = settings.HEALTH_CHECK_TIMEOUT_SECONDS
+        state = {"ok": False}
+        try:
+            connection = getattr(self.client.driver.client, "connection", None)
+            if connection is not None:
+                started = time.perf_counter()
+                await asyncio.wait_for(connection.ping(), timeout)
+                state["ping_ms"] = _elapsed_ms(started)
+
+            started = time.perf_counter()
+            await asyncio.wait_for(self.client.driver.execute_query("RETURN 1 AS ok"), timeout)
+            state["query_ms"] = _elapsed_ms(started)
+            state["ok"] = True
+        except asyncio.TimeoutError:
+            state["error"] = f"timed out after {timeout}s"
+        except Exception as e:
+            state["error"] = str(e)
+        return state
+
+    async def check_embedder(self, force: bool = False) -> dict:
+        """Embed a short probe string; the result is cached for EMBEDDER_PROBE_TTL_SECONDS."""
+        async with self._embedder_lock:
+            age = time.monotonic() - self._embedder_checked_at
+            if not force and self._embedder_state is not None and age < settings.EMBEDDER_PROBE_TTL_SECONDS:
+                return {**self._embedder_state, "cached": True, "age_s": round(age, 1)}
+
+            timeout = settings.HEALTH_CHECK_TIMEOUT_SECONDS
+            state = {"ok": False}
+            started = time.perf_counter()
+            try:
+                # Bypass the query cache, which would answer without reaching the provider
+                embedder = getattr(self.client.embedder, "uncached", self.client.embedder)
+                await asyncio.wait_for(embedder.create(input_data=["health check"]), timeout)
+                state["ok"] = True
+                state["latency_ms"] = _elapsed_ms(started)
+            except asyncio.TimeoutError:
+                state["error"] = f"timed out after {timeout}s"
+            except Exception as e:
+                state["error"] = str(e)
+
+            self._embedder_state = state
+            self._embedder_checked_at = time.monotonic()
+            return {**state, "cached": False, "age_s": 0.0}
+
+    async def check_indexes(self) -> dict:
+        """Report FalkorDB index build state; indexes under construction make search slow."""
+        try:
+            result = await asyncio.wait_for(
+                self.client.driver.execute_query("CALL db.indexes()"),
+                settings.HEALTH_CHECK_TIMEOUT_SECONDS,
+            )
+            records = result[0] if result else []
+            indexes = []
+            for record in records:
+                indexes.append({
+                    "label": record.get("label"),
+                    "properties": record.get("properties"),
+                    "types": record.get("types"),
+                    "status": record.get("status"),
+                })
+            building = [i for i in indexes if i["status"] and str(i["status"]).upper() != "OPERATIONAL"]
+            return {"ok": not building, "count": len(indexes), "building": building, "indexes": indexes}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+    async def measure_loop_lag(self) -> float:
+        """Time between scheduling a callback and the loop running it, in ms."""
+        loop = asyncio.get_running_loop()
+        scheduled = loop.time()
+        future = loop.create_future()
+        loop.call_soon(lambda: future.set_result(loop.time()))
+        ran_at = await future
+        return round((ran_at - scheduled) * 1000, 3)
+
+    async def event_loop_state(self) -> dict:
+        state = {"lag_ms": await self.measure_loop_lag()}
+        if self.loop_monitor is not None:
+            state.update(self.loop_monitor.snapshot())
+        return state
+
+    def ingestion_state(self) -> dict:
+        state = ingestion_tracker.stats()
+        if self.jobs is not None:
+            state["background_jobs"] = len(self.jobs.active())
+        return state
+
+    async def deep(self) -> dict:
+        falkordb, embedder, indexes, event_loop = await asyncio.gather(
+            self.check_falkordb(),
+            self.check_embedder(),
+            self.check_indexes(),
+            self.event_loop_state(),
+        )
+        report = {
+            "falkordb": falkordb,
+            "embedder": embedder,
+            "indexes": indexes,
+            "event_loop": event_loop,
+            "ingestion": self.ingestion_state(),
+        }
+        ready, reasons = self._evaluate(report)
+        report["ready"] = ready
+        report["reasons"] = reasons
+        report["status"] = "healthy" if ready else ("unhealthy" if not falkordb["ok"] else "degraded")
+        return report
+
+    async def ready(self) -> tuple:
+        falkordb, embedder, event_loop = await asyncio.gather(
+            self.check_falkordb(),
+            self.check_embedder(),
+            self.event_loop_state(),
+        )
+        report = {
+            "falkordb": falkordb,
+            "embedder": embedder,
+            "event_loop": event_loop,
+            "ingestion": self.ingestion_state(),
+        }
+        ready, reasons = self._evaluate(report)
+        return ready, {"ready": ready, "reasons": reasons, **report}
+
+    def _evaluate(self, report: dict) -> tuple:
+        reasons = []
+        falkordb = report["falkordb"]
+        if not falkordb["ok"]:
+            reasons.append(f"falkordb unavailable: {falkordb.get('error')}")
+        elif falkordb.get("query_ms", 0) > settings.READY_MAX_DB_LATENCY_MS:
+            reasons.append(f"falkordb query latency {falkordb['query_ms']}ms")
+        if settings.READY_REQUIRE_EMBEDDER and not report["embedder"]["ok"]:
+            reasons.append(f"embedder unavailable: {report['embedder'].get('error')}")
+        # The sampler's recent maximum catches stalls the one-shot probe misses
+        lag_ms = max(report["event_loop"]["lag_ms"], report["event_loop"].get("recent_max_ms", 0.0))
+        if lag_ms > settings.READY_MAX_LOOP_LAG_MS:
+            reasons.append(f"event loop lag {lag_ms}ms")
+        if report["ingestion"].get("draining"):
+            reasons.append("worker is draining for shutdown")
+        in_flight = report["ingestion"]["in_flight"]
+        if settings.READY_MAX_INGESTION_IN_FLIGHT and in_flight > settings.READY_MAX_INGESTION_IN_FLIGHT:
+            reasons.append(f"{in_flight} ingestions in flight")
+        return not reasons, reasons
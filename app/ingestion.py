@@ -0,0 +1,167 @@
+"""
+Tracking of in-flight ingestion
+
+Every add_episode call made on behalf of a request goes through the tracker
+so health checks can report ingestion queue depth and a worker shutting down
+can wait for in-flight episodes instead of cutting them off mid-extraction.
+
+Accepted episodes and message batches also run as "ingest" jobs, so
+GET /jobs/{id} and its event stream show which stage they are in: queued,
+extracting, resolving, embedding, saved or failed. graphiti's add_episode is
+a single call, so stages are inferred from the LLM and embedder calls it makes
+while the job is the current ingestion (a context variable, inherited by the
+tasks graphiti spawns). Extraction, resolution and embedding interleave, and
+the time after the last embedding call, which includes the final graph write,
+is counted as embedding.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, List, Optional
+
+from fastapi import HTTPException
+
+from .jobs import Job, JobManager
+
+logger = logging.getLogger(__name__)
+
+class IngestionTracker:
+    """Counts episodes currently being ingested."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.draining = False
+        self._idle: Optional[asyncio.Event] = None
+
+    def _idle_event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if self.in_flight == 0:
+                self._idle.set()
+        return self._idle
+
+    def ensure_accepting(self):
+        """Reject new ingestion while the worker drains for shutdown."""
+        if self.draining:
+            raise HTTPException(status_code=503, detail="Worker is shutting down, retry on another instance")
+
+    @asynccontextmanager
+    async def track(self):
+        self.in_flight += 1
+        self._idle_event().clear()
+        try:
+            yield
+        except BaseException:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle_event().set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop accepting ingestion and wait up to timeout for in-flight episodes."""
+        self.draining = True
+        if self.in_flight == 0:
+            return True
+        logger.info(f"Draining {self.in_flight} in-flight ingestions (timeout {timeout}s)...")
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out with {self.in_flight} ingestions still in flight")
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "draining": self.draining,
+        }
+
+ingestion_tracker = IngestionTracker()
+
+_current_job: ContextVar[Optional[Job]] = ContextVar("ingestion_job", default=None)
+
+def report_stage(stage: str):
+    """Move the ingestion job running in this context, if any, to stage."""
+    job = _current_job.get()
+    if job is not None:
+        job.stage(stage)
+
+def llm_stage(response_model: Any) -> str:
+    """Ingestion stage of an LLM call, from the response model graphiti asks for."""
+    name = getattr(response_model, "__name__", "") if response_model else ""
+    if "Resolution" in name or "Duplicate" in name:
+        return "resolving"
+    return "extracting"
+
+def submit_ingestion(jobs: JobManager, runner: Callable[[Job], Awaitable[dict]], params: Optional[dict] = None) -> Job:
+    """Run an ingestion as an "ingest" job with stage tracking."""
+    async def run(job: Job) -> dict:
+        token = _current_job.set(job)
+        try:
+            result = await runner(job)
+        except BaseException:
+            job.stage("failed")
+            raise
+        finally:
+            _current_job.reset(token)
+        job.stage("saved")
+        return result
+
+    job = jobs.submit("ingest", run, params=params)
+    job.stage("queued")
+    return job
+
+async def wait_for_ingestion(job: Job) -> dict:
+    """Result of an ingestion job; the job keeps running if the caller goes away."""
+    await asyncio.shield(job.task)
+    if job.status.status != "completed":
+        raise RuntimeError(job.status.error or f"Ingestion job {job.id} {job.status.status}")
+    return job.status.result
+
+def accepted(job: Job) -> dict:
+    """Response body for ingestion accepted to run in the background."""
+    return {
+        "status": "accepted",
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+    }
+
+class StageReportingLLMClient:
+    """Wraps a graphiti LLMClient and reports ingestion stages from its calls."""
+
+    def __init__(self, llm_client: Any):
+        self._llm_client = llm_client
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm_client, name)
+
+    async def generate_response(self, messages: list, response_model: Any = None, *args, **kwargs) -> dict:
+        report_stage(llm_stage(response_model))
+        return await self._llm_client.generate_response(messages, response_model, *args, **kwargs)
+
+class StageReportingEmbedder:
+    """Wraps a graphiti EmbedderClient and reports the embedding stage."""
+
+    def __init__(self, embedder: Any):
+        self._embedder = embedder
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._embedder, name)
+
+    async def create(self, input_data: Any) -> List[float]:
+        report_stage("embedding")
+        return await self._embedder.create(input_data=input_data)
+
+    async def create_batch(self, input_data_list: List[str]) -> List[List[float]]:
+        report_stage("embedding")
+        return await self._embedder.create_batch(input_data_list)
@@ -0,0 +1,381 @@
+"""
+In-process registry for background jobs
+
+Long-running maintenance work (re-embedding, bulk deletion, compaction) runs
+as asyncio tasks owned by the JobManager so HTTP requests return immediately
+and progress can be polled through /jobs.
+
+When a state directory is configured, job status is also written there so
+that any worker of a multi-worker deployment can answer /jobs/{id}, not only
+the one running the job. Writes happen off the event loop, at most every
+PERSIST_INTERVAL_SECONDS per job except for status transitions. Each worker
+holds an flock on its own lock file while it lives; a starting worker marks
+unfinished jobs of workers whose lock is free as failed.
+"""
+import asyncio
+import fcntl
+import glob
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept around for status queries
+MAX_FINISHED_JOBS = 500
+# Minimum interval between persisted progress snapshots of one job
+PERSIST_INTERVAL_SECONDS = 1.0
+# Stage transitions kept per job; totals in stage_ms keep counting past it
+MAX_STAGE_EVENTS = 200
+# Status files untouched this long are deleted, whichever worker wrote them
+STATUS_FILE_MAX_AGE_SECONDS = 7 * 24 * 3600
+# Minimum interval between scans of the status directory for old files
+STATUS_PRUNE_INTERVAL_SECONDS = 300.0
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str = "pending"  # pending | running | completed | failed | cancelled
+    params: Dict[str, Any] = Field(default_factory=dict)
+    progress: Dict[str, Any] = Field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    worker_pid: int = Field(default_factory=os.getpid)
+    worker_id: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class Job:
+    """A single background job and the task executing it."""
+
+    def __init__(self, kind: str, params: Optional[dict] = None, status: Optional[JobStatus] = None):
+        self.status = status or JobStatus(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            params=params or {},
+            created_at=datetime.now(timezone.utc),
+        )
+        self.task: Optional[asyncio.Task] = None
+        self.on_update: Optional[Callable[["Job", bool], None]] = None
+        # Bumped on every change so event streams can wait for the next one
+        self.revision = 0
+        self._change: Optional[asyncio.Event] = None
+        self._stage_started: Optional[float] = None
+
+    @property
+    def id(self) -> str:
+        return self.status.id
+
+    @property
+    def done(self) -> bool:
+        return self.status.status in ("completed", "failed", "cancelled")
+
+    def update(self, **progress):
+        """Merge progress counters into the job status."""
+        self.status.progress.update(progress)
+        self.changed()
+
+    def stage(self, name: str):
+        """Record a transition to another stage and the time spent in the previous one."""
+        progress = self.status.progress
+        if progress.get("stage") == name:
+            return
+        now = time.monotonic()
+        stages = progress.setdefault("stages", [])
+        if self._stage_started is not None:
+            elapsed_ms = round((now - self._stage_started) * 1000, 1)
+            totals = progress.setdefault("stage_ms", {})
+            totals[progress["stage"]] = round(totals.get(progress["stage"], 0.0) + elapsed_ms, 1)
+            if stages and stages[-1]["stage"] == progress["stage"]:
+                stages[-1]["duration_ms"] = elapsed_ms
+        if len(stages) < MAX_STAGE_EVENTS:
+            stages.append({"stage": name, "at": datetime.now(timezone.utc).isoformat()})
+        progress["stage"] = name
+        self._stage_started = now
+        self.changed()
+
+    def changed(self, force: bool = False):
+        """Wake event streams waiting on this job and persist its status."""
+        self.revision += 1
+        if self._change is not None:
+            self._change.set()
+            self._change = None
+        if self.on_update is not None:
+            self.on_update(self, force)
+
+    async def wait_changed(self, revision: int, timeout: float) -> bool:
+        """Wait until the job changes after revision; False on timeout."""
+        if self.revision != revision:
+            return True
+        if self._change is None:
+            self._change = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._change.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+JobRunner = Callable[[Job], Awaitable[Optional[dict]]]
+
+class JobManager:
+    """Starts, tracks and cancels background jobs."""
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self._jobs: Dict[str, Job] = {}
+        self._state_dir = os.path.join(state_dir, "status") if state_dir else None
+        self._workers_dir = os.path.join(state_dir, "workers") if state_dir else None
+        self._persisted_at: Dict[str, float] = {}
+        # Latest unwritten snapshot per job, and the task writing them in order
+        self._pending: Dict[str, str] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._pruned_at = 0.0
+        # Parsed status files of other workers by path, with their mtime
+        self._remote: Dict[str, tuple] = {}
+        self.worker_id = str(uuid.uuid4())
+        self._worker_lock = None
+        if self._state_dir:
+            os.makedirs(self._state_dir, exist_ok=True)
+            os.makedirs(self._workers_dir, exist_ok=True)
+            self._worker_lock = open(self._worker_lock_path(self.worker_id), "w")
+            fcntl.flock(self._worker_lock, fcntl.LOCK_EX)
+            self._fail_orphans()
+
+    def _worker_lock_path(self, worker_id: str) -> str:
+        safe_id = "".join(c for c in worker_id if c.isalnum() or c == "-")
+        return os.path.join(self._workers_dir, f"{safe_id}.lock")
+
+    def _worker_alive(self, worker_id: Optional[str]) -> bool:
+        """Whether the worker that wrote a status file still holds its lock."""
+        if worker_id is None:
+            return False
+        path = self._worker_lock_path(worker_id)
+        try:
+            lock_file = open(path, "r")
+        except FileNotFoundError:
+            return False
+        with lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return True
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return False
+
+    def _fail_orphans(self):
+        """Mark unfinished jobs of workers that exited as failed."""
+        for path in glob.glob(os.path.join(self._state_dir, "*.json")):
+            try:
+                with open(path) as f:
+                    status = JobStatus.model_validate_json(f.read())
+            except Exception:
+                continue
+            if status.status not in ("pending", "running") or self._worker_alive(status.worker_id):
+                continue
+            status.status = "failed"
+            status.error = f"Worker {status.worker_pid} exited before the job finished"
+            status.finished_at = datetime.now(timezone.utc)
+            self._write(path, status.model_dump_json())
+            logger.warning(f"Job {status.id} ({status.kind}) orphaned by worker {status.worker_pid}, marked failed")
+        # Drops the lock files of workers that died without jobs
+        for path in glob.glob(os.path.join(self._workers_dir, "*.lock")):
+            worker_id = os.path.basename(path)[: -len(".lock")]
+            if worker_id != self.worker_id:
+                self._worker_alive(worker_id)
+
+    def submit(self, kind: str, runner: JobRunner, params: Optional[dict] = None) -> Job:
+        job = Job(kind, params)
+        job.status.worker_id = self.worker_id
+        job.on_update = self._persist
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, runner))
+        self._prune()
+        self._persist(job, force=True)
+        logger.info(f"Job {job.id} ({kind}) submitted with params={job.status.params}")
+        return job
+
+    async def _run(self, job: Job, runner: JobRunner):
+        job.status.status = "running"
+        job.status.started_at = datetime.now(timezone.utc)
+        job.changed(force=True)
+        try:
+            job.status.result = await runner(job)
+            job.status.status = "completed"
+            logger.info(f"Job {job.id} ({job.status.kind}) completed: {job.status.result}")
+        except asyncio.CancelledError:
+            job.status.status = "cancelled"
+            logger.info(f"Job {job.id} ({job.status.kind}) cancelled")
+        except Exception as e:
+            job.status.status = "failed"
+            job.status.error = str(e)
+            logger.error(f"Job {job.id} ({job.status.kind}) failed: {e}", exc_info=True)
+        finally:
+            job.status.finished_at = datetime.now(timezone.utc)
+            job.changed(force=True)
+
+    def _status_path(self, job_id: str) -> Optional[str]:
+        if not self._state_dir:
+            return None
+        safe_id = "".join(c for c in job_id if c.isalnum() or c == "-")
+        return os.path.join(self._state_dir, f"{safe_id}.json")
+
+    @staticmethod
+    def _write(path: str, data: str):
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to persist job status to {path}: {e}")
+
+    def _persist(self, job: Job, force: bool = False):
+        if self._state_dir is None:
+            return
+        now = time.monotonic()
+        wait = PERSIST_INTERVAL_SECONDS - (now - self._persisted_at.get(job.id, 0.0))
+        if not force and wait > 0:
+            # Throttled: a timer writes the latest state of every throttled job
+            self._pending.setdefault(job.id, "")
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(wait, self._flush_throttled)
+            return
+        self._persisted_at[job.id] = now
+        self._pending[job.id] = job.status.model_dump_json()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+
+    def _flush_throttled(self):
+        self._flush_handle = None
+        for job_id, data in list(self._pending.items()):
+            if data:
+                continue
+            job = self._jobs.get(job_id)
+            if job is None:
+                del self._pending[job_id]
+            else:
+                self._persist(job, force=True)
+
+    async def _write_pending(self):
+        # One writer per worker keeps the writes of a job in order
+        while self._pending:
+            job_id = next((job_id for job_id, data in self._pending.items() if data), None)
+            if job_id is None:
+                return
+            data = self._pending.pop(job_id)
+            await asyncio.to_thread(self._write, self._status_path(job_id), data)
+
+    async def flush(self):
+        """Write every pending status snapshot."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_throttled()
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+
+    def _load(self, job_id: str) -> Optional[Job]:
+        path = self._status_path(job_id)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return Job("", status=JobStatus.model_validate_json(f.read()))
+        except Exception as e:
+            logger.warning(f"Unreadable status file for job {job_id}: {e}")
+            return None
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+            self._persisted_at.pop(job.id, None)
+            path = self._status_path(job.id)
+            if path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        now = time.monotonic()
+        if self._state_dir and now - self._pruned_at >= STATUS_PRUNE_INTERVAL_SECONDS:
+            self._pruned_at = now
+            asyncio.get_running_loop().create_task(asyncio.to_thread(self._prune_status_dir))
+
+    def _prune_status_dir(self):
+        """Delete status files of any worker not written for STATUS_FILE_MAX_AGE_SECONDS."""
+        cutoff = time.time() - STATUS_FILE_MAX_AGE_SECONDS
+        for path in glob.glob(os.path.join(self._state_dir, "*.json")):
+            job_id = os.path.basename(path)[: -len(".json")]
+            if job_id in self._jobs:
+                continue
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Local job, or a read-only snapshot of a job owned by another worker."""
+        return self._jobs.get(job_id) or self._load(job_id)
+
+    def is_local(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        jobs = dict(self._jobs)
+        if self._state_dir:
+            remote = {}
+            for path in glob.glob(os.path.join(self._state_dir, "*.json")):
+                job_id = os.path.basename(path)[: -len(".json")]
+                if job_id in jobs:
+                    continue
+                try:
+                    mtime = os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                # Only files changed since the last listing are parsed again
+                cached = self._remote.get(path)
+                job = cached[1] if cached and cached[0] == mtime else self._load(job_id)
+                if job is not None:
+                    remote[path] = (mtime, job)
+                    jobs[job_id] = job
+            self._remote = remote
+        return [job for job in jobs.values() if kind is None or job.status.kind == kind]
+
+    def active(self, kind: Optional[str] = None) -> List[Job]:
+        """Unfinished jobs running in this worker."""
+        return [
+            job for job in self._jobs.values()
+            if not job.done and (kind is None or job.status.kind == kind)
+        ]
+
+    async def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.done or job.task is None:
+            return False
+        job.task.cancel()
+        await asyncio.gather(job.task, return_exceptions=True)
+        return True
+
+    async def shutdown(self):
+        """Cancel every running job; re-embeds and group deletions resume on the next start."""
+        tasks = [job.task for job in self.active() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush()
+        if self._worker_lock is not None:
+            try:
+                os.remove(self._worker_lock_path(self.worker_id))
+            except FileNotFoundError:
+                pass
+            self._worker_lock.close()
+            self._worker_lock = None
@@ -0,0 +1,129 @@
+"""
+Event-loop lag monitor and blocking-call detector
+
+A sampler task sleeps for a fixed interval and records how late it wakes up;
+the overshoot is the time the loop spent running something else without
+yielding. Samples go into a histogram exported on /metrics.
+
+With LOOP_BLOCK_DEBUG enabled, a watchdog thread also checks the sampler's
+heartbeat and, when the loop has been stuck longer than
+LOOP_BLOCK_THRESHOLD_MS, logs the stack of the loop thread so the blocking
+section can be found and offloaded.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class LoopLagMonitor:
+    """Samples event-loop lag and optionally reports blocking stacks."""
+
+    def __init__(self, interval: float = 0.25, block_threshold_ms: float = 200.0, debug: bool = False):
+        self.interval = interval
+        self.block_threshold = block_threshold_ms / 1000
+        self.debug = debug
+
+        self.bucket_counts = [0] * len(LAG_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.blocked_events = 0
+        self._recent = deque(maxlen=40)
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._sample())
+        if self.debug:
+            self._stop.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="loop-block-watchdog", daemon=True
+            )
+            self._watchdog.start()
+            logger.info(f"Blocking-call detector enabled (threshold {self.block_threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self._heartbeat = time.monotonic()
+            self.observe(max(0.0, (loop.time() - started - self.interval) * 1000))
+
+    def observe(self, lag_ms: float):
+        self.count += 1
+        self.total_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+        self._recent.append(lag_ms)
+        if lag_ms >= self.block_threshold * 1000:
+            self.blocked_events += 1
+        for i, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.block_threshold / 2):
+            beat = self._heartbeat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.block_threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            logger.warning(
+                f"Event loop blocked for {stalled * 1000:.0f}ms, loop thread stack:\n{stack}"
+            )
+
+    def snapshot(self) -> dict:
+        recent = list(self._recent)
+        return {
+            "samples": self.count,
+            "last_ms": round(recent[-1], 3) if recent else 0.0,
+            "recent_max_ms": round(max(recent), 3) if recent else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "blocked_events": self.blocked_events,
+        }
+
+    def prometheus_lines(self) -> List[str]:
+        name = "graphiti_event_loop_lag_ms"
+        lines = [
+            f"# HELP {name} Event loop scheduling lag in milliseconds",
+            f"# TYPE {name} histogram",
+        ]
+        cumulative = 0
+        for bound, bucket_count in zip(LAG_BUCKETS_MS, self.bucket_counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.total_ms:.3f}")
+        lines.append(f"{name}_count {self.count}")
+        lines.append("# HELP graphiti_event_loop_blocked_total Stalls longer than the blocking threshold")
+        lines.append("# TYPE graphiti_event_loop_blocked_total counter")
+        lines.append(f"graphiti_event_loop_blocked_total {self.blocked_events}")
+        return lines
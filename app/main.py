@@ -1,12 +1,47 @@
 import logging
+from datetime import datetime
 from typing import List, Optional
 from fastapi import FastAPI, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 from graphiti_core import Graphiti
 from graphiti_core.driver.falkordb_driver import FalkorDriver
+from graphiti_core.llm_client import OpenAIClient
 from .config import settings
+from .extraction_cache import ExtractionCache, CachingLLMClient
+from .cache import query_cache, CachingEmbedder
+from .embeddings import create_embedder
+from .replicas import replica_pool
+from .retention import start_compaction_schedule
+from .responses import FastJSONResponse, CompressionMiddleware
+from .jobs import JobManager
+from .group_deletion import (
+    delete_group,
+    ensure_group_visible,
+    resume_group_deletions,
+)
+from .reembed import resume_reembeds
+from .health import HealthChecker
+from .loop_monitor import LoopLagMonitor
+from .metrics import render_metrics
+from .ingestion import (
+    ingestion_tracker,
+    submit_ingestion,
+    wait_for_ingestion,
+    accepted,
+    StageReportingLLMClient,
+    StageReportingEmbedder,
+)
+from .worker import WorkerInfo, prewarm
+from .sharding import (
+    graph_router,
+    ensure_group_writable,
+    get_shard_status,
+    start_shard_migration,
+    ShardMigrationRequest,
+)
 from .graphiti_logic import (
     add_episode_logic,
     search_logic,
@@ -14,6 +49,9 @@ from .graphiti_logic import (
     EpisodeResponse,
     SearchRequest,
     SearchResponse,
+    batch_search_logic,
+    BatchSearchRequest,
+    BatchSearchResponse,
 )
 # Load environment variables
 load_dotenv()
@@ -21,10 +59,13 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Created at import so startup time covers the whole worker boot
+worker_info = WorkerInfo()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage the Graphiti client lifecycle with the FastAPI app."""
-    logger.info("Application startup: Initializing Graphiti client...")
+    logger.info(f"Worker {worker_info.pid} startup: Initializing Graphiti client...")
     
     # Create FalkorDB driver
     driver = FalkorDriver(
@@ -33,27 +74,98 @@ async def lifespan(app: FastAPI):
         password=settings.FALKORDB_PASSWORD
     )
     
-    graphiti_client = Graphiti(graph_driver=driver)
+    # Serve repeated extraction prompts from the persistent cache
+    llm_client = OpenAIClient()
+    extraction_cache = None
+    if settings.EXTRACTION_CACHE_ENABLED:
+        extraction_cache = ExtractionCache(settings.EXTRACTION_CACHE_PATH)
+        llm_client = CachingLLMClient(
+            llm_client, extraction_cache, settings.EXTRACTION_PROMPT_VERSION
+        )
+        logger.info(f"Extraction cache enabled at {settings.EXTRACTION_CACHE_PATH}")
+    
+    # Query embeddings and search responses go through the two-tier cache
+    embedder = create_embedder()
+    if settings.CACHE_ENABLED or settings.FALKORDB_READ_REPLICAS:
+        # The shared tier also carries read-your-writes marks between workers
+        query_cache.configure(settings.cache_redis_url)
+    # Also without the cache: batch searches hand their primed query vectors through it
+    embedder = CachingEmbedder(embedder)
+    # Ingestion jobs infer their stage from the LLM and embedder calls they make
+    llm_client = StageReportingLLMClient(llm_client)
+    embedder = StageReportingEmbedder(embedder)
+    
+    graphiti_client = Graphiti(graph_driver=driver, llm_client=llm_client, embedder=embedder)
     
     logger.info("✅ Graphiti client initialized successfully")
     
     app.state.graphiti_client = graphiti_client
+    graph_router.configure(graphiti_client)
+    replica_pool.configure()
+    app.state.extraction_cache = extraction_cache
+    app.state.jobs = JobManager(settings.JOB_STATE_DIR)
+    resume_group_deletions(app.state.jobs)
+    resume_reembeds(app.state.jobs)
+    compaction_schedule = start_compaction_schedule(app.state.jobs)
+    app.state.loop_monitor = LoopLagMonitor(
+        interval=settings.LOOP_MONITOR_INTERVAL_SECONDS,
+        block_threshold_ms=settings.LOOP_BLOCK_THRESHOLD_MS,
+        debug=settings.LOOP_BLOCK_DEBUG,
+    )
+    app.state.loop_monitor.start()
+    app.state.health = HealthChecker(graphiti_client, app.state.jobs, app.state.loop_monitor)
+    app.state.worker = worker_info
+    
+    if settings.PREWARM_ENABLED:
+        await prewarm(graphiti_client, app.state.health, worker_info)
+    worker_info.mark_ready()
+    logger.info(f"Worker {worker_info.pid} ready in {worker_info.startup_seconds}s")
     yield
+    logger.info("Application shutdown: Draining in-flight ingestion...")
+    await ingestion_tracker.drain(settings.SHUTDOWN_DRAIN_TIMEOUT_SECONDS)
+    await app.state.loop_monitor.stop()
+    logger.info("Application shutdown: Stopping background jobs...")
+    if compaction_schedule is not None:
+        compaction_schedule.cancel()
+    await app.state.jobs.shutdown()
     logger.info("Application shutdown: Closing Graphiti client...")
     await graphiti_client.close()
+    if extraction_cache is not None:
+        extraction_cache.close()
+    await query_cache.close()
+    await replica_pool.close()
 
 app = FastAPI(
     title="Graphiti API Service",
     description="A service for interacting with a Graphiti knowledge graph.",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+if settings.RESPONSE_COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+        gzip_level=settings.RESPONSE_GZIP_LEVEL,
+        zstd_level=settings.RESPONSE_ZSTD_LEVEL,
+    )
+
 @app.post("/add_episode")
-async def add_episode(request: Request, episode_data: EpisodeRequest):
+async def add_episode(request: Request, episode_data: EpisodeRequest, background: bool = Query(False)):
+    ingestion_tracker.ensure_accepting()
+    ensure_group_visible(episode_data.group_id)
+    ensure_group_writable(episode_data.group_id)
     try:
-        client = request.app.state.graphiti_client
-        return await add_episode_logic(client, episode_data)
+        client = await graph_router.for_group(episode_data.group_id)
+        job = submit_ingestion(
+            request.app.state.jobs,
+            lambda job: add_episode_logic(client, episode_data),
+            params={"group_id": episode_data.group_id, "episodes": 1},
+        )
+        if background:
+            return JSONResponse(status_code=202, content=accepted(job))
+        return {**(await wait_for_ingestion(job)), "job_id": job.id}
     except Exception as e:
         logger.error(f"Add episode failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Add episode operation failed.")
@@ -63,10 +175,27 @@ async def search(request: Request, search_data: SearchRequest):
     try:
         client = request.app.state.graphiti_client
         return await search_logic(client, search_data)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Search failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Search operation failed.")
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: Request, batch: BatchSearchRequest):
+    """Several independent searches in one call, embedded together and run concurrently"""
+    if len(batch.searches) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} searches per batch",
+        )
+    try:
+        client = request.app.state.graphiti_client
+        return await batch_search_logic(client, batch)
+    except Exception as e:
+        logger.error(f"Batch search failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Batch search operation failed.")
+
 @app.post("/search_with_score")
 async def search_with_score(request: Request, search_data: SearchRequest):
     """Search with score visibility - показывает внутренний score"""
@@ -87,15 +216,33 @@ def read_root():
 async def health_check():
     return {"status": "healthy", "service": "graphiti-api"}
 
+@app.get("/health/deep")
+async def deep_health_check(request: Request):
+    """Dependency latencies, queue depth, event-loop lag and index state"""
+    report = await request.app.state.health.deep()
+    return {"service": "graphiti-api", "worker": request.app.state.worker.stats(), **report}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """Prometheus metrics: event-loop lag histogram, ingestion and cache counters"""
+    return render_metrics(request.app)
+
+@app.get("/ready")
+async def readiness_check(request: Request):
+    """Readiness probe for the load balancer: 503 when the pod should not get traffic"""
+    ready, report = await request.app.state.health.ready()
+    return JSONResponse(status_code=200 if ready else 503, content=report)
+
 # Import n8n routes
-from .n8n_routes import add_messages_n8n, get_memory_n8n, N8nMessagesRequest, GetMemoryRequest
+from .n8n_routes import add_messages_n8n, get_memory_n8n, search_n8n, N8nMessagesRequest, GetMemoryRequest
+from .temporal import TemporalFilter
 
 # n8n compatible endpoints
 @app.post("/messages")
-async def add_messages(request: Request, messages_data: dict):
+async def add_messages(request: Request, messages_data: dict, background: bool = Query(False)):
     """n8n compatible endpoint for adding messages"""
     messages_request = N8nMessagesRequest(**messages_data)
-    return await add_messages_n8n(request, messages_request)
+    return await add_messages_n8n(request, messages_request, background)
 
 @app.post("/get-memory")
 async def get_memory(request: Request, memory_request: dict):
@@ -103,6 +250,27 @@ async def get_memory(request: Request, memory_request: dict):
     memory_data = GetMemoryRequest(**memory_request)
     return await get_memory_n8n(request, memory_data)
 
+@app.post("/search/simple", response_model=SearchResponse)
+async def search_simple(
+    request: Request,
+    query: str,
+    group_id: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+    valid_only: bool = False,
+    valid_from: Optional[datetime] = None,
+    valid_to: Optional[datetime] = None,
+):
+    """n8n compatible simple search"""
+    try:
+        temporal = TemporalFilter(
+            as_of=as_of,
+            valid_only=valid_only,
+            valid_between=(valid_from, valid_to) if valid_from or valid_to else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await search_n8n(request, query, group_id, temporal)
+
 # Alternative delete endpoint that works
 @app.post("/api/remove-episode")
 async def remove_episode_api(request: Request, data: dict):
@@ -111,9 +279,9 @@ async def remove_episode_api(request: Request, data: dict):
         episode_uuid = data.get("episode_uuid")
         if not episode_uuid:
             raise HTTPException(status_code=400, detail="episode_uuid is required")
-            
-        client = request.app.state.graphiti_client
-        await client.remove_episode(episode_uuid)
+        
+        from .crud_routes import remove_episode_and_invalidate
+        await remove_episode_and_invalidate(episode_uuid)
         
         return {"success": True, "message": f"Episode {episode_uuid} deleted successfully"}
     except Exception as e:
@@ -127,6 +295,7 @@ from .crud_routes import (
     update_fact,
     get_nodes,
     get_facts,
+    get_group_episodes,
     DeleteEpisodeRequest,
     DeleteFactRequest,
     UpdateFactRequest,
@@ -151,44 +320,162 @@ async def update_fact_endpoint(request: Request, data: UpdateFactRequest):
     return await update_fact(request, data)
 
 @app.get("/nodes")
-async def get_nodes_endpoint(request: Request, group_id: Optional[str] = None, limit: int = 100):
+async def get_nodes_endpoint(
+    request: Request, group_id: Optional[str] = None, limit: int = 100, fields: Optional[str] = None
+):
     """Get all nodes (entities) from the knowledge graph"""
-    return await get_nodes(request, group_id, limit)
+    return await get_nodes(request, group_id, limit, fields)
 
 @app.get("/facts")
-async def get_facts_endpoint(request: Request, group_id: Optional[str] = None, limit: int = 100):
+async def get_facts_endpoint(
+    request: Request, group_id: Optional[str] = None, limit: int = 100, fields: Optional[str] = None
+):
     """Get all facts (edges) from the knowledge graph"""
-    return await get_facts(request, group_id, limit)
+    return await get_facts(request, group_id, limit, fields)
 
 @app.get("/episodes/{group_id}")
-async def get_episodes_by_group(request: Request, group_id: str, last_n: int = Query(20)):
+async def get_episodes_by_group(
+    request: Request, group_id: str, last_n: int = Query(20), fields: Optional[str] = None
+):
     """Get episodes by group_id"""
-    try:
-        client = request.app.state.graphiti_client
-        from datetime import datetime, timezone
-        episodes = await client.retrieve_episodes(
-            group_ids=[group_id],
-            reference_time=datetime.now(timezone.utc),
-            last_n=last_n
-        )
-        
-        # Convert episodes to dict format
-        result = []
-        for episode in episodes:
-            result.append({
-                "uuid": episode.uuid,
-                "name": episode.name,
-                "group_id": episode.group_id,
-                "labels": getattr(episode, 'labels', []),
-                "created_at": str(episode.created_at),
-                "source": episode.source.value if hasattr(episode.source, 'value') else str(episode.source),
-                "source_description": episode.source_description,
-                "content": episode.content,
-                "valid_at": str(episode.valid_at),
-                "entity_edges": episode.entity_edges
-            })
-        
-        return result
-    except Exception as e:
-        logger.error(f"Failed to get episodes: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    return await get_group_episodes(request, group_id, last_n, fields)
+
+# Import admin routes
+from .admin_routes import (
+    get_extraction_cache_stats,
+    clear_extraction_cache,
+    get_query_cache_stats,
+    flush_query_cache,
+    get_vector_index_stats,
+    get_replica_stats,
+    list_jobs,
+    get_job,
+    stream_job_events,
+    cancel_job,
+)
+from .reembed import start_reembed, ReembedRequest
+from .embedding_benchmark import benchmark_embeddings, EmbeddingBenchmarkRequest
+
+@app.get("/admin/extraction-cache")
+async def extraction_cache_stats_endpoint(request: Request):
+    """Hit rate and stored bytes of the LLM extraction cache"""
+    return await get_extraction_cache_stats(request)
+
+@app.delete("/admin/extraction-cache")
+async def clear_extraction_cache_endpoint(request: Request):
+    """Drop all cached extraction results"""
+    return await clear_extraction_cache(request)
+
+@app.get("/admin/cache")
+async def query_cache_stats_endpoint(request: Request):
+    """Hit counts of the two-tier query cache"""
+    return await get_query_cache_stats(request)
+
+@app.delete("/admin/cache")
+async def flush_query_cache_endpoint(request: Request):
+    """Invalidate all cached search responses"""
+    return await flush_query_cache(request)
+
+@app.get("/admin/vector-index")
+async def vector_index_stats_endpoint(request: Request):
+    """Hot groups held in the in-process vector index"""
+    return await get_vector_index_stats(request)
+
+@app.post("/admin/vector-index/benchmark")
+async def embedding_benchmark_endpoint(request: Request, data: EmbeddingBenchmarkRequest):
+    """Memory saved and recall@k of truncated/quantized embeddings on a group's data"""
+    return await benchmark_embeddings(request, data)
+
+@app.get("/admin/shards")
+async def shard_status_endpoint(request: Request):
+    """Sharding mode, shard graphs and migration state"""
+    return await get_shard_status(request)
+
+@app.post("/admin/shards/migrate")
+async def shard_migration_endpoint(request: Request, data: ShardMigrationRequest):
+    """Move groups from the shared graph into their own graphs"""
+    return await start_shard_migration(request, data)
+
+@app.get("/admin/replicas")
+async def replica_stats_endpoint(request: Request):
+    """Read replica latencies and read routing counts"""
+    return await get_replica_stats(request)
+
+from .retention import (
+    get_retention_policies,
+    set_retention_policy,
+    delete_retention_policy,
+    start_compaction,
+    RetentionPolicy,
+    CompactionRequest,
+)
+
+@app.get("/admin/retention")
+async def retention_policies_endpoint(request: Request):
+    """Per-group retention policies and the default policy"""
+    return await get_retention_policies(request)
+
+@app.put("/admin/retention/{group_id}")
+async def set_retention_policy_endpoint(request: Request, group_id: str, policy: RetentionPolicy):
+    """Set how long a group keeps invalidated facts and episodes"""
+    return await set_retention_policy(request, group_id, policy)
+
+@app.delete("/admin/retention/{group_id}")
+async def delete_retention_policy_endpoint(request: Request, group_id: str):
+    """Fall back to the default retention policy for a group"""
+    return await delete_retention_policy(request, group_id)
+
+@app.post("/admin/compaction", status_code=202)
+async def compaction_endpoint(request: Request, data: CompactionRequest):
+    """Apply retention policies in a throttled background job"""
+    return await start_compaction(request, data)
+
+@app.post("/admin/reembed")
+async def reembed_endpoint(request: Request, data: ReembedRequest):
+    """Start a background job re-embedding facts and entities"""
+    return await start_reembed(request, data)
+
+from .summaries import get_group_summary, GroupSummary
+from .neighborhood import get_entity_neighborhood
+
+@app.get("/entities/{uuid}/neighborhood")
+async def entity_neighborhood_endpoint(
+    request: Request,
+    uuid: str,
+    depth: int = Query(1),
+    limit: int = Query(50),
+    valid_only: bool = Query(False),
+):
+    """Facts and neighbors of an entity up to depth hops"""
+    return await get_entity_neighborhood(request, uuid, depth, limit, valid_only)
+
+@app.get("/groups/{group_id}/summary", response_model=GroupSummary)
+async def group_summary_endpoint(request: Request, group_id: str):
+    """Materialized summary of a group: top entities and their recent valid facts"""
+    return await get_group_summary(request, group_id)
+
+@app.delete("/groups/{group_id}", status_code=202)
+async def delete_group_endpoint(request: Request, group_id: str):
+    """Hide a group immediately and delete its data in background batches"""
+    return await delete_group(request, group_id)
+
+# Background jobs
+@app.get("/jobs")
+async def list_jobs_endpoint(request: Request, kind: Optional[str] = None):
+    """List background jobs"""
+    return await list_jobs(request, kind)
+
+@app.get("/jobs/{job_id}")
+async def get_job_endpoint(request: Request, job_id: str):
+    """Get status and progress of a background job"""
+    return await get_job(request, job_id)
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(request: Request, job_id: str):
+    """Server-sent events with stage transitions and status changes of a job"""
+    return await stream_job_events(request, job_id)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job_endpoint(request: Request, job_id: str):
+    """Cancel a running background job"""
+    return await cancel_job(request, job_id)
@@ -0,0 +1,61 @@
+"""
+Prometheus text exposition for /metrics
+
+Collects counters from the components hanging off app.state; there is no
+client library dependency, the format is simple enough to render directly.
+"""
+from typing import List
+
+from .cache import query_cache
+from .ingestion import ingestion_tracker
+from .vector_index import vector_index
+from .replicas import replica_pool
+
+def _gauge(name: str, help_text: str, value, kind: str = "gauge") -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+def render_metrics(app) -> str:
+    lines: List[str] = []
+
+    worker = getattr(app.state, "worker", None)
+    if worker is not None:
+        lines += worker.prometheus_lines()
+
+    monitor = getattr(app.state, "loop_monitor", None)
+    if monitor is not None:
+        lines += monitor.prometheus_lines()
+
+    ingestion = ingestion_tracker.stats()
+    lines += _gauge("graphiti_ingestion_in_flight", "Episodes currently being ingested", ingestion["in_flight"])
+    lines += _gauge("graphiti_ingestion_completed_total", "Episodes ingested", ingestion["completed"], "counter")
+    lines += _gauge("graphiti_ingestion_failed_total", "Episodes that failed ingestion", ingestion["failed"], "counter")
+
+    jobs = getattr(app.state, "jobs", None)
+    if jobs is not None:
+        lines += _gauge("graphiti_background_jobs_active", "Running background jobs", len(jobs.active()))
+
+    cache = getattr(app.state, "extraction_cache", None)
+    if cache is not None:
+        lines += _gauge("graphiti_extraction_cache_hits_total", "Extraction cache hits", cache.hits, "counter")
+        lines += _gauge("graphiti_extraction_cache_misses_total", "Extraction cache misses", cache.misses, "counter")
+
+    query = query_cache.snapshot()
+    lines += _gauge("graphiti_query_cache_local_hits_total", "Query cache hits served in-process", query["local_hits"], "counter")
+    lines += _gauge("graphiti_query_cache_shared_hits_total", "Query cache hits served by the shared tier", query["shared_hits"], "counter")
+    lines += _gauge("graphiti_query_cache_misses_total", "Query cache misses", query["misses"], "counter")
+    lines += _gauge("graphiti_query_cache_shared_errors_total", "Failed shared tier calls", query["shared_errors"], "counter")
+
+    if vector_index.enabled:
+        index = vector_index.snapshot()
+        lines += _gauge("graphiti_vector_index_groups", "Groups held in the in-process vector index", len(index["groups"]))
+        lines += _gauge("graphiti_vector_index_bytes", "Memory used by in-process vector indexes", index["bytes"])
+        lines += _gauge("graphiti_vector_index_hits_total", "Searches answered in-process", index["hits"], "counter")
+        lines += _gauge("graphiti_vector_index_fallbacks_total", "Searches sent to FalkorDB", index["fallbacks"], "counter")
+
+    if replica_pool.enabled:
+        replicas = replica_pool.snapshot()
+        lines += _gauge("graphiti_replica_reads_total", "Reads served by a read replica", replicas["replica_reads"], "counter")
+        lines += _gauge("graphiti_replica_pinned_reads_total", "Reads kept on the primary after a recent write", replicas["pinned_reads"], "counter")
+        lines += _gauge("graphiti_replica_fallback_reads_total", "Reads sent to the primary with no replica available", replicas["primary_reads"], "counter")
+
+    return "\n".join(lines) + "\n"
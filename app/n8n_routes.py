@@ -3,13 +3,24 @@ Additional routes specifically for n8n integration
 Compatible with the original Graphiti API format
 """
 import logging
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, timezone
 from fastapi import Request, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from graphiti_core.nodes import EpisodeType
-from .graphiti_logic import SearchResponse, SearchResultEdge, SearchResultEpisode
+from .graphiti_logic import SearchResponse, SearchResultEdge, SearchResultEpisode, apply_ingestion, fetch_above_min_score
+from .group_deletion import tombstones, ensure_group_visible
+from .ingestion import ingestion_tracker, submit_ingestion, wait_for_ingestion
+from .cache import query_cache, cache_key
+from .vector_index import search_hot_groups, cosine_scorer
+from .sharding import graph_router, merge_ranked, ensure_group_writable
+from .temporal import TemporalFilter, search_filters
+from .summaries import group_summaries, GroupSummary
+from .planner import RetrievalPlan, planner
+from .diversify import DiversifyOptions, diversify
+from .context import pack_facts, render_context
+from .config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -30,13 +41,20 @@ class N8nMessagesRequest(BaseModel):
 class N8nResult(BaseModel):
     message: str
     success: bool
+    job_id: Optional[str] = None
 
 # Get memory models
-class GetMemoryRequest(BaseModel):
+class GetMemoryRequest(TemporalFilter, DiversifyOptions):
     group_id: str
     messages: List[N8nMessage]
     max_facts: int = 20
     min_score: Optional[float] = None
+    # "prefix": summary facts first, then search results; "only": no search at all
+    summary: Literal["off", "prefix", "only"] = "off"
+    # Pack the most valuable facts into this many (estimated) tokens
+    token_budget: Optional[int] = Field(default=None, gt=0)
+    # "context": a ready-to-use prompt string instead of the facts list
+    format: Literal["facts", "context"] = "facts"
 
 class FactResult(BaseModel):
     fact: str
@@ -45,9 +63,18 @@ class FactResult(BaseModel):
     valid_at: datetime
     invalid_at: Optional[datetime] = None
     relevance_score: Optional[float] = None
+    # uuids of near-duplicate facts collapsed into this one (diversify only)
+    duplicates: Optional[List[str]] = None
     
 class GetMemoryResponse(BaseModel):
     facts: List[FactResult]
+    summary: Optional[GroupSummary] = None
+    plan: Optional[RetrievalPlan] = None
+    # Set for format "context": the packed facts as one string and their uuids
+    context: Optional[str] = None
+    fact_uuids: Optional[List[str]] = None
+    # Estimated tokens of the packed facts, when token_budget or format "context" is used
+    tokens: Optional[int] = None
 
 # Episode response model (n8n format)
 class EpisodeData(BaseModel):
@@ -62,19 +89,15 @@ class EpisodeData(BaseModel):
     valid_at: datetime
     entity_edges: List[dict] = []
 
-async def add_messages_n8n(request: Request, data: N8nMessagesRequest) -> N8nResult:
-    """
-    n8n compatible endpoint for adding messages
-    Accepts the format used by the original Graphiti server
-    """
-    try:
-        client = request.app.state.graphiti_client
+async def _ingest_messages(client, data: N8nMessagesRequest, job) -> dict:
+    """Ingest a message batch one episode at a time, reporting progress on the job."""
+    episode_ids = []
+    for msg in data.messages:
+        # Format the episode body like the original implementation
+        episode_body = f'{msg.role or ""}({msg.role_type}): {msg.content}'
         
-        for msg in data.messages:
-            # Format the episode body like the original implementation
-            episode_body = f'{msg.role or ""}({msg.role_type}): {msg.content}'
-            
-            await client.add_episode(
+        async with ingestion_tracker.track():
+            result = await client.add_episode(
                 uuid=msg.uuid,
                 name=msg.name or f"Message from {data.group_id}",
                 episode_body=episode_body,
@@ -83,8 +106,29 @@ async def add_messages_n8n(request: Request, data: N8nMessagesRequest) -> N8nRes
                 reference_time=msg.timestamp or datetime.now(timezone.utc),
                 group_id=data.group_id,
             )
-        
-        return N8nResult(message="Messages added to processing queue", success=True)
+        await apply_ingestion(client, data.group_id, result)
+        episode_ids.append(result.episode.uuid)
+        job.update(episodes_done=len(episode_ids))
+    return {"episodes": len(episode_ids), "episode_ids": episode_ids}
+
+async def add_messages_n8n(request: Request, data: N8nMessagesRequest, background: bool = False) -> N8nResult:
+    """
+    n8n compatible endpoint for adding messages
+    Accepts the format used by the original Graphiti server
+    """
+    ingestion_tracker.ensure_accepting()
+    ensure_group_visible(data.group_id)
+    ensure_group_writable(data.group_id)
+    try:
+        client = await graph_router.for_group(data.group_id)
+        job = submit_ingestion(
+            request.app.state.jobs,
+            lambda job: _ingest_messages(client, data, job),
+            params={"group_id": data.group_id, "episodes": len(data.messages)},
+        )
+        if not background:
+            await wait_for_ingestion(job)
+        return N8nResult(message="Messages added to processing queue", success=True, job_id=job.id)
     except Exception as e:
         logger.error(f"Failed to add messages: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -99,7 +143,7 @@ async def get_episodes_n8n(
     Returns episodes in the format expected by n8n
     """
     try:
-        client = request.app.state.graphiti_client
+        client = await graph_router.for_group(group_id, read=True)
         
         # Try different parameter names for retrieve_episodes
         try:
@@ -165,21 +209,36 @@ async def get_episodes_n8n(
         logger.error(f"Failed to get episodes: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def search_n8n(request: Request, query: str, group_id: Optional[str] = None) -> SearchResponse:
+async def search_n8n(
+    request: Request,
+    query: str,
+    group_id: Optional[str] = None,
+    temporal: Optional[TemporalFilter] = None,
+) -> SearchResponse:
     """
     Simple search endpoint for n8n
     """
     try:
-        client = request.app.state.graphiti_client
+        hidden = tombstones.snapshot()
+        if group_id in hidden:
+            return SearchResponse(episodes=[], edges=[])
+        windows = temporal.windows() if temporal else []
         
-        search_kwargs = {"num_results": 20}
-        if group_id:
-            search_kwargs["group_ids"] = [group_id]
+        async def search_graph(graph_client, graph_group_ids):
+            search_kwargs = {"num_results": 20}
+            if windows:
+                search_kwargs["search_filter"] = search_filters(windows)
+            if graph_group_ids:
+                search_kwargs["group_ids"] = graph_group_ids
+            return await graph_client.search(query, **search_kwargs)
         
-        results = await client.search(query, **search_kwargs)
+        parts = await graph_router.fan_out([group_id] if group_id else None, search_graph, read=True)
+        results = merge_ranked(parts, 20)
         
         edges = []
         for edge in results:
+            if getattr(edge, "group_id", None) in hidden:
+                continue
             if hasattr(edge, "fact"):
                 search_edge = SearchResultEdge(
                     fact=edge.fact,
@@ -196,13 +255,69 @@ async def search_n8n(request: Request, query: str, group_id: Optional[str] = Non
         logger.error(f"Search failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _memory_response(
+    data: GetMemoryRequest, facts: List[FactResult], summary: Optional[GroupSummary], plan: RetrievalPlan
+) -> GetMemoryResponse:
+    """Response in the requested format, packed into the token budget if one is given."""
+    if data.token_budget is None and data.format == "facts":
+        return GetMemoryResponse(facts=facts, summary=summary, plan=plan)
+    packed, tokens = pack_facts(facts, data.token_budget)
+    if data.format == "facts":
+        return GetMemoryResponse(facts=packed, summary=summary, plan=plan, tokens=tokens)
+    return GetMemoryResponse(
+        facts=[],
+        summary=summary,
+        plan=plan,
+        context=render_context(packed),
+        fact_uuids=[fact.uuid for fact in packed],
+        tokens=tokens,
+    )
+
 async def get_memory_n8n(request: Request, data: GetMemoryRequest) -> GetMemoryResponse:
     """
     Get memory endpoint for n8n - returns relevant facts from the knowledge graph
     based on the conversation context
     """
     try:
-        client = request.app.state.graphiti_client
+        client = await graph_router.for_group(data.group_id, read=True)
+        
+        # Groups being deleted are invisible to memory retrieval
+        if data.group_id in tombstones:
+            return GetMemoryResponse(facts=[])
+        
+        response_key = None
+        if settings.CACHE_ENABLED:
+            versions = await query_cache.group_versions([data.group_id])
+            response_key = cache_key("memory", data.model_dump(mode="json"), versions)
+            cached = await query_cache.get_json(response_key)
+            if cached is not None:
+                return GetMemoryResponse.model_validate(cached)
+        
+        summary = None
+        summary_facts = []
+        if data.summary != "off":
+            # The materialized summary needs neither an embedding nor a search
+            summary = (await group_summaries.get(data.group_id)).served()
+            summary_facts = [
+                FactResult(
+                    fact=fact.fact,
+                    uuid=fact.uuid,
+                    created_at=fact.created_at or fact.valid_at,
+                    valid_at=fact.valid_at or fact.created_at,
+                )
+                for fact in summary.facts(data.max_facts)
+            ]
+        # A prefix counts against max_facts; the search only fills what is left
+        remaining = data.max_facts - len(summary_facts)
+        if data.summary == "only" or remaining <= 0:
+            reason = "summary only requested" if data.summary == "only" else "summary fills max_facts"
+            plan = RetrievalPlan(strategy="summary", reason=reason)
+            response = _memory_response(data, summary_facts, summary, plan)
+            if response_key is not None:
+                await query_cache.set_json(
+                    response_key, response.model_dump(mode="json"), settings.CACHE_SEARCH_TTL_SECONDS
+                )
+            return response
         
         # Compose query from messages
         combined_query = ""
@@ -211,22 +326,47 @@ async def get_memory_n8n(request: Request, data: GetMemoryRequest) -> GetMemoryR
             role = message.role or ""
             combined_query += f"{role_type}({role}): {message.content}\n"
         
-        # Search the knowledge graph
-        results = await client.search(
-            query=combined_query,
-            group_ids=[data.group_id],
-            num_results=data.max_facts
-        )
+        # Search the knowledge graph; a hot group is answered from memory
+        windows = data.windows()
+        k = data.candidates(remaining)
+        # A conversation is never an entity name, so keyword plans do not apply
+        plan = await planner.choose(combined_query, [data.group_id], remaining, data.min_score, allow_keyword=False)
+        results = None
+        if plan.strategy == "scan":
+            results = await planner.scan(combined_query, [data.group_id], windows, k)
+            if results is None:
+                plan.strategy, plan.reason = "hybrid", "scan found more facts than requested"
+        if results is None:
+            results = await search_hot_groups(
+                client, combined_query, [data.group_id], k, windows, data.min_score,
+                replaces_hybrid=True,
+            )
+            if results is not None:
+                plan.strategy = "vector_index"
+        if results is None:
+            # min_score cannot go into graphiti's query; over-fetch until max_facts
+            # have a cosine similarity to the query at or above it
+            async def fetch(num_results):
+                return await client.search(
+                    query=combined_query,
+                    group_ids=[data.group_id],
+                    num_results=num_results,
+                    search_filter=search_filters(windows),
+                )
+            results = await fetch_above_min_score(
+                fetch, k, data.min_score, cosine_scorer(client.embedder, combined_query, [data.group_id])
+            )
+        if data.diversify:
+            selected = await diversify(results, data, [data.group_id], remaining)
+        else:
+            selected = [(edge, None) for edge in results]
         
-        # Convert edges to facts
-        facts = []
-        for edge in results:
-            if hasattr(edge, "fact"):
+        # Convert edges to facts, after the summary's when it is a prefix
+        facts = list(summary_facts)
+        seen = {fact.uuid for fact in facts}
+        for edge, duplicates in selected:
+            if hasattr(edge, "fact") and str(edge.uuid) not in seen:
                 score = getattr(edge, 'score', None)
-                # Filter by min_score if specified
-                if data.min_score is not None and score is not None and score < data.min_score:
-                    continue
-                    
                 fact = FactResult(
                     fact=edge.fact,
                     uuid=str(edge.uuid),
@@ -234,10 +374,16 @@ async def get_memory_n8n(request: Request, data: GetMemoryRequest) -> GetMemoryR
                     valid_at=edge.valid_at,
                     invalid_at=edge.invalid_at,
                     relevance_score=score,
+                    duplicates=duplicates,
                 )
                 facts.append(fact)
         
-        return GetMemoryResponse(facts=facts)
+        response = _memory_response(data, facts[: data.max_facts], summary, plan)
+        if response_key is not None:
+            await query_cache.set_json(
+                response_key, response.model_dump(mode="json"), settings.CACHE_SEARCH_TTL_SECONDS
+            )
+        return response
     except Exception as e:
         logger.error(f"Get memory failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Entity neighborhoods
+
+"What do we know about entity X": the facts around an entity and the
+entities they lead to, up to a few hops, in one bounded Cypher traversal.
+Each hop expands the previous hop's new entities and keeps at most `limit`
+of the most recent facts, so a hub entity cannot blow up the query.
+
+Hot neighborhoods are kept in a per-worker LRU. Entries carry the version of
+the entity's group (see cache.py) and are ignored once any write to the
+group has bumped it.
+"""
+import logging
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+
+from .config import settings
+from .cache import LocalLRU, query_cache
+from .group_deletion import tombstones
+from .sharding import graph_router
+from .temporal import TemporalFilter, cypher_condition
+
+logger = logging.getLogger(__name__)
+
+_GROUP_QUERY = """
+MATCH (n:Entity {uuid: $uuid})
+RETURN n.group_id AS group_id
+LIMIT 1
+"""
+
+def _edge_map(hop: int) -> str:
+    return (
+        "CASE WHEN e IS NULL THEN null ELSE {uuid: e.uuid, fact: e.fact, "
+        "source_uuid: startNode(e).uuid, target_uuid: endNode(e).uuid, "
+        "created_at: e.created_at, valid_at: e.valid_at, invalid_at: e.invalid_at, "
+        f"hop: {hop}}} END"
+    )
+
+def neighborhood_query(depth: int, condition: str = "") -> str:
+    """Traversal to depth hops from $uuid, at most $limit facts per hop."""
+    extra = f"AND {condition}" if condition else ""
+    lines = [
+        "MATCH (root:Entity {uuid: $uuid})",
+        "WITH root, [root] AS frontier, [root.uuid] AS seen, [] AS facts, [] AS neighbors",
+    ]
+    for hop in range(1, depth + 1):
+        lines += [
+            # The null row keeps the pipeline alive when the frontier is empty
+            "UNWIND frontier + [null] AS f",
+            "OPTIONAL MATCH (f)-[e:RELATES_TO]-(m:Entity)",
+            f"WHERE NOT e.uuid IN [x IN facts | x.uuid] {extra}",
+            "WITH root, seen, facts, neighbors, e, m",
+            "ORDER BY coalesce(e.created_at, '') DESC",
+            "LIMIT $limit",
+            f"WITH root, seen, facts, neighbors, collect(DISTINCT {_edge_map(hop)}) AS hop_facts, "
+            "collect(DISTINCT m) AS reached",
+            "WITH root, seen, facts + hop_facts AS facts, neighbors, "
+            "[x IN reached WHERE NOT x.uuid IN seen] AS frontier",
+            "WITH root, facts, frontier, seen + [x IN frontier | x.uuid] AS seen, "
+            f"neighbors + [x IN frontier | {{uuid: x.uuid, name: x.name, summary: x.summary, hop: {hop}}}] AS neighbors",
+        ]
+    lines.append(
+        "RETURN root.uuid AS uuid, root.name AS name, root.summary AS summary, "
+        "root.group_id AS group_id, facts, neighbors"
+    )
+    return "\n".join(lines)
+
+# Entity uuid -> group_id; an entity never changes group
+_entity_groups: Dict[str, str] = {}
+
+async def entity_group(uuid: str) -> Optional[str]:
+    """Group of an entity, looked up across all graphs once per worker."""
+    group_id = _entity_groups.get(uuid)
+    if group_id is None:
+        _, records = await graph_router.locate(_GROUP_QUERY, uuid=uuid)
+        if not records:
+            return None
+        group_id = records[0]["group_id"]
+        if len(_entity_groups) > 100000:
+            _entity_groups.clear()
+        _entity_groups[uuid] = group_id
+    return group_id
+
+def _timestamp(value) -> Optional[str]:
+    return str(value) if value else None
+
+class NeighborhoodCache:
+    """Per-worker LRU of neighborhoods, checked against group versions."""
+
+    def __init__(self):
+        self.lru = LocalLRU(settings.NEIGHBORHOOD_CACHE_ENTRIES)
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(self, uuid: str, depth: int, limit: int, valid_only: bool) -> Optional[dict]:
+        group_id = await entity_group(uuid)
+        if group_id is None or group_id in tombstones:
+            return None
+        # Read before the traversal: a write landing during it makes the entry stale, never wrong
+        version = (await query_cache.group_versions([group_id]))[group_id]
+        key = f"{uuid}:{depth}:{limit}:{valid_only}"
+        cached = self.lru.get(key)
+        if cached is not None and cached[0] == version:
+            self.stats["hits"] += 1
+            return cached[1]
+        self.stats["misses"] += 1
+
+        windows = TemporalFilter(valid_only=valid_only).windows()
+        condition, params = cypher_condition("e", windows)
+        client = await graph_router.for_group(group_id, read=True)
+        records, _, _ = await client.driver.execute_query(
+            neighborhood_query(depth, condition), uuid=uuid, limit=limit, **params
+        )
+        if not records:
+            return None
+        neighborhood = self._format(records[0], depth, limit)
+        self.lru.set(key, (version, neighborhood), settings.NEIGHBORHOOD_CACHE_TTL_SECONDS)
+        return neighborhood
+
+    @staticmethod
+    def _format(record: dict, depth: int, limit: int) -> dict:
+        facts = [
+            {
+                **fact,
+                "created_at": _timestamp(fact.get("created_at")),
+                "valid_at": _timestamp(fact.get("valid_at")),
+                "invalid_at": _timestamp(fact.get("invalid_at")),
+            }
+            for fact in record["facts"] if fact
+        ]
+        per_hop = [sum(1 for fact in facts if fact["hop"] == hop) for hop in range(1, depth + 1)]
+        return {
+            "entity": {
+                "uuid": record["uuid"],
+                "name": record["name"],
+                "summary": record["summary"],
+                "group_id": record["group_id"],
+            },
+            "depth": depth,
+            "facts": facts,
+            "neighbors": record["neighbors"],
+            # Hops that hit the fan-out limit and may have more facts
+            "truncated_hops": [hop for hop, count in enumerate(per_hop, start=1) if count >= limit],
+        }
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self.lru), **self.stats}
+
+neighborhoods = NeighborhoodCache()
+
+async def get_entity_neighborhood(
+    request: Request, uuid: str, depth: int = 1, limit: int = 50, valid_only: bool = False
+) -> dict:
+    """Facts and neighbors of an entity up to depth hops."""
+    if not 1 <= depth <= settings.NEIGHBORHOOD_MAX_DEPTH:
+        raise HTTPException(status_code=400, detail=f"depth must be between 1 and {settings.NEIGHBORHOOD_MAX_DEPTH}")
+    if not 1 <= limit <= settings.NEIGHBORHOOD_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.NEIGHBORHOOD_MAX_LIMIT}")
+    try:
+        neighborhood = await neighborhoods.get(uuid, depth, limit, valid_only)
+    except Exception as e:
+        logger.error(f"Failed to get neighborhood of entity {uuid}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    if neighborhood is None:
+        raise HTTPException(status_code=404, detail=f"Entity {uuid} not found")
+    return neighborhood
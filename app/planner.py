@@ -0,0 +1,194 @@
+"""
+Cost-based retrieval planning
+
+Every plain search used to pay for a query embedding and a vector search,
+even in a group holding a dozen facts. The planner keeps cheap statistics
+per group - fact count, entity count, time of the last fact written and,
+for groups of moderate size, the entity names - and picks a strategy per
+request:
+
+- scan: every current (not expired) fact of the groups fits in the
+  response, so they are all read with one Cypher query - filtered by the
+  request's validity window like any search - and ordered by word overlap
+  with the query, no embedding. Word overlap is not a similarity score, so
+  scanned facts carry no relevance_score;
+- keyword: the query is quoted or is exactly the name of an entity, so a
+  fulltext-only search finds it without an embedding;
+- hybrid: everything else goes through the usual search (the in-process
+  vector index for hot groups, graphiti's hybrid search otherwise).
+
+Statistics are read with one query per group. Keyword and hybrid choices
+are safe on slightly stale numbers, so for them statistics are reused until
+the group version changes and PLANNER_STATS_MAX_AGE_SECONDS have passed and
+a busy group is not recounted on every write. A scan is only chosen on
+statistics of the current group version, and falls back to hybrid if the
+groups still turn out larger than the response. Responses carry the chosen
+plan.
+"""
+import logging
+import re
+import time
+from typing import Dict, List, Literal, Optional, Set
+
+from pydantic import BaseModel
+
+from .config import settings
+from .cache import query_cache
+from .sharding import graph_router
+from .temporal import Window, cypher_condition
+from .vector_index import FactHit
+
+logger = logging.getLogger(__name__)
+
+_STATS_QUERY = """
+MATCH (n:Entity)
+WHERE n.group_id = $group_id
+WITH count(n) AS entities
+OPTIONAL MATCH (:Entity)-[e:RELATES_TO]->(:Entity)
+WHERE e.group_id = $group_id AND e.expired_at IS NULL
+RETURN entities, count(e) AS facts, max(e.created_at) AS last_write
+"""
+
+_NAMES_QUERY = """
+MATCH (n:Entity)
+WHERE n.group_id = $group_id
+RETURN toLower(n.name) AS name
+"""
+
+_SCAN_QUERY = """
+MATCH (n:Entity)-[e:RELATES_TO]->(m:Entity)
+WHERE e.group_id IN $group_ids AND e.expired_at IS NULL {temporal}
+RETURN e.uuid AS uuid, e.fact AS fact, e.group_id AS group_id,
+       n.uuid AS source_node_uuid, m.uuid AS target_node_uuid,
+       n.name AS source_name, m.name AS target_name,
+       e.created_at AS created_at, e.valid_at AS valid_at, e.invalid_at AS invalid_at
+LIMIT $limit
+"""
+
+_WORD = re.compile(r"\w+")
+
+Strategy = Literal["scan", "keyword", "hybrid", "vector_index", "recipe", "focal", "summary"]
+
+class RetrievalPlan(BaseModel):
+    """How a request was answered, and why."""
+    strategy: Strategy
+    reason: str
+    facts: Optional[int] = None
+    entities: Optional[int] = None
+    last_write: Optional[str] = None
+
+class GroupStats:
+    def __init__(self, version: int, facts: int, entities: int, last_write, names: Optional[Set[str]]):
+        self.version = version
+        self.facts = facts
+        self.entities = entities
+        self.last_write = str(last_write) if last_write else None
+        # Lower-cased entity names; None for groups too large to keep them
+        self.names = names
+        self.fetched_at = time.monotonic()
+
+def _words(text: str) -> Set[str]:
+    return {word for word in _WORD.findall(text.lower()) if len(word) > 2}
+
+class RetrievalPlanner:
+    """Per-worker group statistics and strategy choice."""
+
+    def __init__(self):
+        self._stats: Dict[str, GroupStats] = {}
+        self.stats = {"scan": 0, "keyword": 0, "hybrid": 0, "stats_reads": 0, "scan_fallbacks": 0}
+
+    async def group_stats(self, group_ids: List[str], exact: bool = False) -> List[GroupStats]:
+        """Statistics per group; exact ones reflect the current group version."""
+        versions = await query_cache.group_versions(group_ids)
+        result = []
+        for group_id in group_ids:
+            stats = self._stats.get(group_id)
+            fresh = stats is not None and (
+                stats.version == versions.get(group_id)
+                or (not exact and time.monotonic() - stats.fetched_at < settings.PLANNER_STATS_MAX_AGE_SECONDS)
+            )
+            if not fresh:
+                stats = await self._read(group_id, versions.get(group_id, 0))
+                if len(self._stats) > 10000:
+                    self._stats.clear()
+                self._stats[group_id] = stats
+            result.append(stats)
+        return result
+
+    async def _read(self, group_id: str, version: int) -> GroupStats:
+        self.stats["stats_reads"] += 1
+        client = await graph_router.for_group(group_id, read=True)
+        records, _, _ = await client.driver.execute_query(_STATS_QUERY, group_id=group_id)
+        record = records[0] if records else {"entities": 0, "facts": 0, "last_write": None}
+        names = None
+        if record["entities"] <= settings.PLANNER_MAX_CACHED_NAMES:
+            name_records, _, _ = await client.driver.execute_query(_NAMES_QUERY, group_id=group_id)
+            names = {r["name"] for r in name_records if r["name"]}
+        return GroupStats(version, record["facts"], record["entities"], record["last_write"], names)
+
+    async def choose(
+        self, query: str, group_ids: Optional[List[str]], limit: int, min_score: Optional[float] = None,
+        allow_keyword: bool = True,
+    ) -> RetrievalPlan:
+        """Cheapest strategy expected to answer a request for limit facts as well as hybrid search."""
+        if not settings.PLANNER_ENABLED or not group_ids:
+            return RetrievalPlan(strategy="hybrid", reason="no group statistics to plan with")
+        stats = await self.group_stats(group_ids)
+        scan_max = min(limit, settings.PLANNER_SCAN_MAX_FACTS)
+        if min_score is None and sum(s.facts for s in stats) <= scan_max:
+            # Only a current count may justify reading the groups whole
+            stats = await self.group_stats(group_ids, exact=True)
+        facts = sum(s.facts for s in stats)
+        entities = sum(s.entities for s in stats)
+        last_write = max((s.last_write for s in stats if s.last_write), default=None)
+
+        def plan(strategy: str, reason: str) -> RetrievalPlan:
+            self.stats[strategy] += 1
+            return RetrievalPlan(strategy=strategy, reason=reason, facts=facts, entities=entities, last_write=last_write)
+
+        # Plans without a similarity score cannot honour a score threshold
+        if min_score is None:
+            if facts <= scan_max:
+                return plan("scan", f"{facts} facts, at most {scan_max}: read them all")
+            if allow_keyword:
+                stripped = query.strip()
+                if len(stripped) > 2 and stripped[0] == stripped[-1] == '"':
+                    return plan("keyword", "quoted query")
+                name = stripped.lower()
+                if any(s.names is not None and name in s.names for s in stats):
+                    return plan("keyword", "query is an entity name")
+        return plan("hybrid", "default")
+
+    async def scan(
+        self, query: str, group_ids: List[str], windows: List[Window], limit: int
+    ) -> Optional[List[FactHit]]:
+        """
+        All current facts of the groups within windows, best word overlap with
+        the query first, then newest; None when there are more than limit of them.
+        """
+        condition, params = cypher_condition("e", windows)
+        cypher = _SCAN_QUERY.format(temporal=f"AND {condition}" if condition else "")
+
+        async def fetch(client, graph_group_ids):
+            # One row past the limit tells a complete read from a truncated one
+            records, _, _ = await client.driver.execute_query(
+                cypher, group_ids=graph_group_ids, limit=limit + 1, **params
+            )
+            return records
+        parts = await graph_router.fan_out(group_ids, fetch, read=True)
+        records = [record for part in parts for record in part]
+        if len(records) > limit:
+            logger.info(f"Scan of {group_ids} found more than {limit} facts, falling back to hybrid search")
+            self.stats["scan_fallbacks"] += 1
+            return None
+        words = _words(query)
+
+        def overlap(record) -> float:
+            return len(words & _words(record["fact"] or "")) / len(words) if words else 0.0
+        records.sort(key=lambda record: (overlap(record), str(record["created_at"] or "")), reverse=True)
+        return [FactHit(score=None, **record) for record in records]
+
+    def snapshot(self) -> dict:
+        return {"enabled": settings.PLANNER_ENABLED, "groups": len(self._stats), **self.stats}
+
+planner = RetrievalPlanner()
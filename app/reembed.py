@@ -0,0 +1,272 @@
+"""
+Background re-embedding of facts, entities and episode chunks
+
+Changing DEFAULT_EMBEDDING_MODEL or EMBEDDING_DIM makes every stored
+fact_embedding / name_embedding / chunk_embedding incompatible with new query
+vectors. This job walks RELATES_TO edges, Entity nodes and EpisodeChunk nodes
+in uuid order (keyset pagination),
+embeds them in large batches, writes them back with UNWIND and checkpoints the
+last processed uuid so an interrupted run resumes where it stopped.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+from fastapi import Request, HTTPException
+from pydantic import BaseModel
+
+from .config import settings
+from .cache import query_cache, invalidate_groups
+from .jobs import Job, JobManager
+from .sharding import graph_router, graph_of
+
+logger = logging.getLogger(__name__)
+
+REEMBED_TARGETS = ("edges", "nodes", "chunks")
+
+class ReembedRequest(BaseModel):
+    group_id: Optional[str] = None
+    targets: List[str] = list(REEMBED_TARGETS)
+    batch_size: int = 256
+    max_items_per_second: Optional[float] = None
+    # Only embed items that have no embedding yet (e.g. facts created by PUT /facts)
+    only_missing: bool = False
+    resume: bool = True
+
+# Keyset-ordered scans; $after is the last uuid of the previous chunk
+_SCAN_QUERIES = {
+    "edges": """
+        MATCH (:Entity)-[e:RELATES_TO]->(:Entity)
+        WHERE e.uuid > $after {filters}
+        RETURN e.uuid AS uuid, e.fact AS text
+        ORDER BY e.uuid
+        LIMIT $limit
+    """,
+    "nodes": """
+        MATCH (e:Entity)
+        WHERE e.uuid > $after {filters}
+        RETURN e.uuid AS uuid, e.name AS text
+        ORDER BY e.uuid
+        LIMIT $limit
+    """,
+    # Chunk text is cut from the episode by the offsets stored at ingestion
+    "chunks": """
+        MATCH (e:EpisodeChunk)
+        WHERE e.uuid > $after {filters}
+        OPTIONAL MATCH (ep:Episodic {{uuid: e.episode_uuid}})
+        RETURN e.uuid AS uuid,
+               CASE WHEN e.start IS NULL OR ep IS NULL THEN NULL
+                    ELSE substring(ep.content, e.start, e.end - e.start) END AS text
+        ORDER BY e.uuid
+        LIMIT $limit
+    """,
+}
+
+_WRITE_QUERIES = {
+    "edges": """
+        UNWIND $rows AS row
+        MATCH (:Entity)-[e:RELATES_TO {uuid: row.uuid}]->(:Entity)
+        SET e.fact_embedding = vecf32(row.embedding)
+    """,
+    "nodes": """
+        UNWIND $rows AS row
+        MATCH (e:Entity {uuid: row.uuid})
+        SET e.name_embedding = vecf32(row.embedding)
+    """,
+    "chunks": """
+        UNWIND $rows AS row
+        MATCH (e:EpisodeChunk {uuid: row.uuid})
+        SET e.chunk_embedding = vecf32(row.embedding)
+    """,
+}
+
+_EMBEDDING_PROPERTY = {"edges": "fact_embedding", "nodes": "name_embedding", "chunks": "chunk_embedding"}
+
+def _scope_name(group_id: Optional[str]) -> str:
+    scope = group_id or "_all"
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in scope)
+
+def _checkpoint_path(group_id: Optional[str]) -> str:
+    return os.path.join(settings.JOB_STATE_DIR, f"reembed_{_scope_name(group_id)}.json")
+
+def _lock_scope(group_id: Optional[str]):
+    """Exclusive lock on a re-embed scope across workers, or None if another job holds it."""
+    os.makedirs(settings.JOB_STATE_DIR, exist_ok=True)
+    lock_file = open(os.path.join(settings.JOB_STATE_DIR, f"reembed_{_scope_name(group_id)}.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def _submit(jobs: JobManager, data: ReembedRequest, lock_file) -> Job:
+    # The scope stays locked for the life of the job
+    job = jobs.submit("reembed", lambda job: run_reembed(job, data), params=data.model_dump())
+    job.task.add_done_callback(lambda _: lock_file.close())
+    return job
+
+def _load_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable re-embed checkpoint {path}: {e}")
+        return None
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+async def run_reembed(job: Job, data: ReembedRequest) -> dict:
+    """Re-embed edges and nodes chunk by chunk, checkpointing after each write."""
+    path = _checkpoint_path(data.group_id)
+    model_signature = {
+        "model": settings.DEFAULT_EMBEDDING_MODEL,
+        "dim": settings.EMBEDDING_DIM,
+    }
+
+    checkpoint = _load_checkpoint(path) if data.resume else None
+    if checkpoint and checkpoint.get("signature") != model_signature:
+        logger.info("Embedding model changed since the last checkpoint, starting over")
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = {"signature": model_signature, "cursors": {}, "processed": {}}
+    else:
+        logger.info(f"Resuming re-embed from checkpoint {path}: {checkpoint['cursors']}")
+    # Lets a restarted service resume the job without the original request
+    checkpoint["request"] = data.model_dump()
+
+    rate = data.max_items_per_second or settings.REEMBED_MAX_ITEMS_PER_SECOND
+    batch_size = max(1, min(data.batch_size, settings.REEMBED_MAX_BATCH_SIZE))
+
+    # Every graph holding the scope, one cursor per graph and target
+    graphs = await graph_router.for_groups([data.group_id] if data.group_id else None)
+    for client, _ in graphs:
+        graph = graph_of(client)
+        for target in data.targets:
+            key = f"{graph}:{target}" if len(graphs) > 1 else target
+            filters = ""
+            params = {"limit": batch_size}
+            if data.group_id:
+                filters += " AND e.group_id = $group_id"
+                params["group_id"] = data.group_id
+            if data.only_missing:
+                filters += f" AND e.{_EMBEDDING_PROPERTY[target]} IS NULL"
+            scan_query = _SCAN_QUERIES[target].format(filters=filters)
+
+            after = checkpoint["cursors"].get(key, "")
+            processed = checkpoint["processed"].get(key, 0)
+            job.update(target=target, graph=graph, **{f"{target}_processed": processed})
+
+            while after is not None:
+                started = time.monotonic()
+                records, _, _ = await client.driver.execute_query(scan_query, after=after, **params)
+                if not records:
+                    after = None
+                    break
+
+                rows = [r for r in records if r["text"]]
+                if rows:
+                    texts = [r["text"].replace("\n", " ") for r in rows]
+                    embeddings = await client.embedder.create_batch(texts)
+                    await client.driver.execute_query(
+                        _WRITE_QUERIES[target],
+                        rows=[
+                            {"uuid": r["uuid"], "embedding": embedding}
+                            for r, embedding in zip(rows, embeddings)
+                        ],
+                    )
+
+                processed += len(records)
+                after = records[-1]["uuid"] if len(records) == batch_size else None
+                checkpoint["cursors"][key] = after
+                checkpoint["processed"][key] = processed
+                _save_checkpoint(path, checkpoint)
+                job.update(**{f"{target}_processed": processed, "cursor": after})
+
+                # Rate cap: never exceed max_items_per_second on average per chunk
+                if rate:
+                    elapsed = time.monotonic() - started
+                    delay = len(records) / rate - elapsed
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+            logger.info(f"Re-embedded {processed} {target} (group={data.group_id or 'all'})")
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    # Cached responses carry scores computed from the old embeddings
+    if data.group_id:
+        await invalidate_groups(data.group_id)
+    else:
+        await query_cache.flush()
+    return {
+        target: sum(count for key, count in checkpoint["processed"].items() if key.split(":")[-1] == target)
+        for target in data.targets
+    }
+
+def resume_reembeds(jobs: JobManager):
+    """Restart re-embed jobs whose checkpoints survived a restart."""
+    for path in glob.glob(os.path.join(settings.JOB_STATE_DIR, "reembed_*.json")):
+        checkpoint = _load_checkpoint(path)
+        if not checkpoint or "request" not in checkpoint:
+            logger.warning(f"Re-embed checkpoint {path} has no request to resume; POST /admin/reembed to continue")
+            continue
+        data = ReembedRequest(**{**checkpoint["request"], "resume": True})
+        # With several workers only the one locking the scope resumes it
+        lock_file = _lock_scope(data.group_id)
+        if lock_file is None:
+            logger.info(f"Another worker is resuming re-embed checkpoint {path}")
+            continue
+        logger.info(f"Resuming re-embed from checkpoint {path}")
+        _submit(jobs, data, lock_file)
+
+async def start_reembed(request: Request, data: ReembedRequest) -> dict:
+    """
+    Start a background re-embedding job and return its id
+    """
+    invalid = [t for t in data.targets if t not in REEMBED_TARGETS]
+    if invalid or not data.targets:
+        raise HTTPException(
+            status_code=400,
+            detail=f"targets must be a non-empty subset of {list(REEMBED_TARGETS)}",
+        )
+
+    jobs = request.app.state.jobs
+    for job in jobs.active("reembed"):
+        if job.status.params.get("group_id") == data.group_id:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Re-embed job {job.id} is already running for this scope",
+            )
+    lock_file = _lock_scope(data.group_id)
+    if lock_file is None:
+        raise HTTPException(status_code=409, detail="A re-embed job is already running for this scope")
+
+    # Cursors of a checkpoint are only valid for the selection they were made with
+    checkpoint = _load_checkpoint(_checkpoint_path(data.group_id)) if data.resume else None
+    stored = (checkpoint or {}).get("request")
+    if stored and (set(stored["targets"]) != set(data.targets) or stored["only_missing"] != data.only_missing):
+        lock_file.close()
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                f"The checkpoint of this scope was made with targets={stored['targets']}, "
+                f"only_missing={stored['only_missing']}; repeat them or send resume=false"
+            ),
+        )
+
+    job = _submit(jobs, data, lock_file)
+    return {"job_id": job.id, "status": job.status.status}
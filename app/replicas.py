@@ -0,0 +1,202 @@
+"""
+Read/write splitting over FalkorDB read replicas
+
+Writes always go to the primary. Read-only routes ask graph_router for a
+reader client, which is bound to the same graph on the replica with the
+lowest recent latency (an exponentially weighted moving average of its
+query times). Reader drivers send GRAPH.RO_QUERY, so a replica can never be
+written to by mistake, and a replica that fails with a connection error is
+skipped for REPLICA_RETRY_SECONDS while its queries are retried on the
+primary.
+
+Replication is asynchronous, so a search right after an ingestion may miss
+what was just written. With READ_YOUR_WRITES_SECONDS > 0 every write marks
+its groups in the shared cache tier, and reads of a marked group stay on
+the primary until the mark expires - on every worker, not only the one that
+handled the write.
+"""
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from graphiti_core import Graphiti
+from graphiti_core.driver.falkordb_driver import FalkorDriver
+
+from .config import settings
+from .cache import query_cache
+
+logger = logging.getLogger(__name__)
+
+# Errors that say nothing about the query itself; anything else is re-raised
+_UNAVAILABLE = (RedisConnectionError, RedisTimeoutError, ConnectionError, TimeoutError, OSError)
+
+class Replica:
+    """One read replica and its observed latency."""
+
+    def __init__(self, host: str, port: int, password: Optional[str]):
+        from falkordb.asyncio import FalkorDB
+        self.name = f"{host}:{port}"
+        self.db = FalkorDB(host=host, port=port, password=password or None)
+        self.latency_ms: Optional[float] = None
+        self.queries = 0
+        self.errors = 0
+        self.down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def observe(self, elapsed_ms: float):
+        self.queries += 1
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            alpha = settings.REPLICA_LATENCY_EWMA_ALPHA
+            self.latency_ms += alpha * (elapsed_ms - self.latency_ms)
+
+    def failed(self, error: Exception):
+        self.errors += 1
+        self.down_until = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+        logger.warning(f"Read replica {self.name} unavailable, reading from the primary: {error}")
+
+    def snapshot(self) -> dict:
+        return {
+            "replica": self.name,
+            "available": self.available,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "queries": self.queries,
+            "errors": self.errors,
+        }
+
+class _ReadOnlyGraph:
+    """Graph handle that sends every query as GRAPH.RO_QUERY."""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getattr__(self, name: str):
+        return getattr(self._graph, name)
+
+    async def query(self, q: str, params: Optional[dict] = None, timeout: Optional[int] = None):
+        return await self._graph.ro_query(q, params, timeout=timeout)
+
+class ReplicaFalkorDriver(FalkorDriver):
+    """FalkorDriver bound to a graph on a replica, falling back to the primary's driver."""
+
+    def __init__(self, replica: Replica, primary: FalkorDriver, database: str):
+        self.replica = replica
+        self.primary = primary
+        super().__init__(falkor_db=replica.db, database=database)
+
+    def _get_graph(self, graph_name):
+        return _ReadOnlyGraph(super()._get_graph(graph_name))
+
+    def clone(self, database: str) -> "ReplicaFalkorDriver":
+        # graphiti clones the driver per group_id; keep the copy read-only with its fallback
+        if database == self._database:
+            return self
+        return ReplicaFalkorDriver(self.replica, self.primary.clone(database), database)
+
+    async def build_indices_and_constraints(self, delete_existing: bool = False):
+        # Replicas receive the primary's indexes through replication
+        return None
+
+    async def execute_query(self, cypher_query_, **kwargs):
+        if not self.replica.available:
+            return await self.primary.execute_query(cypher_query_, **kwargs)
+        started = time.perf_counter()
+        try:
+            result = await super().execute_query(cypher_query_, **kwargs)
+        except _UNAVAILABLE as e:
+            self.replica.failed(e)
+            return await self.primary.execute_query(cypher_query_, **kwargs)
+        self.replica.observe((time.perf_counter() - started) * 1000)
+        return result
+
+def parse_replicas(value: str) -> List[tuple]:
+    """(host, port) pairs from a comma-separated host[:port] list."""
+    replicas = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
+        replicas.append((host, int(port) if port else settings.FALKORDB_PORT))
+    return replicas
+
+class ReplicaPool:
+    """Least-latency choice among read replicas, with per-graph reader clients."""
+
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self._clients: Dict[tuple, Graphiti] = {}
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "pinned_reads": 0}
+
+    def configure(self):
+        password = settings.FALKORDB_REPLICA_PASSWORD or settings.FALKORDB_PASSWORD
+        self.replicas = []
+        self._clients.clear()
+        for host, port in parse_replicas(settings.FALKORDB_READ_REPLICAS):
+            # The FalkorDB client connects on construction
+            try:
+                self.replicas.append(Replica(host, port, password))
+            except Exception as e:
+                logger.warning(f"Read replica {host}:{port} unreachable at startup, not using it: {e}")
+        if self.replicas:
+            logger.info(f"Read replicas: {', '.join(r.name for r in self.replicas)}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[Replica]:
+        """Available replica with the lowest latency; unmeasured replicas are tried first."""
+        candidates = [r for r in self.replicas if r.available]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r.latency_ms is not None, r.latency_ms or 0.0))
+
+    def _client(self, replica: Replica, primary: Graphiti, graph: str) -> Graphiti:
+        key = (replica.name, graph)
+        client = self._clients.get(key)
+        if client is None:
+            client = Graphiti(
+                graph_driver=ReplicaFalkorDriver(replica, primary.driver, graph),
+                llm_client=primary.llm_client,
+                embedder=primary.embedder,
+                cross_encoder=primary.cross_encoder,
+            )
+            self._clients[key] = client
+        return client
+
+    async def reader(self, primary: Graphiti, graph: str, group_ids: Optional[Iterable[str]] = None) -> Graphiti:
+        """Client for reading graph, on a replica unless the groups were written to just now."""
+        if not self.enabled:
+            return primary
+        if group_ids and settings.READ_YOUR_WRITES_SECONDS > 0 and await query_cache.recently_written(group_ids):
+            self.stats["pinned_reads"] += 1
+            return primary
+        replica = self.choose()
+        if replica is None:
+            self.stats["primary_reads"] += 1
+            return primary
+        self.stats["replica_reads"] += 1
+        return self._client(replica, primary, graph)
+
+    async def close(self):
+        for replica in self.replicas:
+            try:
+                await replica.db.aclose()
+            except Exception as e:
+                logger.warning(f"Closing read replica {replica.name} failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {
+            "replicas": [replica.snapshot() for replica in self.replicas],
+            "read_your_writes_seconds": settings.READ_YOUR_WRITES_SECONDS,
+            **self.stats,
+        }
+
+replica_pool = ReplicaPool()
@@ -0,0 +1,122 @@
+"""
+Response encoding: fast JSON and compression
+
+FastJSONResponse serialises with orjson when it is installed and falls back
+to the standard JSONResponse otherwise. CompressionMiddleware compresses
+complete response bodies above a size threshold with zstd (when the
+zstandard package is installed and the client accepts it) or gzip. Streamed
+responses, such as job event streams, pass through untouched.
+"""
+import asyncio
+import gzip
+from typing import List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    FastJSONResponse = JSONResponse
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Bodies this large are compressed in a worker thread to keep the event loop free
+_OFFLOAD_BYTES = 256 * 1024
+
+def accepted_encodings(header: str) -> List[str]:
+    """Encodings from an Accept-Encoding header, without those refused with q=0."""
+    encodings = []
+    for item in header.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.append(name.lower())
+    return encodings
+
+class CompressionMiddleware:
+    """ASGI middleware compressing single-chunk responses with zstd or gzip."""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 5, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    def _choose(self, scope) -> Optional[str]:
+        header = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                header = value.decode("latin-1")
+                break
+        encodings = accepted_encodings(header)
+        if zstandard is not None and "zstd" in encodings:
+            return "zstd"
+        if "gzip" in encodings:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._choose(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = {key.lower(): value for key, value in start.get("headers", [])}
+            compressible = (
+                not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and b"content-encoding" not in headers
+                and not headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            )
+            passthrough = True
+            if not compressible:
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= _OFFLOAD_BYTES:
+                compressed = await asyncio.to_thread(self._compress, body, encoding)
+            else:
+                compressed = self._compress(body, encoding)
+            raw_headers = [
+                (key, value) for key, value in start.get("headers", [])
+                if key.lower() not in (b"content-length", b"vary")
+            ]
+            vary = headers.get(b"vary")
+            raw_headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": raw_headers})
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
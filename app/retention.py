@@ -0,0 +1,384 @@
+"""
+Retention policies and throttled compaction
+
+delete_fact and update_fact only set invalid_at, so invalidated facts and
+their embeddings stay in the graph forever. A retention policy says, per
+group, how long invalidated facts are kept (and whether they are deleted or
+archived to a JSONL file first) and how many episodes, or how old, a group
+may keep. Policies are persisted in JOB_STATE_DIR next to the tombstones;
+groups without their own policy use the RETENTION_* defaults.
+
+Compaction runs as a background job, in batches of COMPACTION_BATCH_SIZE with
+COMPACTION_PAUSE_SECONDS between them so the FalkorDB writer stays available
+to other tenants. Trimmed episodes are removed on their own: facts and
+entities extracted from them are kept.
+"""
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Literal, Optional
+
+from fastapi import Request, HTTPException
+from pydantic import BaseModel
+
+from .config import settings
+from .cache import invalidate_groups
+from .group_deletion import tombstones
+from .jobs import Job, JobManager, JobStatus
+from .sharding import graph_router, shard_registry
+from .episode_search import DELETE_CHUNKS_QUERY
+
+logger = logging.getLogger(__name__)
+
+class RetentionPolicy(BaseModel):
+    # Invalidated facts older than this are removed; None keeps them
+    invalidated_fact_days: Optional[float] = None
+    # archive: append the fact to RETENTION_ARCHIVE_DIR before deleting it
+    invalidated_fact_action: Literal["delete", "archive"] = "delete"
+    # Newest episodes kept per group; None keeps all
+    episode_max_count: Optional[int] = None
+    episode_max_age_days: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return any(
+            value is not None
+            for value in (self.invalidated_fact_days, self.episode_max_count, self.episode_max_age_days)
+        )
+
+def default_policy() -> RetentionPolicy:
+    """Policy of groups without their own, from the RETENTION_* settings (0 disables a rule)."""
+    return RetentionPolicy(
+        invalidated_fact_days=settings.RETENTION_INVALIDATED_FACT_DAYS or None,
+        invalidated_fact_action=settings.RETENTION_INVALIDATED_FACT_ACTION,
+        episode_max_count=settings.RETENTION_EPISODE_MAX_COUNT or None,
+        episode_max_age_days=settings.RETENTION_EPISODE_MAX_AGE_DAYS or None,
+    )
+
+class RetentionRegistry:
+    """Per-group retention policies, shared by all workers through JOB_STATE_DIR."""
+
+    def __init__(self):
+        self._policies: Dict[str, RetentionPolicy] = {}
+        self._path = os.path.join(settings.JOB_STATE_DIR, "retention_policies.json")
+        self._mtime: Optional[float] = None
+
+    def load(self):
+        try:
+            self._mtime = os.stat(self._path).st_mtime
+            with open(self._path) as f:
+                data = json.load(f)
+            self._policies = {group: RetentionPolicy.model_validate(policy) for group, policy in data.items()}
+        except FileNotFoundError:
+            self._mtime = None
+            self._policies = {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable retention policies {self._path}: {e}")
+
+    def _refresh(self):
+        """Pick up policies changed by other worker processes."""
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def _persist(self):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({group: policy.model_dump() for group, policy in sorted(self._policies.items())}, f)
+        os.replace(tmp_path, self._path)
+        self._mtime = os.stat(self._path).st_mtime
+
+    def get(self, group_id: str) -> RetentionPolicy:
+        self._refresh()
+        return self._policies.get(group_id) or default_policy()
+
+    def groups(self) -> List[str]:
+        self._refresh()
+        return sorted(self._policies)
+
+    def set(self, group_id: str, policy: RetentionPolicy):
+        self._refresh()
+        self._policies[group_id] = policy
+        self._persist()
+
+    def remove(self, group_id: str) -> bool:
+        self._refresh()
+        removed = self._policies.pop(group_id, None) is not None
+        if removed:
+            self._persist()
+        return removed
+
+    def snapshot(self) -> dict:
+        self._refresh()
+        return {
+            "default": default_policy().model_dump(),
+            "groups": {group: policy.model_dump() for group, policy in sorted(self._policies.items())},
+        }
+
+retention_policies = RetentionRegistry()
+
+# Each read returns at most $batch items; they are then deleted by uuid
+_EXPIRED_FACTS_QUERY = """
+    MATCH (a:Entity)-[e:RELATES_TO]->(b:Entity)
+    WHERE e.group_id = $group_id AND e.invalid_at IS NOT NULL AND e.invalid_at < $cutoff
+    RETURN e.uuid AS uuid, e.name AS name, e.fact AS fact, a.name AS source_name, b.name AS target_name,
+           e.episodes AS episodes, e.created_at AS created_at, e.valid_at AS valid_at,
+           e.invalid_at AS invalid_at, e.fact_embedding IS NOT NULL AS embedded
+    LIMIT $batch
+"""
+
+_DELETE_FACTS_QUERY = """
+    MATCH ()-[e:RELATES_TO]->()
+    WHERE e.uuid IN $uuids
+    DELETE e
+"""
+
+# Episodes beyond the newest $keep
+_EXCESS_EPISODES_QUERY = """
+    MATCH (e:Episodic)
+    WHERE e.group_id = $group_id
+    WITH e ORDER BY e.valid_at DESC
+    SKIP $keep LIMIT $batch
+    RETURN e.uuid AS uuid, size(e.content) AS content_bytes
+"""
+
+_OLD_EPISODES_QUERY = """
+    MATCH (e:Episodic)
+    WHERE e.group_id = $group_id AND e.valid_at < $cutoff
+    RETURN e.uuid AS uuid, size(e.content) AS content_bytes
+    LIMIT $batch
+"""
+
+_DELETE_EPISODES_QUERY = """
+    MATCH (e:Episodic)
+    WHERE e.uuid IN $uuids
+    DETACH DELETE e
+"""
+
+_GROUPS_QUERY = """
+    MATCH (n:Episodic) RETURN DISTINCT n.group_id AS group_id
+    UNION
+    MATCH (n:Entity) RETURN DISTINCT n.group_id AS group_id
+"""
+
+_ARCHIVE_NAME_UNSAFE = re.compile(r"[^A-Za-z0-9_\-]")
+
+def archive_path(group_id: str) -> str:
+    safe = _ARCHIVE_NAME_UNSAFE.sub("_", group_id)
+    if safe != group_id:
+        safe += "_" + hashlib.sha1(group_id.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(settings.RETENTION_ARCHIVE_DIR, f"{safe}.jsonl")
+
+def _append_archive(group_id: str, records: List[dict]):
+    path = archive_path(group_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    archived_at = datetime.now(timezone.utc).isoformat()
+    with open(path, "a") as f:
+        for record in records:
+            row = {key: value for key, value in record.items() if key != "embedded"}
+            f.write(json.dumps({**row, "group_id": group_id, "archived_at": archived_at}, default=str) + "\n")
+
+def _cutoff(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+async def _compact_facts(client, job: Job, group_id: str, policy: RetentionPolicy, report: dict):
+    batch = settings.COMPACTION_BATCH_SIZE
+    cutoff = _cutoff(policy.invalidated_fact_days)
+    while True:
+        records, _, _ = await client.driver.execute_query(
+            _EXPIRED_FACTS_QUERY, group_id=group_id, cutoff=cutoff, batch=batch
+        )
+        if not records:
+            return
+        if policy.invalidated_fact_action == "archive":
+            await asyncio.to_thread(_append_archive, group_id, records)
+            report["facts_archived"] += len(records)
+        await client.driver.execute_query(_DELETE_FACTS_QUERY, uuids=[r["uuid"] for r in records])
+        report["facts_deleted"] += len(records)
+        report["bytes_reclaimed"] += sum(
+            len((r["fact"] or "").encode("utf-8")) + (settings.EMBEDDING_DIM * 4 if r["embedded"] else 0)
+            for r in records
+        )
+        job.update(group_id=group_id, **report)
+        if len(records) < batch:
+            return
+        # Yield the writer to other tenants between batches
+        await asyncio.sleep(settings.COMPACTION_PAUSE_SECONDS)
+
+async def _trim_episodes(client, job: Job, group_id: str, query: str, report: dict, **params):
+    batch = settings.COMPACTION_BATCH_SIZE
+    while True:
+        records, _, _ = await client.driver.execute_query(query, group_id=group_id, batch=batch, **params)
+        if not records:
+            return
+        uuids = [r["uuid"] for r in records]
+        await client.driver.execute_query(_DELETE_EPISODES_QUERY, uuids=uuids)
+        await client.driver.execute_query(DELETE_CHUNKS_QUERY, uuids=uuids)
+        report["episodes_deleted"] += len(records)
+        report["bytes_reclaimed"] += sum(r["content_bytes"] or 0 for r in records)
+        job.update(group_id=group_id, **report)
+        if len(records) < batch:
+            return
+        await asyncio.sleep(settings.COMPACTION_PAUSE_SECONDS)
+
+async def compact_group(job: Job, group_id: str, report: dict) -> bool:
+    """Apply the group's retention policy; False when there was nothing to apply."""
+    policy = retention_policies.get(group_id)
+    if not policy.active or group_id in tombstones or shard_registry.is_migrating(group_id):
+        return False
+    client = await graph_router.for_group(group_id)
+    before = dict(report)
+    if policy.invalidated_fact_days is not None:
+        await _compact_facts(client, job, group_id, policy, report)
+    if policy.episode_max_count is not None:
+        await _trim_episodes(client, job, group_id, _EXCESS_EPISODES_QUERY, report, keep=policy.episode_max_count)
+    if policy.episode_max_age_days is not None:
+        await _trim_episodes(
+            client, job, group_id, _OLD_EPISODES_QUERY, report, cutoff=_cutoff(policy.episode_max_age_days)
+        )
+    if report != before:
+        await invalidate_groups(group_id)
+    return True
+
+async def _all_groups() -> List[str]:
+    async def fetch(client, _):
+        records, _, _ = await client.driver.execute_query(_GROUPS_QUERY)
+        return [r["group_id"] for r in records if r["group_id"]]
+    parts = await graph_router.fan_out(None, fetch)
+    return sorted({group for groups in parts for group in groups})
+
+async def run_compaction(job: Job, group_ids: Optional[List[str]]) -> dict:
+    """Compact the given groups, or every group with an active policy."""
+    if group_ids is None:
+        group_ids = await _all_groups() if default_policy().active else retention_policies.groups()
+    report = {"groups": 0, "facts_deleted": 0, "facts_archived": 0, "episodes_deleted": 0, "bytes_reclaimed": 0}
+    job.update(groups_total=len(group_ids), **report)
+    for group_id in group_ids:
+        if await compact_group(job, group_id, report):
+            report["groups"] += 1
+            job.update(**report)
+    logger.info(f"Compaction finished: {report}")
+    return report
+
+def _same_groups(a: Optional[List[str]], b: Optional[List[str]]) -> bool:
+    return (a is None and b is None) or (a is not None and b is not None and set(a) == set(b))
+
+def _running_compaction(jobs: JobManager, group_ids: Optional[List[str]]) -> Job:
+    """The compaction another worker runs, if it covers the same groups; 409 otherwise."""
+    try:
+        with open(os.path.join(settings.JOB_STATE_DIR, "compaction_running.json")) as f:
+            running = json.load(f)
+    except (FileNotFoundError, ValueError):
+        raise HTTPException(status_code=409, detail="A compaction job is already running")
+    if not _same_groups(running["group_ids"], group_ids):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Compaction job {running['job_id']} is already running for group_ids={running['group_ids']}",
+        )
+    # Its status file may not be written yet
+    return jobs.get(running["job_id"]) or Job("compaction", status=JobStatus(
+        id=running["job_id"],
+        kind="compaction",
+        status="running",
+        params={"group_ids": running["group_ids"]},
+        created_at=datetime.now(timezone.utc),
+    ))
+
+def submit_compaction(jobs: JobManager, group_ids: Optional[List[str]] = None) -> Job:
+    """Start a compaction job unless one runs in any worker; 409 if that one covers other groups."""
+    # The lock is held until the job ends, so compactions never overlap across workers
+    os.makedirs(settings.JOB_STATE_DIR, exist_ok=True)
+    lock_file = open(os.path.join(settings.JOB_STATE_DIR, "compaction_running.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return _running_compaction(jobs, group_ids)
+
+    job = jobs.submit(
+        "compaction",
+        lambda job: run_compaction(job, group_ids),
+        params={"group_ids": group_ids},
+    )
+    job.task.add_done_callback(lambda _: lock_file.close())
+    with open(os.path.join(settings.JOB_STATE_DIR, "compaction_running.json"), "w") as f:
+        json.dump({"job_id": job.id, "group_ids": group_ids}, f)
+    return job
+
+# Held for the lifetime of the worker that schedules compaction
+_schedule_lock_file = None
+
+async def _compaction_schedule(jobs: JobManager, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            submit_compaction(jobs)
+        except HTTPException as e:
+            logger.info(f"Scheduled compaction skipped: {e.detail}")
+        except Exception as e:
+            logger.error(f"Scheduled compaction failed to start: {e}", exc_info=True)
+
+def start_compaction_schedule(jobs: JobManager) -> Optional[asyncio.Task]:
+    """Run compaction every COMPACTION_INTERVAL_HOURS in exactly one worker."""
+    global _schedule_lock_file
+    retention_policies.load()
+    if settings.COMPACTION_INTERVAL_HOURS <= 0:
+        return None
+
+    os.makedirs(settings.JOB_STATE_DIR, exist_ok=True)
+    lock_file = open(os.path.join(settings.JOB_STATE_DIR, "compaction.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        logger.info("Another worker schedules compaction")
+        return None
+    _schedule_lock_file = lock_file
+    return asyncio.create_task(_compaction_schedule(jobs, settings.COMPACTION_INTERVAL_HOURS * 3600))
+
+# --- routes ---
+
+class CompactionRequest(BaseModel):
+    # None compacts every group with an active policy
+    group_ids: Optional[List[str]] = None
+
+async def get_retention_policies(request: Request) -> dict:
+    """
+    List per-group retention policies and the default policy
+    """
+    return retention_policies.snapshot()
+
+async def set_retention_policy(request: Request, group_id: str, policy: RetentionPolicy) -> dict:
+    """
+    Set the retention policy of a group
+    """
+    try:
+        retention_policies.set(group_id, policy)
+        return {"group_id": group_id, "policy": policy.model_dump()}
+    except Exception as e:
+        logger.error(f"Failed to set retention policy of {group_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def delete_retention_policy(request: Request, group_id: str) -> dict:
+    """
+    Remove a group's own policy so the default applies again
+    """
+    if not retention_policies.remove(group_id):
+        raise HTTPException(status_code=404, detail=f"No retention policy for group {group_id}")
+    return {"success": True, "group_id": group_id}
+
+async def start_compaction(request: Request, data: CompactionRequest) -> dict:
+    """
+    Start a compaction job, or return the one already running for the same groups
+    """
+    job = submit_compaction(request.app.state.jobs, data.group_ids)
+    return {"job_id": job.id, "status": job.status.status, "group_ids": job.status.params.get("group_ids")}
@@ -0,0 +1,90 @@
+"""
+Named graphiti search recipes
+
+client.search only returns facts ranked by a fixed hybrid configuration.
+graphiti's advanced search (search_) can also return entity nodes and lets
+each layer choose its retrieval methods and reranker; episodes are searched
+separately (see episode_search.py).
+A recipe names one such configuration; the request picks the layers it wants
+through per-layer limits (a layer with limit 0 is not searched at all) and
+may narrow the retrieval methods - a fulltext-only search never embeds the
+query.
+
+RRF and MMR scores are not on the cosine scale of min_score, so only the
+cross-encoder's relevance score is thresholded by graphiti itself; for the
+other recipes the caller filters results by cosine similarity instead.
+"""
+from typing import List, Literal, Optional
+
+from graphiti_core.search.search_config import (
+    EdgeReranker,
+    EdgeSearchConfig,
+    EdgeSearchMethod,
+    NodeReranker,
+    NodeSearchConfig,
+    NodeSearchMethod,
+    SearchConfig,
+)
+
+# rrf, mmr and fulltext never call the cross-encoder; node_distance is rrf
+# followed by the cached focal-node distance rerank (see focal.py)
+RecipeName = Literal["rrf", "mmr", "node_distance", "cross_encoder", "fulltext"]
+SearchMethodName = Literal["bm25", "vector", "bfs"]
+
+_RECIPE_METHODS = {
+    "rrf": ["bm25", "vector"],
+    "mmr": ["bm25", "vector"],
+    "node_distance": ["bm25", "vector"],
+    "cross_encoder": ["bm25", "vector", "bfs"],
+    "fulltext": ["bm25"],
+}
+
+_EDGE_METHODS = {
+    "bm25": EdgeSearchMethod.bm25,
+    "vector": EdgeSearchMethod.cosine_similarity,
+    "bfs": EdgeSearchMethod.bfs,
+}
+_NODE_METHODS = {
+    "bm25": NodeSearchMethod.bm25,
+    "vector": NodeSearchMethod.cosine_similarity,
+    "bfs": NodeSearchMethod.bfs,
+}
+
+def _reranker(recipe: str, rerankers):
+    if recipe == "mmr":
+        return rerankers.mmr
+    if recipe == "cross_encoder":
+        return rerankers.cross_encoder
+    return rerankers.rrf
+
+def reranker_filters(recipe: str) -> bool:
+    """Whether min_score can be passed to graphiti as the recipe's reranker_min_score."""
+    return recipe == "cross_encoder"
+
+def recipe_methods(recipe: str, methods: Optional[List[str]] = None) -> List[str]:
+    """Retrieval methods of a request: its own, or the recipe's."""
+    return methods or _RECIPE_METHODS[recipe]
+
+def build_config(
+    recipe: str,
+    edges: int,
+    nodes: int,
+    methods: Optional[List[str]] = None,
+    min_score: Optional[float] = None,
+) -> SearchConfig:
+    """SearchConfig for a recipe, searching only the layers with a positive limit."""
+    methods = recipe_methods(recipe, methods)
+    config = SearchConfig(limit=max(edges, nodes, 1))
+    if min_score is not None and reranker_filters(recipe):
+        config.reranker_min_score = min_score
+    if edges > 0:
+        config.edge_config = EdgeSearchConfig(
+            search_methods=[_EDGE_METHODS[m] for m in methods],
+            reranker=_reranker(recipe, EdgeReranker),
+        )
+    if nodes > 0:
+        config.node_config = NodeSearchConfig(
+            search_methods=[_NODE_METHODS[m] for m in methods],
+            reranker=_reranker(recipe, NodeReranker),
+        )
+    return config
@@ -0,0 +1,477 @@
+"""
+Per-tenant graph sharding in FalkorDB
+
+With GRAPH_SHARDING=none every group lives in the shared default graph and
+each query filters by group_id after matching a global label. With
+GRAPH_SHARDING=group each group gets its own named graph, with
+GRAPH_SHARDING=bucket groups are hashed into GRAPH_SHARD_BUCKETS graphs. All
+graphs share one FalkorDB connection, LLM client and embedder; only index
+sizes and write locks are split.
+
+Groups that already have data in the shared graph keep being served from it
+until a migration job (POST /admin/shards/migrate) copies them into
+their shard. Migration state is
+persisted in JOB_STATE_DIR and re-read when the file changes so every worker
+routes the same way.
+
+Routes get their client from graph_router instead of
+request.app.state.graphiti_client, which stays the shared-graph client.
+Read-only routes pass read=True to be served by a read replica when one is
+configured (see replicas.py).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import Request, HTTPException
+from pydantic import BaseModel
+
+from graphiti_core import Graphiti
+from graphiti_core.driver.falkordb_driver import FalkorDriver
+
+from .config import settings
+from .cache import invalidate_groups
+from .jobs import Job
+from .replicas import replica_pool
+
+logger = logging.getLogger(__name__)
+
+class ShardRegistry:
+    """Groups moved out of the shared graph, and groups currently being moved."""
+
+    def __init__(self):
+        self._state: Dict[str, Set[str]] = {"migrated": set(), "migrating": set()}
+        self._path = os.path.join(settings.JOB_STATE_DIR, "graph_shards.json")
+        self._mtime: Optional[float] = None
+
+    def load(self):
+        try:
+            self._mtime = os.stat(self._path).st_mtime
+            with open(self._path) as f:
+                data = json.load(f)
+            self._state = {key: set(data.get(key, [])) for key in ("migrated", "migrating")}
+        except FileNotFoundError:
+            self._mtime = None
+            self._state = {"migrated": set(), "migrating": set()}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable shard registry {self._path}: {e}")
+
+    def _refresh(self):
+        """Pick up migrations recorded by other worker processes."""
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.load()
+
+    def _persist(self):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp_path = f"{self._path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({key: sorted(groups) for key, groups in self._state.items()}, f)
+        os.replace(tmp_path, self._path)
+        self._mtime = os.stat(self._path).st_mtime
+
+    def is_migrated(self, group_id: str) -> bool:
+        self._refresh()
+        return group_id in self._state["migrated"]
+
+    def is_migrating(self, group_id: str) -> bool:
+        self._refresh()
+        return group_id in self._state["migrating"]
+
+    def snapshot(self) -> dict:
+        self._refresh()
+        return {key: sorted(groups) for key, groups in self._state.items()}
+
+    def start_migration(self, group_id: str):
+        self._refresh()
+        self._state["migrating"].add(group_id)
+        self._persist()
+
+    def finish_migration(self, group_id: str, migrated: bool):
+        self._refresh()
+        self._state["migrating"].discard(group_id)
+        if migrated:
+            self._state["migrated"].add(group_id)
+        self._persist()
+
+shard_registry = ShardRegistry()
+
+_GRAPH_NAME_UNSAFE = re.compile(r"[^A-Za-z0-9_\-]")
+
+_HAS_DATA_QUERY = """
+MATCH (n:Episodic)
+WHERE n.group_id = $group_id
+RETURN n.uuid AS uuid
+LIMIT 1
+"""
+
+class GraphRouter:
+    """Maps group_ids to the Graphiti client of the graph holding them."""
+
+    def __init__(self):
+        self.base: Optional[Graphiti] = None
+        self._clients: Dict[str, Graphiti] = {}
+        self._ready: Dict[str, asyncio.Task] = {}
+        # group_id -> True when its data still lives in the shared graph
+        self._legacy: Dict[str, bool] = {}
+
+    def configure(self, base: Graphiti):
+        self.base = base
+        self._clients.clear()
+        self._ready.clear()
+        self._legacy.clear()
+        shard_registry.load()
+
+    @property
+    def enabled(self) -> bool:
+        return settings.GRAPH_SHARDING != "none"
+
+    def graph_name(self, group_id: str) -> str:
+        """Name of the graph a group belongs to once sharded."""
+        if settings.GRAPH_SHARDING == "bucket":
+            digest = hashlib.sha1(group_id.encode("utf-8")).hexdigest()
+            bucket = int(digest, 16) % settings.GRAPH_SHARD_BUCKETS
+            return f"{settings.GRAPH_SHARD_PREFIX}b{bucket:03d}"
+        safe = _GRAPH_NAME_UNSAFE.sub("_", group_id)
+        if safe != group_id:
+            # Keep distinct group_ids in distinct graphs after sanitising
+            safe += "_" + hashlib.sha1(group_id.encode("utf-8")).hexdigest()[:8]
+        return f"{settings.GRAPH_SHARD_PREFIX}{safe}"
+
+    def _client(self, graph: str) -> Graphiti:
+        client = self._clients.get(graph)
+        if client is None:
+            driver = FalkorDriver(falkor_db=self.base.driver.client, database=graph)
+            client = Graphiti(
+                graph_driver=driver,
+                llm_client=self.base.llm_client,
+                embedder=self.base.embedder,
+                cross_encoder=self.base.cross_encoder,
+            )
+            self._clients[graph] = client
+        return client
+
+    async def shard_client(self, group_id: str) -> Graphiti:
+        """Client of the group's own shard, with indexes built on first use."""
+        graph = self.graph_name(group_id)
+        client = self._client(graph)
+        task = self._ready.get(graph)
+        if task is None:
+            task = self._ready[graph] = asyncio.ensure_future(client.build_indices_and_constraints())
+        try:
+            await asyncio.shield(task)
+        except Exception:
+            self._ready.pop(graph, None)
+            raise
+        return client
+
+    def forget(self, group_id: str):
+        """Re-check where a group lives after it was migrated or deleted."""
+        self._legacy.pop(group_id, None)
+
+    async def _is_legacy(self, group_id: str) -> bool:
+        """Whether the group has unmigrated data in the shared graph."""
+        legacy = self._legacy.get(group_id)
+        if legacy is None:
+            records, _, _ = await self.base.driver.execute_query(_HAS_DATA_QUERY, group_id=group_id)
+            legacy = self._legacy[group_id] = bool(records)
+        return legacy
+
+    async def _primary_for_group(self, group_id: Optional[str]) -> Graphiti:
+        if not self.enabled or not group_id:
+            return self.base
+        if shard_registry.is_migrated(group_id):
+            return await self.shard_client(group_id)
+        if shard_registry.is_migrating(group_id) or await self._is_legacy(group_id):
+            return self.base
+        return await self.shard_client(group_id)
+
+    async def for_group(self, group_id: Optional[str], read: bool = False) -> Graphiti:
+        client = await self._primary_for_group(group_id)
+        if read:
+            return await replica_pool.reader(client, graph_of(client), [group_id] if group_id else None)
+        return client
+
+    async def for_groups(self, group_ids: Optional[Iterable[str]], read: bool = False) -> List[Tuple[Graphiti, Optional[List[str]]]]:
+        """(client, group_ids) pairs covering the request; None group_ids means every graph."""
+        if not self.enabled:
+            targets = [(self.base, list(group_ids) if group_ids else None)]
+        elif not group_ids:
+            targets = [(client, None) for client in await self.all_clients()]
+        else:
+            clients = await asyncio.gather(*(self._primary_for_group(g) for g in group_ids))
+            by_graph: Dict[int, Tuple[Graphiti, List[str]]] = {}
+            for group_id, client in zip(group_ids, clients):
+                by_graph.setdefault(id(client), (client, []))[1].append(group_id)
+            targets = list(by_graph.values())
+        if not read:
+            return targets
+        readers = await asyncio.gather(
+            *(replica_pool.reader(client, graph_of(client), groups) for client, groups in targets)
+        )
+        return [(reader, groups) for reader, (_, groups) in zip(readers, targets)]
+
+    async def all_clients(self) -> List[Graphiti]:
+        """Shared graph plus every shard graph that exists in FalkorDB."""
+        if not self.enabled:
+            return [self.base]
+        try:
+            graphs = await self.base.driver.client.list_graphs()
+        except Exception as e:
+            logger.warning(f"Listing FalkorDB graphs failed, using known shards only: {e}")
+            graphs = list(self._clients)
+        graphs = [g.decode() if isinstance(g, bytes) else g for g in graphs]
+        return [self.base] + [self._client(g) for g in sorted(graphs) if g.startswith(settings.GRAPH_SHARD_PREFIX)]
+
+    async def fan_out(
+        self,
+        group_ids: Optional[Iterable[str]],
+        call: Callable[[Graphiti, Optional[List[str]]], Awaitable],
+        read: bool = False,
+    ) -> list:
+        """Run call concurrently on every graph the groups live in; returns the per-graph results."""
+        targets = await self.for_groups(group_ids, read=read)
+        if len(targets) == 1:
+            return [await call(*targets[0])]
+        return list(await asyncio.gather(*(call(client, groups) for client, groups in targets)))
+
+    async def locate(self, query: str, **params) -> Tuple[Graphiti, list]:
+        """First graph where query returns records, for operations addressed by uuid only."""
+        clients = await self.all_clients()
+        results = await asyncio.gather(*(client.driver.execute_query(query, **params) for client in clients))
+        for client, (records, _, _) in zip(clients, results):
+            if records:
+                return client, records
+        return self.base, []
+
+graph_router = GraphRouter()
+
+def graph_of(client: Graphiti) -> str:
+    """Name of the FalkorDB graph a client is bound to."""
+    return getattr(client.driver, "_database", "")
+
+def merge_ranked(result_lists: List[list], limit: int) -> list:
+    """
+    Merge per-graph search results into one ranking.
+
+    Results carrying a score are ordered by it; otherwise lists are
+    interleaved by rank, which keeps each graph's own ordering.
+    """
+    result_lists = [results for results in result_lists if results]
+    if len(result_lists) <= 1:
+        return (result_lists[0] if result_lists else [])[:limit]
+    merged = [
+        (rank, i, item) for i, results in enumerate(result_lists) for rank, item in enumerate(results)
+    ]
+    if all(getattr(item, "score", None) is not None for _, _, item in merged):
+        merged.sort(key=lambda entry: -entry[2].score)
+    else:
+        merged.sort(key=lambda entry: (entry[0], entry[1]))
+    return [item for _, _, item in merged[:limit]]
+
+def merge_scored(result_lists: List[List[tuple]], limit: int) -> List[tuple]:
+    """merge_ranked for (item, score) pairs, as graphiti's advanced search returns them."""
+    result_lists = [results for results in result_lists if results]
+    if len(result_lists) <= 1:
+        return (result_lists[0] if result_lists else [])[:limit]
+    merged = [
+        (rank, i, pair) for i, results in enumerate(result_lists) for rank, pair in enumerate(results)
+    ]
+    if all(pair[1] is not None for _, _, pair in merged):
+        merged.sort(key=lambda entry: -entry[2][1])
+    else:
+        merged.sort(key=lambda entry: (entry[0], entry[1]))
+    return [pair for _, _, pair in merged[:limit]]
+
+def ensure_group_writable(group_id: Optional[str]):
+    """Reject writes against a group that is being moved to its shard."""
+    if group_id is not None and shard_registry.is_migrating(group_id):
+        raise HTTPException(status_code=409, detail=f"Group {group_id} is being migrated, retry shortly")
+
+# --- migration from the shared graph ---
+
+_LABEL = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_BASE_LABELS = ("Entity", "Episodic", "Community", "EpisodeChunk")
+_EMBEDDING_PROPERTIES = ("name_embedding", "fact_embedding", "chunk_embedding")
+
+_READ_NODES_QUERY = """
+MATCH (n)
+WHERE n.group_id = $group_id AND n.uuid > $after
+RETURN n.uuid AS uuid, labels(n) AS labels, properties(n) AS props
+ORDER BY n.uuid
+LIMIT $batch
+"""
+
+_READ_EDGES_QUERY = """
+MATCH (a)-[r]->(b)
+WHERE r.group_id = $group_id AND r.uuid > $after
+RETURN r.uuid AS uuid, type(r) AS type, labels(a) AS source_labels, a.uuid AS source,
+       labels(b) AS target_labels, b.uuid AS target, properties(r) AS props
+ORDER BY r.uuid
+LIMIT $batch
+"""
+
+_COUNT_QUERY = """
+OPTIONAL MATCH (n) WHERE n.group_id = $group_id
+WITH count(n) AS nodes
+OPTIONAL MATCH ()-[r]->() WHERE r.group_id = $group_id
+RETURN nodes, count(r) AS edges
+"""
+
+def _base_label(labels: List[str]) -> str:
+    for label in _BASE_LABELS:
+        if label in labels:
+            return label
+    raise ValueError(f"Unexpected node labels {labels}")
+
+def _split_props(props: dict) -> Tuple[dict, dict]:
+    """Separate vector properties, which must be written with vecf32()."""
+    props = dict(props)
+    vectors = {key: props.pop(key) for key in _EMBEDDING_PROPERTIES if props.get(key) is not None}
+    return props, vectors
+
+def _vector_clause(alias: str, vectors: Iterable[str]) -> str:
+    return "".join(f" SET {alias}.{key} = vecf32(row.{key})" for key in sorted(vectors))
+
+async def _copy_nodes(source: Graphiti, target: Graphiti, group_id: str, batch: int, job: Job) -> int:
+    copied, after = 0, ""
+    while True:
+        records, _, _ = await source.driver.execute_query(
+            _READ_NODES_QUERY, group_id=group_id, after=after, batch=batch
+        )
+        if not records:
+            return copied
+        # One statement per label set and vector layout; labels cannot be parameters
+        statements: Dict[Tuple, List[dict]] = {}
+        for record in records:
+            labels = [label for label in record["labels"] if _LABEL.match(label)]
+            props, vectors = _split_props(record["props"])
+            extra = tuple(sorted(label for label in labels if label != _base_label(labels)))
+            statements.setdefault((_base_label(labels), extra, tuple(sorted(vectors))), []).append(
+                {"uuid": record["uuid"], "props": props, **vectors}
+            )
+        for (label, extra, vectors), rows in statements.items():
+            extra_labels = "".join(f" SET n:{name}" for name in extra)
+            await target.driver.execute_query(
+                f"UNWIND $rows AS row MERGE (n:{label} {{uuid: row.uuid}}) SET n += row.props"
+                f"{extra_labels}{_vector_clause('n', vectors)}",
+                rows=rows,
+            )
+        copied += len(records)
+        after = records[-1]["uuid"]
+        job.update(nodes_copied=copied)
+
+async def _copy_edges(source: Graphiti, target: Graphiti, group_id: str, batch: int, job: Job) -> int:
+    copied, after = 0, ""
+    while True:
+        records, _, _ = await source.driver.execute_query(
+            _READ_EDGES_QUERY, group_id=group_id, after=after, batch=batch
+        )
+        if not records:
+            return copied
+        statements: Dict[Tuple, List[dict]] = {}
+        for record in records:
+            if not _LABEL.match(record["type"]):
+                continue
+            props, vectors = _split_props(record["props"])
+            key = (
+                record["type"],
+                _base_label(record["source_labels"]),
+                _base_label(record["target_labels"]),
+                tuple(sorted(vectors)),
+            )
+            statements.setdefault(key, []).append(
+                {"uuid": record["uuid"], "source": record["source"], "target": record["target"], "props": props, **vectors}
+            )
+        for (rel_type, source_label, target_label, vectors), rows in statements.items():
+            await target.driver.execute_query(
+                f"UNWIND $rows AS row "
+                f"MATCH (a:{source_label} {{uuid: row.source}}) MATCH (b:{target_label} {{uuid: row.target}}) "
+                f"MERGE (a)-[r:{rel_type} {{uuid: row.uuid}}]->(b) SET r += row.props"
+                f"{_vector_clause('r', vectors)}",
+                rows=rows,
+            )
+        copied += len(records)
+        after = records[-1]["uuid"]
+        job.update(edges_copied=copied)
+
+async def run_group_migration(job: Job, group_id: str, delete_source: bool) -> dict:
+    """Copy a group from the shared graph into its shard, then cut over."""
+    source = graph_router.base
+    target = await graph_router.shard_client(group_id)
+    batch = settings.GRAPH_MIGRATION_BATCH_SIZE
+
+    shard_registry.start_migration(group_id)
+    migrated = False
+    try:
+        records, _, _ = await source.driver.execute_query(_COUNT_QUERY, group_id=group_id)
+        expected = dict(records[0]) if records else {"nodes": 0, "edges": 0}
+        job.update(graph=graph_router.graph_name(group_id), expected=expected)
+
+        nodes = await _copy_nodes(source, target, group_id, batch, job)
+        edges = await _copy_edges(source, target, group_id, batch, job)
+
+        records, _, _ = await target.driver.execute_query(_COUNT_QUERY, group_id=group_id)
+        copied = dict(records[0]) if records else {}
+        if copied.get("nodes", 0) < expected["nodes"] or copied.get("edges", 0) < expected["edges"]:
+            raise RuntimeError(f"Shard holds {copied} after copying, expected {expected}")
+        migrated = True
+    finally:
+        shard_registry.finish_migration(group_id, migrated)
+        graph_router.forget(group_id)
+
+    # Reads now go to the shard; drop responses computed from the shared graph
+    await invalidate_groups(group_id)
+    deleted = None
+    if delete_source:
+        from .group_deletion import delete_group_data
+        deleted = await delete_group_data(source, job, group_id)
+    logger.info(f"Group {group_id} migrated to {graph_router.graph_name(group_id)}: {nodes} nodes, {edges} edges")
+    return {"group_id": group_id, "graph": graph_router.graph_name(group_id), "nodes": nodes, "edges": edges, "source_deleted": deleted}
+
+class ShardMigrationRequest(BaseModel):
+    group_ids: List[str]
+    # Remove the group from the shared graph once the shard is verified
+    delete_source: bool = True
+
+async def start_shard_migration(request: Request, data: ShardMigrationRequest) -> dict:
+    """
+    Start background jobs moving groups from the shared graph into their shards
+    """
+    if not graph_router.enabled:
+        raise HTTPException(status_code=400, detail="GRAPH_SHARDING is disabled")
+    jobs = request.app.state.jobs
+    started = []
+    for group_id in data.group_ids:
+        if shard_registry.is_migrated(group_id):
+            started.append({"group_id": group_id, "status": "already_migrated"})
+            continue
+        job = jobs.submit(
+            "shard_migrate",
+            lambda job, group_id=group_id: run_group_migration(job, group_id, data.delete_source),
+            params={"group_id": group_id, "delete_source": data.delete_source},
+        )
+        started.append({"group_id": group_id, "job_id": job.id, "status": job.status.status})
+    return {"jobs": started}
+
+async def get_shard_status(request: Request) -> dict:
+    """
+    Report the sharding mode, shard graphs and migration state
+    """
+    try:
+        clients = await graph_router.all_clients()
+        return {
+            "mode": settings.GRAPH_SHARDING,
+            "graphs": [graph_of(client) for client in clients],
+            **shard_registry.snapshot(),
+        }
+    except Exception as e:
+        logger.error(f"Failed to read shard status: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,209 @@
+"""
+Materialized per-group memory summaries
+
+A summary lists a group's most connected entities together with their most
+recent valid facts - the stable profile that /get-memory would otherwise
+retrieve by search on every conversation turn. It is built with a single
+Cypher query the first time it is asked for and stored in the shared cache
+tier, tagged with the group version it reflects.
+
+After each ingestion the summary is refreshed incrementally: only the
+entities the new episode touched are re-read, merged into the stored ranking
+and the summary moves to the new version. Any other write (fact edits,
+deletions, compaction, a write from a worker that missed the summary) leaves
+it one version behind, and it is rebuilt on the next read. Groups nobody
+asked a summary for cost nothing at ingestion.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+
+from .config import settings
+from .cache import query_cache
+from .group_deletion import tombstones
+from .sharding import graph_router
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_KEY_PREFIX = "graphiti:summary:"
+
+# Entities ranked by the number of their valid facts, each with the most recent ones
+_ENTITIES_QUERY = """
+MATCH (n:Entity)-[e:RELATES_TO]-(:Entity)
+WHERE n.group_id = $group_id {uuid_filter}
+  AND e.expired_at IS NULL AND (e.invalid_at IS NULL OR e.invalid_at > $now)
+WITH n, e ORDER BY coalesce(e.valid_at, e.created_at) DESC
+WITH n, count(e) AS degree,
+     collect({{uuid: e.uuid, fact: e.fact, valid_at: e.valid_at, created_at: e.created_at}})[0..$facts] AS facts
+RETURN n.uuid AS uuid, n.name AS name, n.summary AS summary, degree, facts
+ORDER BY degree DESC
+LIMIT $limit
+"""
+
+class SummaryFact(BaseModel):
+    uuid: str
+    fact: str
+    valid_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+
+class SummaryEntity(BaseModel):
+    uuid: str
+    name: str
+    summary: Optional[str] = None
+    degree: int
+    facts: List[SummaryFact]
+
+class GroupSummary(BaseModel):
+    group_id: str
+    version: int
+    updated_at: datetime
+    entities: List[SummaryEntity]
+
+    def served(self) -> "GroupSummary":
+        """The summary without the reserve entities kept for incremental updates."""
+        return self.model_copy(update={"entities": self.entities[: settings.GROUP_SUMMARY_ENTITIES]})
+
+    def facts(self, limit: int) -> List[SummaryFact]:
+        """Facts of the top entities in ranking order, each once."""
+        seen = set()
+        facts = []
+        for entity in self.served().entities:
+            for fact in entity.facts:
+                if fact.uuid not in seen:
+                    seen.add(fact.uuid)
+                    facts.append(fact)
+        return facts[:limit]
+
+def _candidates() -> int:
+    # Entities beyond the served ones are kept so that one losing facts can be replaced
+    return settings.GROUP_SUMMARY_ENTITIES * 2
+
+def _entity(record: dict) -> SummaryEntity:
+    facts = [SummaryFact(**fact) for fact in record["facts"] if fact.get("uuid")]
+    return SummaryEntity(
+        uuid=record["uuid"],
+        name=record["name"] or "",
+        summary=record["summary"] or None,
+        degree=record["degree"],
+        facts=facts,
+    )
+
+async def _read_entities(group_id: str, uuids: Optional[List[str]] = None) -> List[SummaryEntity]:
+    # From the primary: the summary is tagged with a version a replica may not have reached
+    client = await graph_router.for_group(group_id)
+    query = _ENTITIES_QUERY.format(uuid_filter="AND n.uuid IN $uuids" if uuids is not None else "")
+    records, _, _ = await client.driver.execute_query(
+        query,
+        group_id=group_id,
+        uuids=uuids or [],
+        now=datetime.now(timezone.utc),
+        facts=settings.GROUP_SUMMARY_FACTS_PER_ENTITY,
+        limit=len(uuids) if uuids is not None else _candidates(),
+    )
+    return [_entity(record) for record in records]
+
+class SummaryStore:
+    """Summaries in the shared cache tier, with a decoded copy per worker."""
+
+    def __init__(self):
+        self._local: Dict[str, GroupSummary] = {}
+        self.stats = {"served": 0, "builds": 0, "incremental_updates": 0, "stale": 0}
+
+    async def load(self, group_id: str) -> Optional[GroupSummary]:
+        summary = self._local.get(group_id)
+        if query_cache.redis is None:
+            return summary
+        try:
+            raw = await query_cache.redis.get(SUMMARY_KEY_PREFIX + group_id)
+        except Exception as e:
+            logger.warning(f"Reading summary of group {group_id} failed: {e}")
+            return summary
+        if raw is None:
+            return None
+        stored = GroupSummary.model_validate(json.loads(raw))
+        if summary is None or stored.version != summary.version:
+            self._local[group_id] = stored
+        return self._local[group_id]
+
+    async def save(self, summary: GroupSummary):
+        self._local[summary.group_id] = summary
+        if len(self._local) > 10000:
+            self._local.clear()
+        if query_cache.redis is None:
+            return
+        try:
+            await query_cache.redis.set(
+                SUMMARY_KEY_PREFIX + summary.group_id,
+                summary.model_dump_json(),
+                ex=settings.GROUP_SUMMARY_TTL_SECONDS,
+            )
+        except Exception as e:
+            logger.warning(f"Storing summary of group {summary.group_id} failed: {e}")
+
+    async def get(self, group_id: str) -> GroupSummary:
+        """Summary reflecting the group's current version, rebuilt when it is behind."""
+        version = (await query_cache.group_versions([group_id]))[group_id]
+        summary = await self.load(group_id)
+        if summary is not None and summary.version == version:
+            self.stats["served"] += 1
+            return summary
+        if summary is not None:
+            self.stats["stale"] += 1
+        summary = GroupSummary(
+            group_id=group_id,
+            version=version,
+            updated_at=datetime.now(timezone.utc),
+            entities=await _read_entities(group_id),
+        )
+        self.stats["builds"] += 1
+        await self.save(summary)
+        return summary
+
+    async def apply(self, versions: Dict[str, int], group_id: Optional[str], edges: Iterable):
+        """
+        Fold an ingestion into the group's summary, if it has one.
+
+        versions are the counters returned by invalidate_groups for the
+        write; a summary that missed another write is left to be rebuilt.
+        """
+        version = versions.get(group_id)
+        if group_id is None or version is None:
+            return
+        try:
+            summary = await self.load(group_id)
+            if summary is None or summary.version != version - 1:
+                return
+            touched = {uuid for edge in edges for uuid in (edge.source_node_uuid, edge.target_node_uuid)}
+            fresh = await _read_entities(group_id, sorted(touched)) if touched else []
+            entities = {entity.uuid: entity for entity in summary.entities if entity.uuid not in touched}
+            entities.update((entity.uuid, entity) for entity in fresh)
+            ranked = sorted(entities.values(), key=lambda entity: entity.degree, reverse=True)
+            await self.save(GroupSummary(
+                group_id=group_id,
+                version=version,
+                updated_at=datetime.now(timezone.utc),
+                entities=ranked[: _candidates()],
+            ))
+            self.stats["incremental_updates"] += 1
+        except Exception as e:
+            # Never fails the write; the summary is rebuilt on its next read
+            logger.warning(f"Updating summary of group {group_id} failed: {e}")
+
+    def snapshot(self) -> dict:
+        return {"groups": len(self._local), **self.stats}
+
+group_summaries = SummaryStore()
+
+async def get_group_summary(request: Request, group_id: str) -> GroupSummary:
+    """Top entities of a group with their most recent valid facts."""
+    if group_id in tombstones:
+        raise HTTPException(status_code=404, detail=f"Group {group_id} not found")
+    try:
+        return (await group_summaries.get(group_id)).served()
+    except Exception as e:
+        logger.error(f"Failed to get summary of group {group_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
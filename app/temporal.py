@@ -0,0 +1,109 @@
+"""
+Temporal filters for fact search
+
+Facts carry a validity interval [valid_at, invalid_at); a missing bound is
+open. Search requests can restrict results to facts valid at a point in time
+(as_of), valid now (valid_only) or valid at some point within a range
+(valid_between). The filter is applied inside the graph query - as graphiti
+SearchFilters, a Cypher WHERE clause or a row mask on the in-process vector
+index - so top-k is taken among the facts that qualify, not cut down after.
+"""
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, model_validator
+
+from graphiti_core.search.search_filters import ComparisonOperator, DateFilter, SearchFilters
+
+# (start, end) of a validity window; a fact qualifies when its interval overlaps it
+Window = Tuple[Optional[datetime], Optional[datetime]]
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps without a zone are taken as UTC, the zone facts are stored in."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+class TemporalFilter(BaseModel):
+    """Validity constraints shared by the search request models."""
+    as_of: Optional[datetime] = None
+    valid_only: bool = False
+    valid_between: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None
+
+    @model_validator(mode="after")
+    def _check_range(self):
+        if self.valid_between:
+            start, end = (_utc(value) for value in self.valid_between)
+            if start and end and start > end:
+                raise ValueError("valid_between start must not be after its end")
+        return self
+
+    @property
+    def temporal(self) -> bool:
+        return bool(self.as_of or self.valid_only or self.valid_between)
+
+    def windows(self) -> List[Window]:
+        """Windows a fact's validity interval must overlap, all of them."""
+        windows = []
+        as_of = _utc(self.as_of) or (datetime.now(timezone.utc) if self.valid_only else None)
+        if as_of is not None:
+            windows.append((as_of, as_of))
+        if self.valid_between:
+            start, end = (_utc(value) for value in self.valid_between)
+            if start or end:
+                windows.append((start, end))
+        return windows
+
+def _and(left: Optional[List[List[DateFilter]]], right: List[List[DateFilter]]) -> List[List[DateFilter]]:
+    # SearchFilters date fields are an OR of AND-groups; AND distributes over it.
+    # Position j of every group belongs to the same window, which matters
+    # because graphiti names the query parameter after j alone.
+    if left is None:
+        return right
+    return [a + b for a in left for b in right]
+
+def search_filters(windows: List[Window]) -> Optional[SearchFilters]:
+    """graphiti SearchFilters keeping facts whose validity overlaps every window."""
+    if not windows:
+        return None
+    valid_at = invalid_at = None
+    for start, end in windows:
+        if end is not None:
+            valid_at = _and(valid_at, [
+                [DateFilter(date=end, comparison_operator=ComparisonOperator.less_than_equal)],
+                [DateFilter(comparison_operator=ComparisonOperator.is_null)],
+            ])
+        if start is not None:
+            invalid_at = _and(invalid_at, [
+                [DateFilter(date=start, comparison_operator=ComparisonOperator.greater_than)],
+                [DateFilter(comparison_operator=ComparisonOperator.is_null)],
+            ])
+    return SearchFilters(valid_at=valid_at, invalid_at=invalid_at)
+
+def cypher_condition(alias: str, windows: List[Window]) -> Tuple[str, dict]:
+    """WHERE condition on relationship alias and its parameters, '' when unfiltered."""
+    conditions = []
+    params = {}
+    for i, (start, end) in enumerate(windows):
+        if end is not None:
+            conditions.append(f"({alias}.valid_at IS NULL OR {alias}.valid_at <= $valid_end_{i})")
+            params[f"valid_end_{i}"] = end.isoformat()
+        if start is not None:
+            conditions.append(f"({alias}.invalid_at IS NULL OR {alias}.invalid_at > $valid_start_{i})")
+            params[f"valid_start_{i}"] = start.isoformat()
+    return " AND ".join(conditions), params
+
+def epoch(value, default: float) -> float:
+    """Seconds since the epoch of a stored timestamp (datetime or ISO string)."""
+    if value is None or value == "":
+        return default
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return default
+    if isinstance(value, datetime):
+        return _utc(value).timestamp()
+    return default
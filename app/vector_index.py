@@ -0,0 +1,577 @@
+"""
+In-process vector index for hot groups
+
+The busiest groups are searched over and over against the same few thousand
+facts. Once a group has been searched VECTOR_INDEX_MIN_SEARCHES times in a
+worker, its fact embeddings are loaded into a contiguous, L2-normalised NumPy
+matrix so similarity search becomes a single matmul with no FalkorDB
+round-trip. Groups are evicted least-recently-used under a memory budget.
+
+Each index remembers the group version (see cache.py) it reflects. Writes made
+through this API apply their changes incrementally when they are the only
+write since the index was built; any other write - from another worker or an
+operation that cannot be replayed, like episode removal - changes the version
+and the index is dropped and reloaded on the next search.
+
+The index ranks by cosine similarity only. /search_with_score is a cosine
+search anyway, but /search and /get-memory use graphiti's BM25 + vector
+hybrid with reciprocal rank fusion on cold groups, so they are answered from
+the index only with VECTOR_INDEX_REPLACE_HYBRID; otherwise a hot group ranks
+the same way as a cold one.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Set
+
+import numpy as np
+from pydantic import BaseModel
+
+from .config import settings
+from .cache import query_cache, EPOCH_VERSION
+from .sharding import graph_router
+from .temporal import Window, epoch
+
+logger = logging.getLogger(__name__)
+
+_LOAD_QUERY = """
+MATCH (n:Entity)-[e:RELATES_TO]->(m:Entity)
+WHERE e.group_id = $group_id AND e.fact_embedding IS NOT NULL
+RETURN e.uuid AS uuid, e.fact AS fact, e.fact_embedding AS embedding,
+       e.created_at AS created_at, e.valid_at AS valid_at, e.invalid_at AS invalid_at,
+       n.uuid AS source_node_uuid, m.uuid AS target_node_uuid,
+       n.name AS source_name, m.name AS target_name
+LIMIT $limit
+"""
+
+class FactHit(BaseModel):
+    """A fact returned from the in-process index, shaped like a graphiti EntityEdge."""
+    uuid: str
+    fact: str
+    group_id: Optional[str] = None
+    source_node_uuid: Optional[str] = None
+    target_node_uuid: Optional[str] = None
+    source_name: Optional[str] = None
+    target_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    valid_at: Optional[datetime] = None
+    invalid_at: Optional[datetime] = None
+    # None for facts read by a planner scan, which does not score similarity
+    score: Optional[float] = None
+
+VectorDType = Literal["float32", "float16", "int8"]
+
+# Rows scored per block when the matrix has to be widened to float32
+_SCORE_BLOCK_ROWS = 8192
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def quantize(matrix: np.ndarray, dtype: str) -> tuple:
+    """
+    Encode normalised float32 rows as dtype; returns (rows, per-row scales).
+
+    int8 uses symmetric per-row scaling, so a row is recovered as rows * scale.
+    """
+    if dtype != "int8":
+        return matrix.astype(dtype), np.ones(len(matrix), dtype=np.float32)
+    peaks = np.abs(matrix).max(axis=-1)
+    scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+    rows = np.round(matrix / scales[:, None]).astype(np.int8)
+    return rows, scales
+
+def similarities(rows: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine similarity of stored rows against a normalised float32 query."""
+    if rows.dtype == np.float32:
+        return rows @ query
+    # float16/int8 matmul has no BLAS path; widen bounded blocks instead
+    out = np.empty(len(rows), dtype=np.float32)
+    for start in range(0, len(rows), _SCORE_BLOCK_ROWS):
+        block = rows[start : start + _SCORE_BLOCK_ROWS].astype(np.float32)
+        out[start : start + len(block)] = block @ query
+    return out * scales
+
+class GroupIndex:
+    """Fact embeddings of one group as a row-normalised matrix plus parallel metadata."""
+
+    def __init__(self, group_id: str, dim: int, dtype: str, version: int, capacity: int = 64):
+        self.group_id = group_id
+        self.dim = dim
+        self.dtype = dtype
+        self.version = version
+        self.vectors = np.zeros((max(capacity, 1), dim), dtype=dtype)
+        self.scales = np.ones(max(capacity, 1), dtype=np.float32)
+        # Validity interval of each row in epoch seconds, open bounds as infinities
+        self.valid_from = np.full(max(capacity, 1), -np.inf)
+        self.valid_to = np.full(max(capacity, 1), np.inf)
+        self.size = 0
+        self.uuids: List[str] = []
+        self.meta: List[dict] = []
+        self.rows: Dict[str, int] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + (self.scales.nbytes if self.quantized else 0)
+
+    @property
+    def quantized(self) -> bool:
+        """Whether scores are approximate and worth rescoring."""
+        return self.dtype != "float32"
+
+    def load(self, uuids: List[str], matrix: np.ndarray, meta: List[dict]):
+        self.vectors, self.scales = quantize(normalize(matrix), self.dtype)
+        self.size = len(uuids)
+        self.uuids = list(uuids)
+        self.meta = list(meta)
+        self.rows = {uuid: i for i, uuid in enumerate(self.uuids)}
+        self.valid_from = np.asarray([epoch(m.get("valid_at"), -np.inf) for m in self.meta] or [-np.inf])
+        self.valid_to = np.asarray([epoch(m.get("invalid_at"), np.inf) for m in self.meta] or [np.inf])
+
+    def _set_validity(self, row: int):
+        self.valid_from[row] = epoch(self.meta[row].get("valid_at"), -np.inf)
+        self.valid_to[row] = epoch(self.meta[row].get("invalid_at"), np.inf)
+
+    def upsert(self, uuid: str, embedding: List[float], meta: dict):
+        if len(embedding) != self.dim:
+            return
+        vector, scale = quantize(normalize(np.asarray([embedding], dtype=np.float32)), self.dtype)
+        row = self.rows.get(uuid)
+        if row is None:
+            if self.size == len(self.vectors):
+                grown = np.zeros((len(self.vectors) * 2, self.dim), dtype=self.vectors.dtype)
+                grown[: self.size] = self.vectors[: self.size]
+                self.vectors = grown
+                self.scales = np.concatenate([self.scales, np.ones(len(self.scales), dtype=np.float32)])
+                self.valid_from = np.concatenate([self.valid_from, np.full(len(self.valid_from), -np.inf)])
+                self.valid_to = np.concatenate([self.valid_to, np.full(len(self.valid_to), np.inf)])
+            row = self.size
+            self.size += 1
+            self.uuids.append(uuid)
+            self.meta.append(meta)
+            self.rows[uuid] = row
+        else:
+            self.meta[row] = {**self.meta[row], **meta}
+        self.vectors[row] = vector[0]
+        self.scales[row] = scale[0]
+        self._set_validity(row)
+
+    def update(self, uuid: str, **fields: Any):
+        row = self.rows.get(uuid)
+        if row is not None:
+            self.meta[row] = {**self.meta[row], **fields}
+            self._set_validity(row)
+
+    def remove(self, uuid: str):
+        row = self.rows.pop(uuid, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            # Move the last row into the hole to keep the matrix contiguous
+            self.vectors[row] = self.vectors[last]
+            self.scales[row] = self.scales[last]
+            self.valid_from[row] = self.valid_from[last]
+            self.valid_to[row] = self.valid_to[last]
+            self.uuids[row] = self.uuids[last]
+            self.meta[row] = self.meta[last]
+            self.rows[self.uuids[row]] = row
+        self.uuids.pop()
+        self.meta.pop()
+        self.size = last
+
+    def valid_mask(self, windows: List[Window]) -> Optional[np.ndarray]:
+        """Rows whose validity interval overlaps every window, None when unfiltered."""
+        if not windows:
+            return None
+        mask = np.ones(self.size, dtype=bool)
+        for start, end in windows:
+            if end is not None:
+                mask &= self.valid_from[: self.size] <= end.timestamp()
+            if start is not None:
+                mask &= self.valid_to[: self.size] > start.timestamp()
+        return mask
+
+    def top_k(
+        self, query: np.ndarray, k: int, windows: Optional[List[Window]] = None, min_score: Optional[float] = None
+    ) -> List[tuple]:
+        """(score, row) pairs of the k most similar facts, among those valid in windows and above min_score."""
+        if self.size == 0:
+            return []
+        scores = similarities(self.vectors[: self.size], self.scales[: self.size], query)
+        mask = self.valid_mask(windows)
+        if min_score is not None:
+            # min_score is on the (cosine + 1) / 2 scale
+            above = scores >= 2 * min_score - 1
+            mask = above if mask is None else mask & above
+        if mask is not None:
+            # Excluded rows can never enter the top k
+            k = min(k, int(mask.sum()))
+            if k == 0:
+                return []
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, self.size)
+        rows = np.argpartition(-scores, k - 1)[:k]
+        # Same scale as FalkorDB's (2 - cosineDistance) / 2
+        return [(float(scores[row] + 1) / 2, int(row)) for row in rows]
+
+    def vector(self, uuid: str) -> Optional[np.ndarray]:
+        """Normalised float32 embedding of a fact, approximate when quantized."""
+        row = self.rows.get(uuid)
+        if row is None:
+            return None
+        return self.vectors[row].astype(np.float32) * self.scales[row]
+
+    def hit(self, row: int, score: float) -> FactHit:
+        return FactHit(uuid=self.uuids[row], group_id=self.group_id, score=score, **self.meta[row])
+
+class VectorIndexManager:
+    """Per-worker registry of hot group indexes with LRU eviction."""
+
+    def __init__(self):
+        self.groups: "OrderedDict[str, GroupIndex]" = OrderedDict()
+        self.memory_budget = int(settings.VECTOR_INDEX_MEMORY_MB * 1024 * 1024)
+        self.stats = {"hits": 0, "fallbacks": 0, "loads": 0, "evictions": 0, "stale": 0, "incremental_updates": 0}
+        self._searches: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._too_large: Set[str] = set()
+        self._epoch: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.VECTOR_INDEX_ENABLED
+
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in self.groups.values())
+
+    def drop(self, group_id: str):
+        self.groups.pop(group_id, None)
+
+    def clear(self):
+        self.groups.clear()
+        self._too_large.clear()
+
+    async def lookup(self, group_ids: Iterable[str]) -> Optional[List[GroupIndex]]:
+        """Current indexes of all groups, or None when any of them must go to FalkorDB."""
+        group_ids = list(group_ids)
+        versions = await query_cache.group_versions(group_ids)
+        if versions.get(EPOCH_VERSION) != self._epoch:
+            # A cache flush (e.g. after re-embedding) invalidates every index
+            self.clear()
+            self._epoch = versions.get(EPOCH_VERSION)
+
+        indexes = []
+        for group_id in group_ids:
+            index = self.groups.get(group_id)
+            if index is not None and index.version != versions.get(group_id):
+                self.stats["stale"] += 1
+                self.drop(group_id)
+                # Still hot: reload right away instead of counting searches again
+                self._start_load(group_id)
+                continue
+            if index is None:
+                self._note_search(group_id)
+                continue
+            self.groups.move_to_end(group_id)
+            indexes.append(index)
+
+        if len(indexes) < len(group_ids):
+            self.stats["fallbacks"] += 1
+            return None
+        self.stats["hits"] += 1
+        return indexes
+
+    def search(
+        self,
+        indexes: List[GroupIndex],
+        query_vector: List[float],
+        k: int,
+        windows: Optional[List[Window]] = None,
+        min_score: Optional[float] = None,
+    ) -> Optional[List[FactHit]]:
+        """Top-k facts across the given indexes by cosine similarity."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        if any(index.dim != len(query) for index in indexes):
+            return None
+        query = normalize(query)
+        candidates = []
+        for index in indexes:
+            candidates += [(score, row, index) for score, row in index.top_k(query, k, windows, min_score)]
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        return [index.hit(row, score) for score, row, index in candidates[:k]]
+
+    def _note_search(self, group_id: str):
+        if group_id in self._loading or group_id in self._too_large:
+            return
+        count = self._searches.get(group_id, 0) + 1
+        if count < settings.VECTOR_INDEX_MIN_SEARCHES:
+            if len(self._searches) > 10000:
+                self._searches.clear()
+            self._searches[group_id] = count
+            return
+        self._searches.pop(group_id, None)
+        self._start_load(group_id)
+
+    def _start_load(self, group_id: str):
+        if group_id in self._loading:
+            return
+        task = asyncio.create_task(self._load(group_id))
+        self._loading[group_id] = task
+        task.add_done_callback(lambda _: self._loading.pop(group_id, None))
+
+    async def _load(self, group_id: str):
+        try:
+            # Read the version first: writes landing during the load make it stale, never lost
+            version = (await query_cache.group_versions([group_id]))[group_id]
+            limit = settings.VECTOR_INDEX_MAX_GROUP_FACTS
+            # From the primary: a lagging replica would pin missing facts to this version
+            client = await graph_router.for_group(group_id)
+            records, _, _ = await client.driver.execute_query(
+                _LOAD_QUERY, group_id=group_id, limit=limit + 1
+            )
+            if len(records) > limit:
+                self._too_large.add(group_id)
+                logger.info(f"Group {group_id} has more than {limit} facts, not indexing in-process")
+                return
+            index = await asyncio.to_thread(self._build, group_id, version, records)
+            if index.nbytes > self.memory_budget:
+                self._too_large.add(group_id)
+                return
+            self.groups[group_id] = index
+            self.stats["loads"] += 1
+            while self.nbytes() > self.memory_budget and len(self.groups) > 1:
+                evicted, _ = self.groups.popitem(last=False)
+                self.stats["evictions"] += 1
+                logger.info(f"Evicted vector index of group {evicted}")
+            logger.info(f"Loaded vector index for group {group_id}: {index.size} facts, {index.nbytes} bytes")
+        except Exception as e:
+            logger.warning(f"Loading vector index for group {group_id} failed: {e}")
+
+    @staticmethod
+    def _build(group_id: str, version: int, records: List[dict]) -> GroupIndex:
+        dim = settings.EMBEDDING_DIM
+        # Rows embedded with another model/dimension cannot be compared
+        records = [r for r in records if r["embedding"] is not None and len(r["embedding"]) == dim]
+        index = GroupIndex(group_id, dim, settings.VECTOR_INDEX_DTYPE, version, capacity=len(records))
+        if records:
+            matrix = np.asarray([r["embedding"] for r in records], dtype=np.float32)
+            meta = [
+                {
+                    "fact": r["fact"],
+                    "source_node_uuid": r["source_node_uuid"],
+                    "target_node_uuid": r["target_node_uuid"],
+                    "source_name": r["source_name"],
+                    "target_name": r["target_name"],
+                    "created_at": r["created_at"],
+                    "valid_at": r["valid_at"],
+                    "invalid_at": r["invalid_at"],
+                }
+                for r in records
+            ]
+            index.load([r["uuid"] for r in records], matrix, meta)
+        return index
+
+    def apply(self, versions: Dict[str, int], group_id: Optional[str], update: Callable[[GroupIndex], None]):
+        """
+        Replay a write made by this worker on a loaded index.
+
+        versions are the counters returned by invalidate_groups for the write;
+        if anything else was written in between the index is dropped instead.
+        """
+        index = self.groups.get(group_id)
+        if index is None:
+            return
+        version = versions.get(group_id)
+        if version is None or version != index.version + 1:
+            self.drop(group_id)
+            return
+        update(index)
+        index.version = version
+        self.stats["incremental_updates"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "groups": {group_id: index.size for group_id, index in self.groups.items()},
+            "bytes": self.nbytes(),
+            "memory_budget_bytes": self.memory_budget,
+            "dtype": settings.VECTOR_INDEX_DTYPE,
+            "loading": sorted(self._loading),
+            **self.stats,
+        }
+
+vector_index = VectorIndexManager()
+
+def _edge_meta(edge, names: Dict[str, str]) -> dict:
+    meta = {
+        "fact": edge.fact,
+        "source_node_uuid": edge.source_node_uuid,
+        "target_node_uuid": edge.target_node_uuid,
+        "created_at": edge.created_at,
+        "valid_at": edge.valid_at,
+        "invalid_at": edge.invalid_at,
+    }
+    # Keep the names already indexed when the write did not return the nodes
+    if edge.source_node_uuid in names:
+        meta["source_name"] = names[edge.source_node_uuid]
+    if edge.target_node_uuid in names:
+        meta["target_name"] = names[edge.target_node_uuid]
+    return meta
+
+def index_edges(
+    versions: Dict[str, int],
+    group_id: Optional[str],
+    edges: list,
+    names: Optional[Dict[str, str]] = None,
+    invalidated: Optional[Dict[str, str]] = None,
+):
+    """
+    Add or refresh facts produced by a write in the group's index.
+
+    names maps entity uuids to names; invalidated maps fact uuids the write
+    invalidated to their new invalid_at.
+    """
+    names = names or {}
+
+    def update(index: GroupIndex):
+        for uuid, invalid_at in (invalidated or {}).items():
+            index.update(uuid, invalid_at=invalid_at)
+        for edge in edges:
+            if getattr(edge, "fact_embedding", None) is not None:
+                index.upsert(edge.uuid, edge.fact_embedding, _edge_meta(edge, names))
+            else:
+                index.update(edge.uuid, **_edge_meta(edge, names))
+
+    vector_index.apply(versions, group_id, update)
+
+async def search_hot_groups(
+    client,
+    query: str,
+    group_ids: Optional[List[str]],
+    num_results: int,
+    windows: Optional[List[Window]] = None,
+    min_score: Optional[float] = None,
+    replaces_hybrid: bool = False,
+) -> Optional[List[FactHit]]:
+    """
+    Answer a similarity search from memory when every requested group is hot.
+
+    replaces_hybrid marks callers whose cold path is graphiti's hybrid search;
+    they are served only with VECTOR_INDEX_REPLACE_HYBRID.
+    """
+    if not vector_index.enabled or not group_ids:
+        return None
+    if replaces_hybrid and not settings.VECTOR_INDEX_REPLACE_HYBRID:
+        return None
+    indexes = await vector_index.lookup(group_ids)
+    if indexes is None:
+        return None
+    query_vector = await client.embedder.create(input_data=[query])
+    if not settings.VECTOR_INDEX_RESCORE or not any(index.quantized for index in indexes):
+        return vector_index.search(indexes, query_vector, num_results, windows, min_score)
+    # Oversample from the compact matrix, then rank the shortlist exactly;
+    # approximate scores are not trusted with the threshold
+    candidates = vector_index.search(
+        indexes, query_vector, num_results * settings.VECTOR_INDEX_RESCORE_OVERSAMPLE, windows
+    )
+    if not candidates:
+        return candidates
+    hits = await rescore(candidates, query_vector, num_results)
+    if min_score is not None:
+        hits = [hit for hit in hits if hit.score >= min_score]
+    return hits
+
+_RESCORE_QUERY = """
+MATCH ()-[e:RELATES_TO]->()
+WHERE e.uuid IN $uuids
+RETURN e.uuid AS uuid, e.fact_embedding AS embedding
+"""
+
+async def fetch_fact_embeddings(uuids: List[str], group_ids: Optional[List[str]]) -> Dict[str, List[float]]:
+    """Full-precision embeddings of facts from FalkorDB, searched in the graphs of group_ids."""
+    async def fetch(client, graph_group_ids):
+        records, _, _ = await client.driver.execute_query(_RESCORE_QUERY, uuids=uuids)
+        return records
+    parts = await graph_router.fan_out(group_ids, fetch, read=True)
+    return {r["uuid"]: r["embedding"] for records in parts for r in records if r["embedding"] is not None}
+
+async def fact_vectors(results: List, group_ids: Optional[List[str]]) -> Dict[str, np.ndarray]:
+    """
+    Normalised embeddings of search results: carried by the result, held in a
+    hot group's index, or read from FalkorDB for the rest in one query per graph.
+    """
+    vectors = {}
+    for result in results:
+        uuid = str(result.uuid)
+        embedding = getattr(result, "fact_embedding", None)
+        if embedding is not None:
+            vectors[uuid] = normalize(np.asarray(embedding, dtype=np.float32))
+            continue
+        index = vector_index.groups.get(getattr(result, "group_id", None))
+        vector = index.vector(uuid) if index is not None else None
+        if vector is not None:
+            vectors[uuid] = vector
+    missing = [str(result.uuid) for result in results if str(result.uuid) not in vectors]
+    if missing:
+        fetched = await fetch_fact_embeddings(missing, group_ids)
+        vectors.update((uuid, normalize(np.asarray(e, dtype=np.float32))) for uuid, e in fetched.items())
+    return vectors
+
+_NODE_EMBEDDINGS_QUERY = """
+MATCH (n:Entity)
+WHERE n.uuid IN $uuids
+RETURN n.uuid AS uuid, n.name_embedding AS embedding
+"""
+
+async def node_vectors(results: List, group_ids: Optional[List[str]]) -> Dict[str, np.ndarray]:
+    """Normalised name embeddings of entity results, read from FalkorDB in one query per graph."""
+    uuids = [str(result.uuid) for result in results]
+
+    async def fetch(client, graph_group_ids):
+        records, _, _ = await client.driver.execute_query(_NODE_EMBEDDINGS_QUERY, uuids=uuids)
+        return records
+    parts = await graph_router.fan_out(group_ids, fetch, read=True)
+    return {
+        r["uuid"]: normalize(np.asarray(r["embedding"], dtype=np.float32))
+        for records in parts for r in records if r["embedding"] is not None
+    }
+
+def cosine_scorer(embedder, query: str, group_ids: Optional[List[str]]) -> Callable:
+    """
+    Async scorer mapping facts (or entities, with layer="nodes") to {uuid: score},
+    their cosine similarity to the query on the (cosine + 1) / 2 scale used by
+    the index and /search_with_score. The query is embedded once, on the first call.
+    """
+    query_vector = None
+
+    async def score(results: List, layer: Literal["edges", "nodes"] = "edges") -> Dict[str, float]:
+        nonlocal query_vector
+        if not results:
+            return {}
+        if query_vector is None:
+            query_vector = normalize(np.asarray(await embedder.create(input_data=[query]), dtype=np.float32))
+        if layer == "nodes":
+            vectors = await node_vectors(results, group_ids)
+        else:
+            vectors = await fact_vectors(results, group_ids)
+        return {
+            uuid: float(vector @ query_vector + 1) / 2
+            for uuid, vector in vectors.items() if len(vector) == len(query_vector)
+        }
+    return score
+
+async def rescore(candidates: List[FactHit], query_vector: List[float], k: int) -> List[FactHit]:
+    """Re-rank quantized candidates with their full-precision embeddings from FalkorDB."""
+    exact = await fetch_fact_embeddings(
+        [hit.uuid for hit in candidates], sorted({hit.group_id for hit in candidates})
+    )
+    query = normalize(np.asarray(query_vector, dtype=np.float32))
+    for hit in candidates:
+        embedding = exact.get(hit.uuid)
+        if embedding is not None and len(embedding) == len(query):
+            vector = normalize(np.asarray(embedding, dtype=np.float32))
+            hit.score = float(vector @ query + 1) / 2
+    candidates.sort(key=lambda hit: hit.score, reverse=True)
+    return candidates[:k]
@@ -0,0 +1,90 @@
+"""
+Per-worker lifecycle: startup prewarm and process metrics
+
+Under gunicorn every worker runs its own FastAPI lifespan and therefore its
+own Graphiti client. Prewarm opens the FalkorDB connection, makes sure the
+indexes exist and waits for them to finish building before the lifespan
+yields, so a worker only starts taking requests once it can serve them fast.
+"""
+import asyncio
+import logging
+import os
+import resource
+import time
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class WorkerInfo:
+    """Startup timing and memory of the current worker process."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self._started_monotonic = time.monotonic()
+        self.startup_seconds = None
+        self.prewarm_seconds = None
+
+    def mark_ready(self):
+        self.startup_seconds = round(time.monotonic() - self._started_monotonic, 3)
+
+    @staticmethod
+    def rss_bytes() -> int:
+        """Current resident set size; falls back to peak RSS off Linux."""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def stats(self) -> dict:
+        return {
+            "pid": self.pid,
+            "startup_seconds": self.startup_seconds,
+            "prewarm_seconds": self.prewarm_seconds,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "rss_bytes": self.rss_bytes(),
+        }
+
+    def prometheus_lines(self) -> list:
+        label = f'{{pid="{self.pid}"}}'
+        lines = [
+            "# HELP graphiti_worker_startup_seconds Time from worker start until it was ready",
+            "# TYPE graphiti_worker_startup_seconds gauge",
+            f"graphiti_worker_startup_seconds{label} {self.startup_seconds or 0}",
+            "# HELP graphiti_worker_rss_bytes Resident memory of the worker process",
+            "# TYPE graphiti_worker_rss_bytes gauge",
+            f"graphiti_worker_rss_bytes{label} {self.rss_bytes()}",
+        ]
+        return lines
+
+async def prewarm(client, health, worker: WorkerInfo):
+    """Open connections and load indexes before the worker reports ready."""
+    started = time.monotonic()
+
+    falkordb = await health.check_falkordb()
+    if not falkordb["ok"]:
+        logger.warning(f"Prewarm: FalkorDB not reachable yet: {falkordb.get('error')}")
+
+    if settings.PREWARM_BUILD_INDICES:
+        try:
+            await client.build_indices_and_constraints()
+        except Exception as e:
+            logger.warning(f"Prewarm: building indices failed: {e}")
+
+        # Wait for indexes still under construction, bounded by the timeout
+        deadline = time.monotonic() + settings.PREWARM_INDEX_TIMEOUT_SECONDS
+        while True:
+            indexes = await health.check_indexes()
+            if indexes.get("ok") or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.5)
+        if not indexes.get("ok"):
+            logger.warning(f"Prewarm: indexes not operational yet: {indexes.get('building') or indexes.get('error')}")
+
+    if settings.PREWARM_EMBEDDER:
+        await health.check_embedder(force=True)
+
+    worker.prewarm_seconds = round(time.monotonic() - started, 3)
+    logger.info(f"Worker {worker.pid} prewarmed in {worker.prewarm_seconds}s")
@@ -0,0 +1,37 @@
+# Production serving mode: gunicorn managing uvicorn workers
+#
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# Every worker runs its own FastAPI lifespan (Graphiti client, prewarm,
+# drain on shutdown). uvicorn picks uvloop and httptools automatically when
+# they are installed (uvicorn[standard]).
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The app must not be imported in the master: each worker needs its own
+# event loop and FalkorDB connection
+preload_app = False
+
+# Ingestion requests run LLM extraction and can take a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Must exceed SHUTDOWN_DRAIN_TIMEOUT_SECONDS so in-flight episodes can finish
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+def post_fork(server, worker):
+    server.log.info(f"Worker spawned (pid: {worker.pid})")
+
+def worker_exit(server, worker):
+    server.log.info(f"Worker exited (pid: {worker.pid})")
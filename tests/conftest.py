@@ -0,0 +1,4 @@
+import os
+
+# app.config requires an API key; unit tests never call OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
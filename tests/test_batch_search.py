@@ -0,0 +1,54 @@
+"""Unit tests for shared query embedding in batch search"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import graphiti_logic
+from app.cache import CachingEmbedder
+from app.config import settings
+from app.graphiti_logic import BatchSearchRequest, SearchRequest, SearchResponse, batch_search_logic
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.single_calls = 0
+        self.batch_calls = 0
+
+    async def create(self, input_data):
+        self.single_calls += 1
+        return [float(len(input_data[0])), 1.0]
+
+    async def create_batch(self, input_data_list):
+        self.batch_calls += 1
+        return [[float(len(text)), 1.0] for text in input_data_list]
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    async def fake_search(client, search):
+        # graphiti embeds the query with newlines flattened
+        vector = await client.embedder.create(input_data=[search.query.replace("\n", " ")])
+        assert vector == [float(len(search.query)), 1.0]
+        return SearchResponse(episodes=[], edges=[])
+    monkeypatch.setattr(graphiti_logic, "search_logic", fake_search)
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+    return CountingEmbedder()
+
+
+def test_batch_embeds_all_queries_in_one_call_without_cache(embedder):
+    client = SimpleNamespace(embedder=CachingEmbedder(embedder))
+    batch = BatchSearchRequest(searches=[SearchRequest(query=q) for q in ["coffee", "tea\nor milk", "coffee"]])
+
+    response = asyncio.run(batch_search_logic(client, batch))
+
+    assert [result.error for result in response.results] == [None, None, None]
+    assert (embedder.batch_calls, embedder.single_calls) == (1, 0)
+
+
+def test_single_searches_still_embed_outside_a_batch(embedder):
+    client = SimpleNamespace(embedder=CachingEmbedder(embedder))
+
+    asyncio.run(client.embedder.create(input_data=["coffee"]))
+
+    assert (embedder.batch_calls, embedder.single_calls) == (0, 1)
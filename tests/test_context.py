@@ -0,0 +1,68 @@
+"""Unit tests for token-budgeted context packing"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.context import estimate_tokens, fact_line, pack_facts, render_context
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def context_settings(monkeypatch):
+    monkeypatch.setattr(settings, "CONTEXT_CHARS_PER_TOKEN", 4.0)
+    monkeypatch.setattr(settings, "CONTEXT_RECENCY_WEIGHT", 0.0)
+    monkeypatch.setattr(settings, "CONTEXT_INVALID_PENALTY", 0.5)
+
+
+def fact(text, score=None, valid_at=None, invalid_at=None):
+    return SimpleNamespace(
+        fact=text, relevance_score=score, valid_at=valid_at, created_at=valid_at, invalid_at=invalid_at
+    )
+
+
+def test_without_budget_every_fact_is_kept_best_first():
+    facts = [fact("low", 0.2), fact("high", 0.9), fact("mid", 0.5)]
+
+    packed, used = pack_facts(facts, None)
+
+    assert [f.fact for f in packed] == ["high", "mid", "low"]
+    assert used == sum(estimate_tokens(fact_line(f)) + 1 for f in facts)
+
+
+def test_too_long_fact_is_skipped_for_shorter_ones():
+    long_fact = fact("x" * 40, 0.9)  # "- " + 40 chars = 11 tokens + 1
+    short_facts = [fact("abcdef", 0.5), fact("ghijkl", 0.4)]  # 2 tokens + 1 each
+
+    packed, used = pack_facts([long_fact, *short_facts], token_budget=8)
+
+    assert packed == short_facts
+    assert used == 6
+
+
+def test_facts_no_longer_valid_are_penalised():
+    invalidated = fact("moved to Paris", 0.8, valid_at=NOW - timedelta(days=10), invalid_at=NOW - timedelta(days=1))
+    current = fact("lives in Berlin", 0.6, valid_at=NOW - timedelta(days=1))
+
+    packed, _ = pack_facts([invalidated, current], None)
+
+    assert packed == [current, invalidated]
+
+
+def test_unscored_facts_rank_by_position():
+    facts = [fact("first"), fact("second"), fact("third")]
+
+    packed, _ = pack_facts(facts, None)
+
+    assert packed == facts
+
+
+def test_render_context_lines_carry_validity():
+    start = datetime(2025, 1, 2, tzinfo=timezone.utc)
+    end = datetime(2025, 3, 4, tzinfo=timezone.utc)
+
+    context = render_context([fact("a"), fact("b", valid_at=start), fact("c", valid_at=start, invalid_at=end)])
+
+    assert context == "- a\n- b (since 2025-01-02)\n- c (2025-01-02 - 2025-03-04)"
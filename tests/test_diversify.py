@@ -0,0 +1,57 @@
+"""Unit tests for MMR selection and near-duplicate collapsing"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.diversify import mmr_select
+
+
+def fact(uuid, text, score=None):
+    return SimpleNamespace(uuid=uuid, fact=text, score=score)
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_near_duplicates_collapse_into_the_picked_fact():
+    results = [
+        fact("a", "User likes coffee", 0.9),
+        fact("b", "The user enjoys coffee", 0.8),
+        fact("c", "User lives in Berlin", 0.7),
+    ]
+    vectors = {"a": unit(1, 0), "b": unit(1, 0.05), "c": unit(0, 1)}
+
+    selected = mmr_select(results, vectors, k=2, mmr_lambda=0.7, dedup_threshold=0.92)
+
+    assert [(r.uuid, dups) for r, dups in selected] == [("a", ["b"]), ("c", [])]
+
+
+def test_lower_lambda_prefers_dissimilar_facts():
+    results = [fact("a", "A", 1.0), fact("b", "B", 0.9), fact("c", "C", 0.6)]
+    # b is similar to a but below the dedup threshold, c is unrelated
+    vectors = {"a": unit(1, 0), "b": unit(0.8, 0.6), "c": unit(0, 1)}
+
+    by_relevance = mmr_select(results, vectors, k=2, mmr_lambda=1.0, dedup_threshold=0.99)
+    diverse = mmr_select(results, vectors, k=2, mmr_lambda=0.5, dedup_threshold=0.99)
+
+    assert [r.uuid for r, _ in by_relevance] == ["a", "b"]
+    assert [r.uuid for r, _ in diverse] == ["a", "c"]
+
+
+def test_identical_text_collapses_without_embeddings():
+    results = [fact("a", "User likes coffee"), fact("b", "  user likes COFFEE "), fact("c", "User has a dog")]
+
+    selected = mmr_select(results, {}, k=3, mmr_lambda=0.7, dedup_threshold=0.92)
+
+    assert [(r.uuid, dups) for r, dups in selected] == [("a", ["b"]), ("c", [])]
+
+
+def test_unscored_results_keep_search_order():
+    results = [fact(uuid, uuid) for uuid in "abcd"]
+    vectors = {uuid: unit(i, 1) for i, uuid in enumerate("abcd")}
+
+    selected = mmr_select(results, vectors, k=3, mmr_lambda=1.0, dedup_threshold=1.0)
+
+    assert [r.uuid for r, _ in selected] == ["a", "b", "c"]
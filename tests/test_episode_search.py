@@ -0,0 +1,44 @@
+"""Unit tests for episode chunking and fulltext terms"""
+from app.episode_search import chunk_spans, chunk_text, fulltext_terms
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("  hello world \n", size=100, overlap=10) == ["hello world"]
+
+
+def test_blank_text_has_no_chunks():
+    assert chunk_text(" \n\t ", size=100, overlap=10) == []
+
+
+def test_chunks_split_at_whitespace_and_overlap():
+    text = " ".join(f"word{i:02d}" for i in range(20))  # 20 words of 6 characters
+
+    chunks = chunk_text(text, size=30, overlap=10)
+
+    assert chunks == [
+        "word00 word01 word02 word03",
+        "word03 word04 word05 word06",
+        "word06 word07 word08 word09",
+        "word09 word10 word11 word12",
+        "word12 word13 word14 word15",
+        "word15 word16 word17 word18",
+        "word18 word19",
+    ]
+    assert all(len(chunk) <= 30 for chunk in chunks)
+
+
+def test_text_without_spaces_is_cut_at_size():
+    assert chunk_text("a" * 25, size=10, overlap=3) == ["a" * 10, "a" * 10, "a" * 10, "a" * 4]
+
+
+def test_spans_are_offsets_into_the_original_text():
+    text = "\n  alpha beta gamma delta epsilon zeta eta theta  "
+
+    spans = chunk_spans(text, size=16, overlap=5)
+
+    assert [text[start:end] for start, end in spans] == chunk_text(text, size=16, overlap=5)
+    assert spans[0][0] == text.index("alpha")
+
+
+def test_fulltext_terms_are_unique_words_joined_by_or():
+    assert fulltext_terms('Where did "Alice" say: alice, Bob?') == "where | did | alice | say | bob"
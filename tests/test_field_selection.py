@@ -0,0 +1,36 @@
+"""Unit tests for ?fields= selection and Accept-Encoding parsing"""
+import pytest
+from fastapi import HTTPException
+
+from app.crud_routes import select_fields
+from app.responses import accepted_encodings
+
+AVAILABLE = {"uuid": "n.uuid", "name": "n.name", "summary": "n.summary"}
+
+
+def test_all_fields_when_none_requested():
+    assert select_fields(None, AVAILABLE) == ["uuid", "name", "summary"]
+    assert select_fields("", AVAILABLE) == ["uuid", "name", "summary"]
+
+
+def test_requested_fields_keep_order_without_repeats():
+    assert select_fields(" name, uuid,,name ", AVAILABLE) == ["name", "uuid"]
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        select_fields("uuid,embedding", AVAILABLE)
+    assert error.value.status_code == 400
+    assert "embedding" in error.value.detail
+
+
+def test_encodings_refused_with_zero_quality_are_dropped():
+    assert accepted_encodings("gzip;q=0.5, zstd;q=0, br") == ["gzip", "br"]
+
+
+def test_encodings_are_lowercased_and_bad_quality_refuses():
+    assert accepted_encodings("GZip, deflate;q=abc, ZSTD ; q=1.0") == ["gzip", "zstd"]
+
+
+def test_empty_header_accepts_nothing():
+    assert accepted_encodings("") == []
@@ -0,0 +1,179 @@
+"""Unit tests for focal-node distance maps and reranking"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import focal as focal_module
+from app.config import settings
+from app.focal import DistanceMap, FocalDistanceCache, rerank_by_distance
+
+
+def fact(uuid, source, target):
+    return SimpleNamespace(uuid=uuid, fact=uuid, source_node_uuid=source, target_node_uuid=target)
+
+
+def entity(uuid):
+    return SimpleNamespace(uuid=uuid, name=uuid)
+
+
+def distances(complete=True, **hops):
+    return DistanceMap("g", 1, {"focal": 0, **hops}, complete)
+
+
+def test_facts_are_ordered_by_their_nearer_entity():
+    distance_map = distances(a=1, b=2)
+    results = [fact("far", "b", "x"), fact("near", "x", "a"), fact("own", "focal", "b")]
+
+    assert [r.uuid for r in rerank_by_distance(results, distance_map, 10)] == ["own", "near", "far"]
+
+
+def test_entities_are_ordered_by_their_own_distance():
+    results = [entity("b"), entity("focal"), entity("a")]
+
+    reranked = rerank_by_distance(results, distances(a=1, b=2), 10)
+
+    assert [r.uuid for r in reranked] == ["focal", "a", "b"]
+
+
+def test_search_order_is_kept_within_a_distance():
+    results = [fact("first", "a", "x"), fact("second", "x", "a"), fact("third", "a", "a")]
+
+    assert [r.uuid for r in rerank_by_distance(results, distances(a=1), 10)] == ["first", "second", "third"]
+
+
+def test_unreachable_results_go_last_in_search_order():
+    results = [fact("lost1", "x", "y"), fact("close", "a", "x"), fact("lost2", "y", None), entity("z")]
+
+    reranked = rerank_by_distance(results, distances(a=1), 10)
+
+    assert [r.uuid for r in reranked] == ["close", "lost1", "lost2", "z"]
+
+
+def test_rerank_cuts_to_limit_after_ordering():
+    results = [fact("far", "b", "b"), fact("near", "a", "a"), fact("focal", "focal", "x")]
+
+    assert [r.uuid for r in rerank_by_distance(results, distances(a=1, b=2), 2)] == ["focal", "near"]
+
+
+def test_shortens_only_within_depth(monkeypatch):
+    monkeypatch.setattr(settings, "FOCAL_DISTANCE_MAX_DEPTH", 2)
+    distance_map = distances(a=1, b=2, c=2)
+
+    assert distance_map.shortens("a", "new")
+    assert distance_map.shortens("focal", "b")
+    # Neighbouring hops already: no distance changes
+    assert distance_map.shortens("a", "c") is False
+    # b is at the depth limit: nothing beyond it is mapped anyway
+    assert distance_map.shortens("b", "new") is False
+    assert distance_map.shortens("x", "y") is False
+
+
+class FakeGraph:
+    """Undirected adjacency answering the BFS neighbour query, honouring its LIMIT."""
+
+    def __init__(self, edges):
+        self.adjacency = {}
+        for a, b in edges:
+            self.adjacency.setdefault(a, []).append(b)
+            self.adjacency.setdefault(b, []).append(a)
+        self.queries = 0
+        self.driver = self
+
+    async def for_group(self, group_id, read=False):
+        return self
+
+    async def execute_query(self, query, frontier, limit):
+        self.queries += 1
+        seen = []
+        for node in frontier:
+            for neighbor in self.adjacency.get(node, []):
+                if neighbor not in seen:
+                    seen.append(neighbor)
+        return [{"uuid": uuid} for uuid in seen[:limit]], None, None
+
+
+class FakeCache:
+    def __init__(self):
+        self.versions = {"g": 1}
+
+    async def group_versions(self, group_ids):
+        return {group_id: self.versions[group_id] for group_id in group_ids}
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    # focal - a - b - c, focal - d, plus leaves around d
+    graph = FakeGraph([("focal", "a"), ("a", "b"), ("b", "c"), ("focal", "d"), ("d", "e"), ("d", "f")])
+    cache = FakeCache()
+
+    async def entity_group(uuid):
+        return "g" if uuid in graph.adjacency else None
+    monkeypatch.setattr(focal_module, "graph_router", graph)
+    monkeypatch.setattr(focal_module, "query_cache", cache)
+    monkeypatch.setattr(focal_module, "entity_group", entity_group)
+    monkeypatch.setattr(settings, "FOCAL_DISTANCE_MAX_DEPTH", 2)
+    monkeypatch.setattr(settings, "FOCAL_DISTANCE_MAX_NODES", 5000)
+    graph.cache = cache
+    return graph
+
+
+def test_bfs_maps_distances_up_to_the_depth(graph):
+    found, complete = asyncio.run(focal_module._bfs("focal", "g"))
+
+    assert found == {"focal": 0, "a": 1, "d": 1, "b": 2, "e": 2, "f": 2}
+    assert complete
+
+
+def test_max_nodes_cuts_the_bfs_short(graph, monkeypatch):
+    monkeypatch.setattr(settings, "FOCAL_DISTANCE_MAX_NODES", 4)
+
+    found, complete = asyncio.run(focal_module._bfs("focal", "g"))
+
+    assert len(found) == 4
+    assert {"focal": 0, "a": 1, "d": 1}.items() <= found.items()
+    assert not complete
+
+
+def test_max_nodes_reached_by_the_first_hop(graph, monkeypatch):
+    monkeypatch.setattr(settings, "FOCAL_DISTANCE_MAX_NODES", 2)
+
+    found, complete = asyncio.run(focal_module._bfs("focal", "g"))
+
+    assert found == {"focal": 0, "a": 1}
+    assert not complete
+    assert graph.queries == 1
+
+
+def test_map_is_reused_until_the_group_changes(graph):
+    cache = FocalDistanceCache()
+
+    first = asyncio.run(cache.get("focal"))
+    assert asyncio.run(cache.get("focal")) is first
+    graph.cache.versions["g"] = 2
+    second = asyncio.run(cache.get("focal"))
+
+    assert second is not first and second.version == 2
+    assert cache.stats["computed"] == 2 and cache.stats["hits"] == 1
+    assert asyncio.run(cache.get("nowhere")) is None
+
+
+def test_own_write_keeps_the_map_unless_it_shortens_a_path(graph):
+    cache = FocalDistanceCache()
+    distance_map = asyncio.run(cache.get("focal"))
+
+    cache.apply({"g": 2}, "g", [SimpleNamespace(source_node_uuid="e", target_node_uuid="f")])
+    assert cache.lru.get("focal") is distance_map and distance_map.version == 2
+
+    cache.apply({"g": 3}, "g", [SimpleNamespace(source_node_uuid="focal", target_node_uuid="b")])
+    assert cache.lru.get("focal") is None
+
+
+def test_incomplete_map_is_dropped_on_any_write(graph, monkeypatch):
+    monkeypatch.setattr(settings, "FOCAL_DISTANCE_MAX_NODES", 2)
+    cache = FocalDistanceCache()
+    asyncio.run(cache.get("focal"))
+
+    cache.apply({"g": 2}, "g", [SimpleNamespace(source_node_uuid="x", target_node_uuid="y")])
+
+    assert cache.lru.get("focal") is None
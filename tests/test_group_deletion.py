@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Test asynchronous group deletion with FalkorDB"""
+
+import httpx
+import asyncio
+
+API_URL = "http://localhost:8001"
+GROUP_ID = "test-group-deletion"
+
+async def test_group_deletion():
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        print("=== Testing group deletion ===\n")
+
+        # 1. Add a couple of episodes to the group
+        print("1. Adding episodes...")
+        for content in [
+            "Maria manages the Berlin office of Globex.",
+            "Maria hired two new data scientists in March.",
+        ]:
+            response = await client.post(f"{API_URL}/add_episode", json={
+                "name": "Group deletion episode",
+                "content": content,
+                "source_description": "Test source",
+                "group_id": GROUP_ID
+            })
+            if response.status_code != 200:
+                print(f"❌ Failed to add episode: {response.text}")
+                return
+        print("✅ Episodes added")
+
+        # 2. Start deletion
+        print("\n2. Deleting group...")
+        response = await client.delete(f"{API_URL}/groups/{GROUP_ID}")
+        if response.status_code != 202:
+            print(f"❌ Delete failed: {response.text}")
+            return
+        job_id = response.json()["job_id"]
+        print(f"✅ Deletion job started: {job_id}")
+
+        # 3. Data must be invisible right away, even while the job runs
+        print("\n3. Searching immediately after tombstoning...")
+        response = await client.post(f"{API_URL}/search", json={
+            "query": "Maria",
+            "group_ids": [GROUP_ID]
+        })
+        edges = response.json().get("edges", [])
+        if not edges:
+            print("✅ Group is invisible to search")
+        else:
+            print(f"⚠️ Found {len(edges)} edges for a tombstoned group")
+
+        # 4. Writes into the group are rejected until deletion finishes
+        response = await client.post(f"{API_URL}/add_episode", json={
+            "name": "Late episode",
+            "content": "Maria moved to Munich.",
+            "source_description": "Test source",
+            "group_id": GROUP_ID
+        })
+        print(f"Write during deletion: {response.status_code}")
+
+        # 5. Wait for the job to finish
+        print("\n4. Waiting for deletion job...")
+        for _ in range(60):
+            status = (await client.get(f"{API_URL}/jobs/{job_id}")).json()
+            print(f"   {status['status']}: {status['progress'].get('deleted')}")
+            if status["status"] in ("completed", "failed", "cancelled"):
+                break
+            await asyncio.sleep(1)
+
+        response = await client.get(f"{API_URL}/nodes", params={"group_id": GROUP_ID})
+        print(f"Nodes left: {response.json()['count']}")
+        response = await client.get(f"{API_URL}/facts", params={"group_id": GROUP_ID})
+        print(f"Facts left: {response.json()['count']}")
+
+if __name__ == "__main__":
+    asyncio.run(test_group_deletion())
@@ -0,0 +1,164 @@
+"""Unit tests for retrieval planning: strategy choice and the small-group scan"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import planner as planner_module
+from app.config import settings
+from app.planner import RetrievalPlanner
+
+NOW = datetime.now(timezone.utc)
+
+
+class FakeCache:
+    def __init__(self):
+        self.versions = {}
+
+    async def group_versions(self, group_ids):
+        return {group_id: self.versions.get(group_id, 0) for group_id in group_ids}
+
+
+class FakeDriver:
+    def __init__(self, graph):
+        self.graph = graph
+
+    async def execute_query(self, query, **params):
+        if "count(e) AS facts" in query:
+            self.graph.stats_reads += 1
+            record = {"entities": len(self.graph.names), "facts": len(self.graph.facts), "last_write": None}
+            return [record], None, None
+        if "toLower(n.name)" in query:
+            return [{"name": name.lower()} for name in self.graph.names], None, None
+        return self.graph.facts[: params["limit"]], None, None
+
+
+class FakeGraph:
+    """One graph answering the planner's statistics, names and scan queries."""
+
+    def __init__(self):
+        self.facts = []
+        self.names = []
+        self.stats_reads = 0
+        self.driver = FakeDriver(self)
+
+    def add_facts(self, *texts):
+        for text in texts:
+            created = NOW + timedelta(seconds=len(self.facts))
+            self.facts.append({
+                "uuid": f"f{len(self.facts)}", "fact": text, "group_id": "g",
+                "source_node_uuid": "a", "target_node_uuid": "b", "source_name": "A", "target_name": "B",
+                "created_at": created, "valid_at": created, "invalid_at": None,
+            })
+
+    async def for_group(self, group_id, read=False):
+        return self
+
+    async def fan_out(self, group_ids, call, read=False):
+        return [await call(self, group_ids)]
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    graph = FakeGraph()
+    monkeypatch.setattr(planner_module, "graph_router", graph)
+    monkeypatch.setattr(planner_module, "query_cache", FakeCache())
+    monkeypatch.setattr(settings, "PLANNER_ENABLED", True)
+    monkeypatch.setattr(settings, "PLANNER_SCAN_MAX_FACTS", 30)
+    monkeypatch.setattr(settings, "PLANNER_STATS_MAX_AGE_SECONDS", 60)
+    monkeypatch.setattr(settings, "PLANNER_MAX_CACHED_NAMES", 5000)
+    return graph
+
+
+def choose(planner, query, limit=10, **kwargs):
+    return asyncio.run(planner.choose(query, ["g"], limit, **kwargs))
+
+
+def test_scan_only_when_the_whole_group_fits_the_response(graph):
+    graph.add_facts(*[f"fact {i}" for i in range(8)])
+    planner = RetrievalPlanner()
+
+    assert choose(planner, "coffee", limit=10).strategy == "scan"
+    assert choose(planner, "coffee", limit=5).strategy == "hybrid"
+
+
+def test_scan_is_capped_by_the_setting(graph, monkeypatch):
+    graph.add_facts(*[f"fact {i}" for i in range(8)])
+    monkeypatch.setattr(settings, "PLANNER_SCAN_MAX_FACTS", 5)
+
+    assert choose(RetrievalPlanner(), "coffee", limit=50).strategy == "hybrid"
+
+
+def test_min_score_always_plans_hybrid(graph):
+    graph.add_facts("User likes coffee")
+
+    assert choose(RetrievalPlanner(), "coffee", min_score=0.5).strategy == "hybrid"
+
+
+def test_stale_stats_are_reread_before_a_scan(graph):
+    planner = RetrievalPlanner()
+    assert choose(planner, "coffee").facts == 0
+
+    # A write bumps the group version; the cached "0 facts" must not pick a scan
+    graph.add_facts(*[f"fact {i}" for i in range(12)])
+    planner_module.query_cache.versions["g"] = 1
+    plan = choose(planner, "coffee")
+
+    assert (plan.strategy, plan.facts) == ("hybrid", 12)
+    assert graph.stats_reads == 2
+
+
+def test_recent_stats_are_reused_for_hybrid_plans(graph):
+    graph.add_facts(*[f"fact {i}" for i in range(40)])
+    planner = RetrievalPlanner()
+    choose(planner, "coffee")
+
+    planner_module.query_cache.versions["g"] = 1
+    assert choose(planner, "coffee").strategy == "hybrid"
+    assert graph.stats_reads == 1
+
+
+def test_current_stats_are_not_reread(graph):
+    graph.add_facts("User likes coffee")
+    planner = RetrievalPlanner()
+    choose(planner, "coffee")
+    choose(planner, "coffee")
+
+    assert graph.stats_reads == 1
+
+
+def test_quoted_query_plans_keyword(graph):
+    graph.add_facts(*[f"fact {i}" for i in range(40)])
+
+    plan = choose(RetrievalPlanner(), '"Project Apollo"')
+
+    assert (plan.strategy, plan.reason) == ("keyword", "quoted query")
+
+
+def test_entity_name_plans_keyword(graph):
+    graph.add_facts(*[f"fact {i}" for i in range(40)])
+    graph.names = ["Alice Smith", "Berlin"]
+    planner = RetrievalPlanner()
+
+    assert choose(planner, "  alice smith ").strategy == "keyword"
+    assert choose(planner, "alice smith berlin").strategy == "hybrid"
+    assert choose(planner, "Berlin", allow_keyword=False).strategy == "hybrid"
+
+
+def test_scan_orders_by_word_overlap_without_scores(graph):
+    graph.add_facts("User lives in Berlin", "User drinks coffee every morning", "User likes strong coffee")
+
+    hits = asyncio.run(RetrievalPlanner().scan("strong coffee", ["g"], [], limit=10))
+
+    assert [hit.fact for hit in hits] == [
+        "User likes strong coffee", "User drinks coffee every morning", "User lives in Berlin",
+    ]
+    assert all(hit.score is None for hit in hits)
+
+
+def test_scan_refuses_a_truncated_read(graph):
+    graph.add_facts(*[f"fact {i}" for i in range(11)])
+    planner = RetrievalPlanner()
+
+    assert asyncio.run(planner.scan("fact", ["g"], [], limit=10)) is None
+    assert len(asyncio.run(planner.scan("fact", ["g"], [], limit=11))) == 11
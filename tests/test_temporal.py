@@ -0,0 +1,149 @@
+"""Unit tests for temporal filters: windows, graphiti SearchFilters and Cypher conditions"""
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from graphiti_core.search.search_filters import ComparisonOperator
+
+from app.temporal import TemporalFilter, cypher_condition, search_filters
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def day(n):
+    return T0 + timedelta(days=n)
+
+
+def matches_filters(filters, valid_at, invalid_at):
+    """Evaluate graphiti SearchFilters date lists: an OR of AND-groups per field."""
+    def field(groups, value):
+        if groups is None:
+            return True
+        return any(all(compare(f, value) for f in group) for group in groups)
+
+    def compare(date_filter, value):
+        op = date_filter.comparison_operator
+        if op == ComparisonOperator.is_null:
+            return value is None
+        if value is None:
+            return False
+        return {
+            ComparisonOperator.less_than_equal: value <= date_filter.date,
+            ComparisonOperator.greater_than: value > date_filter.date,
+        }[op]
+    if filters is None:
+        return True
+    return field(filters.valid_at, valid_at) and field(filters.invalid_at, invalid_at)
+
+
+def matches_cypher(condition, params, valid_at, invalid_at):
+    """Evaluate the generated WHERE condition the way FalkorDB compares ISO strings."""
+    if not condition:
+        return True
+    values = {"valid_at": valid_at and valid_at.isoformat(), "invalid_at": invalid_at and invalid_at.isoformat()}
+    expression = re.sub(r"e\.(valid_at|invalid_at) IS NULL", r"(\1 is None)", condition)
+    expression = re.sub(r"e\.(valid_at|invalid_at)", r"\1", expression)
+    expression = re.sub(r"\$(\w+)", r"params['\1']", expression)
+    expression = expression.replace(" OR ", " or ").replace(" AND ", " and ")
+    return eval(expression, {"params": params, **values})
+
+
+def qualifying(temporal, facts):
+    windows = temporal.windows()
+    filters = search_filters(windows)
+    condition, params = cypher_condition("e", windows)
+    by_filters = [name for name, (v, i) in facts.items() if matches_filters(filters, v, i)]
+    by_cypher = [name for name, (v, i) in facts.items() if matches_cypher(condition, params, v, i)]
+    assert by_filters == by_cypher
+    return by_filters
+
+
+FACTS = {
+    "always": (None, None),
+    "early": (day(0), day(10)),
+    "late": (day(20), None),
+    "middle": (day(5), day(15)),
+    "invalidated": (None, day(3)),
+}
+
+
+def test_no_filter_keeps_everything():
+    temporal = TemporalFilter()
+
+    assert not temporal.temporal
+    assert search_filters(temporal.windows()) is None
+    assert cypher_condition("e", temporal.windows()) == ("", {})
+    assert qualifying(temporal, FACTS) == list(FACTS)
+
+
+def test_as_of_keeps_facts_valid_at_that_time():
+    assert qualifying(TemporalFilter(as_of=day(7)), FACTS) == ["always", "early", "middle"]
+
+
+def test_as_of_is_exclusive_at_invalid_at():
+    assert qualifying(TemporalFilter(as_of=day(10)), FACTS) == ["always", "middle"]
+
+
+def test_naive_as_of_is_utc():
+    assert TemporalFilter(as_of=datetime(2025, 1, 8)).windows() == [(day(7), day(7))]
+
+
+def test_valid_only_uses_now():
+    temporal = TemporalFilter(valid_only=True)
+    (start, end), = temporal.windows()
+
+    assert start == end
+    assert abs((start - datetime.now(timezone.utc)).total_seconds()) < 5
+    assert qualifying(temporal, FACTS) == ["always", "late"]
+
+
+def test_valid_between_keeps_overlapping_facts():
+    assert qualifying(TemporalFilter(valid_between=(day(12), day(18))), FACTS) == ["always", "middle"]
+
+
+def test_open_ended_valid_between():
+    assert qualifying(TemporalFilter(valid_between=(day(16), None)), FACTS) == ["always", "late"]
+    assert qualifying(TemporalFilter(valid_between=(None, day(4))), FACTS) == [
+        "always", "early", "invalidated",
+    ]
+
+
+def test_as_of_combined_with_valid_between_must_satisfy_both():
+    temporal = TemporalFilter(as_of=day(7), valid_between=(day(12), day(18)))
+
+    assert len(temporal.windows()) == 2
+    assert qualifying(temporal, FACTS) == ["always", "middle"]
+
+
+def test_valid_only_combined_with_past_range_keeps_facts_valid_in_both():
+    temporal = TemporalFilter(valid_only=True, valid_between=(day(0), day(2)))
+
+    assert qualifying(temporal, FACTS) == ["always"]
+
+
+def test_combined_windows_distribute_and_over_or():
+    filters = search_filters([(day(1), day(1)), (day(2), day(3))])
+
+    # (valid_at <= end_1 OR null) AND (valid_at <= end_2 OR null) -> four AND-groups
+    assert len(filters.valid_at) == 4
+    assert all(len(group) == 2 for group in filters.valid_at)
+
+
+def test_cypher_condition_numbers_parameters_per_window():
+    condition, params = cypher_condition("r", [(day(1), day(1)), (day(2), None)])
+
+    assert condition == (
+        "(r.valid_at IS NULL OR r.valid_at <= $valid_end_0)"
+        " AND (r.invalid_at IS NULL OR r.invalid_at > $valid_start_0)"
+        " AND (r.invalid_at IS NULL OR r.invalid_at > $valid_start_1)"
+    )
+    assert params == {
+        "valid_end_0": day(1).isoformat(),
+        "valid_start_0": day(1).isoformat(),
+        "valid_start_1": day(2).isoformat(),
+    }
+
+
+def test_reversed_range_is_rejected():
+    with pytest.raises(ValueError):
+        TemporalFilter(valid_between=(day(5), day(1)))
@@ -0,0 +1,243 @@
+"""Unit tests for the in-process vector index: quantization, top-k, rescoring and eviction"""
+import asyncio
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app import vector_index as vector_index_module
+from app.cache import EPOCH_VERSION
+from app.config import settings
+from app.vector_index import FactHit, GroupIndex, VectorIndexManager, normalize, quantize, rescore, similarities
+
+DIM = 64
+RNG = np.random.default_rng(7)
+# Clustered embeddings, so neighbours are close together as with real text
+CENTRES = RNG.normal(size=(20, DIM)).astype(np.float32)
+MATRIX = (CENTRES[RNG.integers(0, 20, size=2000)] + 0.6 * RNG.normal(size=(2000, DIM))).astype(np.float32)
+QUERIES = normalize(MATRIX[RNG.integers(0, 2000, size=25)] + 0.3 * RNG.normal(size=(25, DIM)).astype(np.float32))
+
+
+def build(dtype, matrix=MATRIX, group_id="g"):
+    index = GroupIndex(group_id, matrix.shape[1], dtype, version=1, capacity=len(matrix))
+    index.load([f"{group_id}-{i}" for i in range(len(matrix))], matrix, [{"fact": f"fact {i}"} for i in range(len(matrix))])
+    return index
+
+
+def exact_top(query, k):
+    scores = normalize(MATRIX) @ query
+    return list(np.argsort(-scores)[:k]), scores
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_rows_round_trip(dtype):
+    matrix = normalize(MATRIX[:100])
+    rows, scales = quantize(matrix, dtype)
+
+    assert rows.dtype == np.dtype(dtype)
+    recovered = rows.astype(np.float32) * scales[:, None]
+    assert np.abs(recovered - matrix).max() < (1e-3 if dtype == "float16" else 0.5 / 127 * np.abs(matrix).max() + 1e-6)
+
+
+def test_int8_scales_each_row_to_its_peak():
+    rows, scales = quantize(normalize(MATRIX[:50]), "int8")
+
+    assert (np.abs(rows).max(axis=1) == 127).all()
+    assert np.allclose(scales, np.abs(normalize(MATRIX[:50])).max(axis=1) / 127)
+
+
+def test_zero_row_is_kept_as_zero():
+    rows, scales = quantize(normalize(np.zeros((1, DIM), dtype=np.float32)), "int8")
+
+    assert not rows.any() and scales[0] == 1.0
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_similarities_match_exact_cosine(dtype):
+    index = build(dtype)
+    tolerance = {"float32": 1e-5, "float16": 2e-3, "int8": 3e-2}[dtype]
+
+    for query in QUERIES:
+        _, exact = exact_top(query, 1)
+        approx = similarities(index.vectors[: index.size], index.scales[: index.size], query)
+        assert np.abs(approx - exact).max() < tolerance
+
+
+@pytest.mark.parametrize("dtype, min_recall", [("float32", 1.0), ("float16", 0.99), ("int8", 0.9)])
+def test_top_k_recall_against_float32(dtype, min_recall):
+    index = build(dtype)
+    k = 10
+    found = 0
+    for query in QUERIES:
+        expected, _ = exact_top(query, k)
+        found += len({row for _, row in index.top_k(query, k)} & set(expected))
+
+    assert found / (k * len(QUERIES)) >= min_recall
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_search_returns_hits_in_score_order(dtype):
+    index = build(dtype)
+    manager = VectorIndexManager()
+
+    for query in QUERIES[:5]:
+        hits = manager.search([index], list(query), 10)
+        scores = [hit.score for hit in hits]
+        assert len(hits) == 10
+        assert scores == sorted(scores, reverse=True)
+        # The best match is the exact best one, or within quantization noise of it
+        best, exact = exact_top(query, 1)
+        assert hits[0].score >= (exact[best[0]] + 1) / 2 - 0.01
+
+
+def test_top_k_scale_and_min_score():
+    index = build("float32")
+    query = QUERIES[0]
+    _, exact = exact_top(query, 1)
+    # Halfway between the 5th and 6th best scores
+    threshold = float(np.mean(np.sort((exact + 1) / 2)[-6:-4]))
+
+    results = index.top_k(query, 50, min_score=threshold)
+
+    assert len(results) == 5
+    assert all(score >= threshold for score, _ in results)
+    assert index.top_k(query, 5, min_score=1.01) == []
+
+
+def test_top_k_skips_facts_outside_the_window():
+    index = build("float32", MATRIX[:3])
+    index.update("g-0", invalid_at="2025-01-01T00:00:00+00:00")
+    index.update("g-2", valid_at="2026-01-01T00:00:00+00:00")
+    at = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+    rows = {row for _, row in index.top_k(normalize(MATRIX[0]), 3, windows=[(at, at)])}
+
+    assert rows == {1}
+
+
+def test_search_merges_groups_and_cuts_to_k():
+    first, second = build("float32", MATRIX[:100], "a"), build("float32", MATRIX[100:200], "b")
+    query = normalize(MATRIX[150])
+
+    hits = VectorIndexManager().search([first, second], list(query), 3)
+
+    assert hits[0].uuid == "b-50"
+    assert len(hits) == 3
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_search_rejects_another_dimension():
+    assert VectorIndexManager().search([build("float32")], [1.0, 0.0], 3) is None
+
+
+def test_rescore_ranks_by_full_precision_embeddings(monkeypatch):
+    query = normalize(MATRIX[0])
+    # Quantized scores put the candidates in the wrong order
+    candidates = [
+        FactHit(uuid="far", fact="far", group_id="g", score=0.99),
+        FactHit(uuid="near", fact="near", group_id="g", score=0.50),
+        FactHit(uuid="missing", fact="missing", group_id="g", score=0.40),
+    ]
+    requested = {}
+
+    async def fetch(uuids, group_ids):
+        requested.update(uuids=uuids, group_ids=group_ids)
+        return {"far": list(-MATRIX[0]), "near": list(MATRIX[0] * 2)}
+    monkeypatch.setattr(vector_index_module, "fetch_fact_embeddings", fetch)
+
+    hits = asyncio.run(rescore(candidates, list(query), 2))
+
+    assert [hit.uuid for hit in hits] == ["near", "missing"]
+    assert hits[0].score == pytest.approx(1.0)
+    assert requested == {"uuids": ["far", "near", "missing"], "group_ids": ["g"]}
+
+
+class FakeCache:
+    def __init__(self):
+        self.versions = {}
+
+    async def group_versions(self, group_ids):
+        # No cache flush since the manager was created
+        return {EPOCH_VERSION: None, **{group_id: self.versions.get(group_id, 0) for group_id in group_ids}}
+
+
+class FakeDriver:
+    async def execute_query(self, query, group_id, limit):
+        return [
+            {
+                "uuid": f"{group_id}-{i}", "fact": f"fact {i}", "embedding": list(MATRIX[i]),
+                "created_at": None, "valid_at": None, "invalid_at": None,
+                "source_node_uuid": "a", "target_node_uuid": "b", "source_name": "A", "target_name": "B",
+            }
+            for i in range(100)
+        ][:limit], None, None
+
+
+class FakeRouter:
+    driver = FakeDriver()
+
+    async def for_group(self, group_id, read=False):
+        return self
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(vector_index_module, "query_cache", FakeCache())
+    monkeypatch.setattr(vector_index_module, "graph_router", FakeRouter())
+    monkeypatch.setattr(settings, "EMBEDDING_DIM", DIM)
+    monkeypatch.setattr(settings, "VECTOR_INDEX_DTYPE", "float32")
+    monkeypatch.setattr(settings, "VECTOR_INDEX_MIN_SEARCHES", 1)
+    # 100 facts x 64 float32 dims = 25600 bytes per group: room for two
+    monkeypatch.setattr(settings, "VECTOR_INDEX_MEMORY_MB", 60000 / (1024 * 1024))
+    return VectorIndexManager()
+
+
+def load(manager, *group_ids):
+    async def run():
+        for group_id in group_ids:
+            await manager._load(group_id)
+    asyncio.run(run())
+
+
+def test_loaded_index_matches_records(manager):
+    load(manager, "a")
+
+    assert manager.groups["a"].size == 100
+    assert manager.groups["a"].nbytes == 100 * DIM * 4
+
+
+def test_least_recently_loaded_group_is_evicted_over_budget(manager):
+    load(manager, "a", "b", "c")
+
+    assert list(manager.groups) == ["b", "c"]
+    assert manager.stats["evictions"] == 1
+    assert manager.nbytes() <= manager.memory_budget
+
+
+def test_lookup_refreshes_recency(manager):
+    load(manager, "a", "b")
+    assert asyncio.run(manager.lookup(["a"])) is not None
+
+    load(manager, "c")
+
+    assert list(manager.groups) == ["a", "c"]
+
+
+def test_group_larger_than_the_budget_is_not_indexed(manager):
+    manager.memory_budget = 1000
+
+    load(manager, "a")
+
+    assert manager.groups == {}
+    assert "a" in manager._too_large
+
+
+def test_quantized_indexes_fit_more_groups(manager, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_DTYPE", "int8")
+
+    load(manager, "a", "b", "c", "d")
+
+    # int8 rows take a quarter of the space, plus one float32 scale per row
+    assert manager.groups["a"].nbytes == 100 * DIM + 100 * 4
+    assert list(manager.groups) == ["a", "b", "c", "d"]
+    assert manager.stats["evictions"] == 0